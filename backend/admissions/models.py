@@ -236,7 +236,7 @@ class Enquiry(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.enquiry_id:
-            self.enquiry_id = generate_business_id('ENQ')
+            self.enquiry_id = generate_business_id('ENQ', school=self.school_id)
         super().save(*args, **kwargs)
     
     def get_full_name(self):
@@ -20,6 +20,7 @@ from .serializers import (
 from core.permissions import StandardPermission
 from core.pagination import StandardResultsPagination
 from core.utils import generate_business_id
+from reports import counters
 
 
 # ============================================
@@ -289,7 +290,7 @@ class EnquiryViewSet(viewsets.ModelViewSet):
                 address=enquiry.address,
                 enrollment_number=custom_student_id,  # Dynamic Roll No
                 gr_number=gr_number, # Permanent ID
-                student_id=generate_business_id('STU'), # Internal System ID
+                student_id=generate_business_id('STU', school=enquiry.school_id), # Internal System ID
             )
             
             # Copy photo if exists
@@ -304,11 +305,22 @@ class EnquiryViewSet(viewsets.ModelViewSet):
             enquiry.status = 'CONVERTED'
             enquiry.save()
         
+        # Fees the student will be invoiced for this year (cached fee matrix)
+        from finance import fee_matrix
+        fees = None
+        if enquiry.academic_year_id:
+            fees = fee_matrix.resolve(enquiry.school_id, enquiry.academic_year_id, student.current_class_id, section.id)
+        
         return Response({
             'success': True,
             'student_id': student.student_id,
             'enrollment_number': student.enrollment_number,
             'gr_number': student.gr_number,
+            'fees': {
+                'total_amount': fees['total_amount'],
+                'heads': [{'head_id': head['head_id'], 'head_name': head['head_name'], 'amount': head['amount']}
+                          for head in fees['breakups']],
+            } if fees else None,
             'message': f'Admitted: {student.get_full_name()} | GR No: {gr_number} | Roll: {custom_student_id}'
         })
 
@@ -395,14 +407,15 @@ class EnquiryStatsView(APIView):
     def get(self, request):
         school = request.user.school
         queryset = Enquiry.objects.filter(school=school)
+        school_stats = counters.snapshot(request.user.school_id)
         
         stats = {
-            'total': queryset.count(),
-            'pending': queryset.filter(status='PENDING').count(),
-            'in_progress': queryset.filter(status='IN_PROGRESS').count(),
-            'approved': queryset.filter(status='APPROVED').count(),
-            'rejected': queryset.filter(status='REJECTED').count(),
-            'converted': queryset.filter(status='CONVERTED').count(),
+            'total': school_stats['enquiries_total'],
+            'pending': school_stats['enquiries_pending'],
+            'in_progress': school_stats['enquiries_in_progress'],
+            'approved': school_stats['enquiries_approved'],
+            'rejected': school_stats['enquiries_rejected'],
+            'converted': school_stats['enquiries_converted'],
             'by_class': list(
                 queryset.values('class_applied__name')
                 .annotate(count=models.Count('id'))
@@ -161,7 +161,7 @@ class Certificate(models.Model):
     def save(self, *args, **kwargs):
         # Generate certificate number if not exists
         if not self.certificate_no:
-            self.certificate_no = generate_business_id('CERT')
+            self.certificate_no = generate_business_id('CERT', school=self.school_id)
         
         # Generate verification code if not exists
         if not self.verification_code:
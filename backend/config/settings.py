@@ -129,6 +129,13 @@ CACHES = {
     }
 }
 
+# Background jobs (core.jobs). Production runs `manage.py runworker`; set
+# JOBS_EAGER=True to run jobs in the web process instead (local dev)
+JOBS_EAGER = os.environ.get('JOBS_EAGER', 'False') == 'True'
+
+# Processes rendering PDFs for batch exports (finance.exports)
+PDF_EXPORT_WORKERS = int(os.environ.get('PDF_EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -203,7 +210,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'core.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
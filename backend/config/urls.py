@@ -21,13 +21,16 @@ router.register(r'homework', HomeworkViewSet, basename='homework')
 from django.conf import settings
 from django.conf.urls.static import static
 
-from core.views import LoginApiView, HeaderDebugView
+from core.views import LoginApiView, HeaderDebugView, JobStatusView
 
 def api_root(request):
+    from core.authentication import get_stats
+
     return JsonResponse({
         "message": "Welcome to SchoolApp Backend API",
         "status": "running",
-        "docs": "/api/docs/"
+        "docs": "/api/docs/",
+        "auth_cache": get_stats(),  # This worker process's token cache hit/miss counters
     })
 
 urlpatterns = [
@@ -48,9 +51,14 @@ urlpatterns = [
     path('api/students/', include('students.urls')),  # Student-specific endpoints (report-card, promote, etc.)
     path('api/login/', LoginApiView.as_view(), name='login'),
     path('api/debug/headers/', HeaderDebugView.as_view(), name='debug-headers'),
+    path('api/jobs/<int:job_id>/', JobStatusView.as_view(), name='job-status'),
     path('api/', include(router.urls)),
     path('', api_root, name='api-root'), # Root URL Fix
 ]
 
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# Resolve each DRF view's model once, up front, for StandardPermission
+from core.permissions import compile_view_models
+compile_view_models(urlpatterns)
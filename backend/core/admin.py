@@ -1,13 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CoreUser, AuditLog
+from .models import CoreUser, AuditLog, AuditArchive
 
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'action', 'model_name', 'object_repr', 'user')
     list_filter = ('action', 'model_name', 'timestamp')
-    search_fields = ('object_repr', 'changes')
+    # No search over `changes`: a JSON text scan is a full table scan
+    search_fields = ('object_repr', 'object_id')
     readonly_fields = ('timestamp', 'action', 'user', 'model_name', 'object_id', 'object_repr', 'changes')
+    list_select_related = ('user', 'user__school')
+    show_full_result_count = False
     
     def has_add_permission(self, request):
         return False
@@ -18,6 +21,20 @@ class AuditLogAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+@admin.register(AuditArchive)
+class AuditArchiveAdmin(admin.ModelAdmin):
+    list_display = ('period', 'entries', 'first_timestamp', 'last_timestamp', 'path', 'archived_at')
+    readonly_fields = ('period', 'entries', 'first_timestamp', 'last_timestamp', 'path', 'archived_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(CoreUser)
 class CoreUserAdmin(UserAdmin):
     # Display fields in list view
@@ -7,6 +7,9 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals
+        from core import jobs, tracking
+        tracking.autodiscover(ignored=core.signals.IGNORED_MODELS)
+        jobs.autodiscover()
         
         # Disconnect update_last_login to prevent writes on login (for Vercel Read-Only)
         try:
@@ -0,0 +1,399 @@
+"""
+Buffered audit log pipeline.
+
+The signal handlers in core.signals hand every entry to `record()`.
+Inside a transaction the entries are buffered and written with a single
+bulk_create when the transaction commits. Outside a transaction the entry
+is written straight away.
+
+Entries are buffered per savepoint level, each level's buffer being an
+on_commit callback registered in that savepoint: rolling back a nested
+atomic block drops its callback and so its entries, while the rest of the
+transaction's entries are kept. A released savepoint's entries are moved
+to the enclosing level on the next record().
+
+Entries are bucketed per month (AuditLog.period). Closed months are rolled
+out of the hot table into gzip JSONL segments under MEDIA_ROOT by the
+`archive_audit_logs` command; `history()` reads hot rows and archived
+segments alike.
+
+Settings:
+    AUDIT_LOG_WRITER = 'buffered'   # default, flush on commit in the request thread
+    AUDIT_LOG_WRITER = 'background' # hand the flush to a daemon writer thread
+    AUDIT_LOG_WRITER = 'immediate'  # one INSERT per entry (legacy behaviour)
+    AUDIT_ARCHIVE_DIR = 'audit_archive'  # relative to MEDIA_ROOT
+"""
+import atexit
+import gzip
+import heapq
+import json
+import logging
+import os
+import queue
+import threading
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, transaction
+from django.db.models import Max, Min
+from django.db.utils import OperationalError, ProgrammingError
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+WRITER_BUFFERED = 'buffered'
+WRITER_BACKGROUND = 'background'
+WRITER_IMMEDIATE = 'immediate'
+
+# Fields that hold the human readable business key of a model (INV-..., RCP-...)
+BUSINESS_KEY_FIELDS = (
+    'invoice_id', 'receipt_no', 'student_id', 'user_id', 'school_id',
+    'installment_id', 'salary_id', 'attendance_id', 'academic_year_id',
+)
+
+
+def get_writer():
+    return getattr(settings, 'AUDIT_LOG_WRITER', WRITER_BUFFERED)
+
+
+def describe(instance):
+    """
+    Build `object_repr` without triggering lazy FK loads.
+
+    Many __str__ methods walk a foreign key (Invoice -> student,
+    CoreUser -> school). We only call __str__ when every populated FK is
+    already cached on the instance, otherwise we fall back to the model
+    name plus its business key.
+    """
+    for field in instance._meta.concrete_fields:
+        if (
+            field.is_relation
+            and getattr(instance, field.attname) is not None
+            and not field.is_cached(instance)
+        ):
+            return _fallback_repr(instance)
+    try:
+        return str(instance)[:255]
+    except Exception:
+        return _fallback_repr(instance)
+
+
+def _fallback_repr(instance):
+    name = instance._meta.object_name
+    for attr in BUSINESS_KEY_FIELDS:
+        try:
+            field = instance._meta.get_field(attr)
+        except Exception:
+            continue
+        if not field.is_relation:
+            value = getattr(instance, attr, None)
+            if value:
+                return f"{name} {value}"[:255]
+    return f"{name} #{instance.pk}"[:255]
+
+
+def build_entry(action, instance, user=None, changes=None):
+    from .models import AuditLog
+
+    return AuditLog(
+        user_id=getattr(user, 'pk', None),
+        action=action,
+        model_name=instance.__class__.__name__,
+        object_id=str(instance.pk),
+        object_repr=describe(instance),
+        changes=changes or None,
+        # bulk_create skips save(), so the bucket is set here
+        period=AuditLog.period_for(),
+    )
+
+
+def record(action, instance, user=None, changes=None, using=DEFAULT_DB_ALIAS):
+    """Queue an audit entry for `instance` according to AUDIT_LOG_WRITER."""
+    entry = build_entry(action, instance, user=user, changes=changes)
+    writer = get_writer()
+
+    if writer == WRITER_IMMEDIATE or not transaction.get_connection(using).in_atomic_block:
+        _dispatch([entry], using, writer)
+        return
+
+    _current_buffer(using).entries.append(entry)
+
+
+def flush(using=DEFAULT_DB_ALIAS):
+    """Write the current transaction's buffered entries now (e.g. mid-way through a long job)."""
+    for buffer in _live_buffers(transaction.get_connection(using), using):
+        buffer()
+
+
+class _Buffer:
+    """Entries recorded at one savepoint level of a transaction."""
+
+    def __init__(self, using, savepoints):
+        self.using = using
+        self.savepoints = savepoints
+        self.entries = []
+
+    def __call__(self):
+        # on_commit callback
+        if self.entries:
+            entries, self.entries = self.entries, []
+            _dispatch(entries, self.using, get_writer())
+
+
+def _live_buffers(connection, using):
+    """Buffers whose on_commit callback is still queued, in registration order."""
+    return [
+        func for _, func, _ in connection.run_on_commit
+        if isinstance(func, _Buffer) and func.using == using
+    ]
+
+
+def _current_buffer(using):
+    """
+    Return the buffer of the current savepoint level, creating one if needed.
+
+    Django drops on_commit callbacks registered in a savepoint that rolls
+    back, which is how the entries of a rolled back block get discarded.
+    Live buffers of deeper levels belong to released savepoints: their
+    entries now share this level's fate and are moved into its buffer.
+    """
+    connection = transaction.get_connection(using)
+    savepoints = tuple(connection.savepoint_ids)
+    live = _live_buffers(connection, using)
+
+    buffer = next((candidate for candidate in live if candidate.savepoints == savepoints), None)
+    if buffer is None:
+        buffer = _Buffer(using, savepoints)
+        transaction.on_commit(buffer, using=using, robust=True)
+    for released in live:
+        if len(released.savepoints) > len(savepoints) and released.entries:
+            buffer.entries.extend(released.entries)
+            released.entries = []
+    return buffer
+
+
+def _dispatch(entries, using, writer):
+    if writer == WRITER_BACKGROUND:
+        _background_writer().submit(entries, using)
+    else:
+        write(entries, using)
+
+
+def write(entries, using=DEFAULT_DB_ALIAS):
+    from .models import AuditLog
+
+    try:
+        if len(entries) == 1:
+            entries[0].save(using=using, force_insert=True)
+        else:
+            AuditLog.objects.using(using).bulk_create(entries)
+    except (OperationalError, ProgrammingError):
+        # Table might not exist yet during migrations
+        logger.debug("Audit log table unavailable, dropped %s entries", len(entries))
+
+
+class BackgroundWriter:
+    """Daemon thread that drains queued audit batches with bulk_create."""
+
+    def __init__(self, batch_size=500):
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='audit-log-writer', daemon=True)
+        self.thread.start()
+
+    def submit(self, entries, using):
+        self.queue.put((using, entries))
+
+    def drain(self):
+        """Block until everything queued so far has been written."""
+        self.queue.join()
+
+    def _run(self):
+        while True:
+            using, entries = self.queue.get()
+            batches = {using: list(entries)}
+            done = 1
+            # Coalesce whatever else is already waiting into the same insert
+            while sum(len(v) for v in batches.values()) < self.batch_size:
+                try:
+                    extra_using, extra = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batches.setdefault(extra_using, []).extend(extra)
+                done += 1
+            try:
+                for alias, batch in batches.items():
+                    write(batch, alias)
+            except Exception:
+                logger.exception("Background audit writer failed")
+            finally:
+                close_old_connections()
+                for _ in range(done):
+                    self.queue.task_done()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _background_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = BackgroundWriter()
+                atexit.register(_writer.drain)
+    return _writer
+
+
+def drain():
+    """Wait for the background writer (if running) to finish pending batches."""
+    if _writer is not None:
+        _writer.drain()
+
+
+# ---------------------------------------------------------------------------
+# Cold storage
+# ---------------------------------------------------------------------------
+
+ARCHIVE_FIELDS = ('id', 'user_id', 'action', 'model_name', 'object_id', 'object_repr', 'changes', 'timestamp', 'period')
+
+
+def get_archive_dir():
+    return getattr(settings, 'AUDIT_ARCHIVE_DIR', 'audit_archive')
+
+
+def archive_period(period, using=DEFAULT_DB_ALIAS, chunk_size=2000):
+    """
+    Move every AuditLog row of `period` (YYYYMM) into a new gzip JSONL
+    segment under MEDIA_ROOT and delete them from the hot table.
+
+    The file is fully written (and renamed into place) before the rows are
+    deleted, and the AuditArchive record is created in the same transaction
+    as the delete, so an interrupted run never loses entries.
+    Returns the AuditArchive, or None if the period had no rows.
+    """
+    from .models import AuditLog, AuditArchive
+
+    rows = AuditLog.objects.using(using).filter(period=period)
+    bounds = rows.aggregate(max_id=Max('id'), first=Min('timestamp'), last=Max('timestamp'))
+    if bounds['max_id'] is None:
+        return None
+    rows = rows.filter(id__lte=bounds['max_id'])
+
+    segment = AuditArchive.objects.using(using).filter(period=period).count() + 1
+    relative_path = os.path.join(get_archive_dir(), str(period // 100), f"{period}-{segment:03d}.jsonl.gz")
+    full_path = os.path.join(settings.MEDIA_ROOT, relative_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    count = 0
+    tmp_path = full_path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as fh:
+        for row in rows.order_by('id').values(*ARCHIVE_FIELDS).iterator(chunk_size=chunk_size):
+            fh.write(json.dumps(row, cls=DjangoJSONEncoder))
+            fh.write('\n')
+            count += 1
+    os.replace(tmp_path, full_path)
+
+    with transaction.atomic(using=using):
+        archive = AuditArchive.objects.using(using).create(
+            period=period,
+            path=relative_path,
+            entries=count,
+            first_timestamp=bounds['first'],
+            last_timestamp=bounds['last'],
+        )
+        # Plain DELETE: the global post_delete receivers would otherwise make
+        # Django load and signal every row
+        rows._raw_delete(using)
+    return archive
+
+
+def read_archive(archive):
+    """Yield the rows of an AuditArchive segment as dicts (timestamp parsed)."""
+    full_path = os.path.join(settings.MEDIA_ROOT, archive.path)
+    with gzip.open(full_path, 'rt', encoding='utf-8') as fh:
+        for line in fh:
+            row = json.loads(line)
+            row['timestamp'] = parse_datetime(row['timestamp'])
+            yield row
+
+
+def _sort_key(row):
+    return row['timestamp'], row['id']
+
+
+def _hot_rows(model_name, object_id, user_id, since, until, limit, using):
+    from .models import AuditLog
+
+    hot = AuditLog.objects.using(using).all()
+    if model_name:
+        hot = hot.filter(model_name=model_name)
+    if object_id is not None:
+        hot = hot.filter(object_id=object_id)
+    if user_id is not None:
+        hot = hot.filter(user_id=user_id)
+    if since:
+        hot = hot.filter(timestamp__gte=since)
+    if until:
+        hot = hot.filter(timestamp__lt=until)
+    hot = hot.order_by('-timestamp', '-id').values(*ARCHIVE_FIELDS)
+    return hot[:limit] if limit else hot
+
+
+def _row_filter(model_name, object_id, user_id, since, until):
+    def matches(row):
+        return (
+            (not model_name or row['model_name'] == model_name)
+            and (object_id is None or row['object_id'] == object_id)
+            and (user_id is None or row['user_id'] == user_id)
+            and (not since or row['timestamp'] >= since)
+            and (not until or row['timestamp'] < until)
+        )
+    return matches
+
+
+def _cold_rows(matches, since, until, using):
+    """
+    Matching archived rows, newest first, read one period at a time: a
+    period's segments are only opened once the newer ones are used up.
+    """
+    from .models import AuditArchive
+
+    segments = AuditArchive.objects.using(using).all()
+    if since:
+        segments = segments.filter(last_timestamp__gte=since)
+    if until:
+        segments = segments.filter(first_timestamp__lt=until)
+
+    # Periods are months of the timestamp, so they never overlap
+    for _, archives in groupby(segments.order_by('-period', 'id'), key=lambda archive: archive.period):
+        rows = []
+        for archive in archives:
+            try:
+                rows.extend(row for row in read_archive(archive) if matches(row))
+            except FileNotFoundError:
+                logger.warning("Audit archive segment missing: %s", archive.path)
+        rows.sort(key=_sort_key, reverse=True)
+        yield from rows
+
+
+def history(model_name=None, object_id=None, user=None, since=None, until=None, limit=None, using=DEFAULT_DB_ALIAS):
+    """
+    Audit entries across the hot table and archived segments, newest first.
+
+    Each entry is a dict with the AuditLog field values (`user_id` rather
+    than `user`). The hot part is served by the (model_name, object_id,
+    timestamp) and (user, timestamp) indexes; archived segments are only
+    opened when their time range overlaps [since, until], and no older
+    than needed to fill `limit`.
+    """
+    user_id = getattr(user, 'pk', user)
+    if object_id is not None:
+        object_id = str(object_id)
+
+    hot = _hot_rows(model_name, object_id, user_id, since, until, limit, using)
+    cold = _cold_rows(_row_filter(model_name, object_id, user_id, since, until), since, until, using)
+    merged = heapq.merge(hot.iterator(), cold, key=_sort_key, reverse=True)
+    return list(islice(merged, limit) if limit else merged)
@@ -0,0 +1,216 @@
+"""
+Cached token authentication.
+
+DRF's TokenAuthentication joins Token + CoreUser on every request, and
+request.user.school / has_perm() then cost more queries. This class caches
+the whole bundle (token, user, school, role/permission flags and the
+resolved Django permissions) in two tiers:
+
+    1. a small per-process LRU with a short TTL (no network round trip)
+    2. the shared Django cache (Redis)
+
+Entries are dropped on user/school save, token delete and permission
+changes (see core.signals); the local tier of other processes expires via
+its TTL.
+
+Settings:
+    AUTH_TOKEN_CACHE_TIMEOUT = 300      # seconds, shared tier
+    AUTH_TOKEN_CACHE_LOCAL_TTL = 10     # seconds, per-process tier
+    AUTH_TOKEN_CACHE_LOCAL_SIZE = 2048  # entries, per-process tier
+"""
+import hashlib
+import logging
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from .permissions import get_permission_set
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = 'authtoken'
+# Hit/miss log line: every STATS_LOG_EVERY lookups, or the first lookup after
+# STATS_LOG_INTERVAL seconds without one, so quiet processes report too
+STATS_LOG_EVERY = 1000
+STATS_LOG_INTERVAL = 300
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def cache_key(key):
+    # Never put the raw token into a cache key
+    return f"{CACHE_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}"
+
+
+class _LocalTier:
+    """Per-process LRU of pickled bundles: {token key: (expires, user_pk, school_pk, payload)}."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[3]
+
+    def set(self, key, user_pk, school_pk, payload):
+        expires = time.monotonic() + _setting('AUTH_TOKEN_CACHE_LOCAL_TTL', 10)
+        with self._lock:
+            self._data[key] = (expires, user_pk, school_pk, payload)
+            self._data.move_to_end(key)
+            while len(self._data) > _setting('AUTH_TOKEN_CACHE_LOCAL_SIZE', 2048):
+                self._data.popitem(last=False)
+
+    def discard(self, keys=(), user_pk=None, school_pk=None):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+            if user_pk is not None or school_pk is not None:
+                for key, entry in list(self._data.items()):
+                    if (user_pk is not None and entry[1] == user_pk) or (
+                        school_pk is not None and entry[2] == school_pk
+                    ):
+                        del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_tier = _LocalTier()
+
+
+class _Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counts = {'local_hit': 0, 'shared_hit': 0, 'miss': 0}
+        self.logged_at = time.monotonic()
+
+    def incr(self, name):
+        now = time.monotonic()
+        with self._lock:
+            self.counts[name] += 1
+            due = sum(self.counts.values()) % STATS_LOG_EVERY == 0 or now - self.logged_at >= STATS_LOG_INTERVAL
+            if due:
+                self.logged_at = now
+        if due:
+            logger.info("Token auth cache: %s", self.snapshot())
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        counts['total'] = total
+        counts['hit_rate'] = round((counts['local_hit'] + counts['shared_hit']) / total, 4) if total else 0.0
+        return counts
+
+
+stats = _Stats()
+
+
+def get_stats():
+    """
+    Hit/miss counters for this process: local_hit, shared_hit, miss, total,
+    hit_rate. Also logged periodically and shown on the API root (GET /).
+    """
+    return stats.snapshot()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for rest_framework.authentication.TokenAuthentication."""
+
+    def authenticate_credentials(self, key):
+        payload = local_tier.get(key)
+        if payload is not None:
+            stats.incr('local_hit')
+            return self._unpack(payload)
+
+        entry = cache.get(cache_key(key))
+        if entry is not None:
+            stats.incr('shared_hit')
+            user_pk, school_pk, payload = entry
+            local_tier.set(key, user_pk, school_pk, payload)
+            return self._unpack(payload)
+
+        stats.incr('miss')
+        token = self._load(key)
+        payload = pickle.dumps(token, protocol=pickle.HIGHEST_PROTOCOL)
+        entry = (token.user.pk, token.user.school_id, payload)
+        cache.set(cache_key(key), entry, timeout=_setting('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+        local_tier.set(key, *entry)
+        return (token.user, token)
+
+    def _load(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related('user', 'user__school').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        # Compile permissions now so has_perm() and StandardPermission are
+        # served from the cached bundle (fills _perm_cache and friends too)
+        get_permission_set(token.user)
+        return token
+
+    def _unpack(self, payload):
+        # Every request gets its own instances; nothing is shared between threads
+        token = pickle.loads(payload)
+        return (token.user, token)
+
+
+def _invalidate(keys, user_pk=None, school_pk=None):
+    keys = list(keys)
+
+    def run():
+        local_tier.discard(keys=keys, user_pk=user_pk, school_pk=school_pk)
+        if keys:
+            cache.delete_many([cache_key(key) for key in keys])
+
+    # Drop the entries after the write is visible, otherwise a concurrent
+    # request could re-cache the old row before the transaction commits.
+    # Keys are looked up now, while memberships are still in place.
+    transaction.on_commit(run, robust=True)
+
+
+def _token_keys(**filters):
+    from rest_framework.authtoken.models import Token
+    return Token.objects.filter(**filters).values_list('key', flat=True)
+
+
+def invalidate_token(key):
+    _invalidate([key])
+
+
+def invalidate_user(user_pk):
+    _invalidate(_token_keys(user_id=user_pk), user_pk=user_pk)
+
+
+def invalidate_school(school_pk):
+    _invalidate(_token_keys(user__school_id=school_pk), school_pk=school_pk)
+
+
+def invalidate_group(group_pk):
+    _invalidate(_token_keys(user__groups=group_pk))
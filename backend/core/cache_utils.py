@@ -1,130 +1,283 @@
 """
 Caching utilities for high-performance data retrieval
+
+Two tiers: a small in-process LRU in front of the shared cache (django-redis).
+Keys are namespaced per school with a generation number, so bumping the
+generation (invalidate_school_cache) makes every key of that school
+unreachable at once.
+
+Recomputation is single-flight: when an entry expires, one caller (per
+process, and across processes via a short lock key in Redis) recomputes it
+while the others keep serving the stale value for up to `stale_ttl`
+seconds. If Redis is down (IGNORE_EXCEPTIONS turns errors into misses) the
+local tier keeps serving values computed in this process.
+
+Usage:
+    @cached_query('student_count', timeout=600)
+    def get_student_count(school_id):
+        return Student.objects.filter(school_id=school_id).count()
+
+    stats = get_or_compute('dashboard_stats', school_id, compute, timeout=300)
 """
-from django.core.cache import cache
-from django.db.models import Count, Sum
+import hashlib
+import inspect
+import json
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 
+from django.conf import settings
+from django.core.cache import cache
+
+GLOBAL_NAMESPACE = 'global'
+LOCK_TIMEOUT = 30  # seconds; upper bound for one recomputation
+WAIT_FOR_FILL = 2.0  # seconds a loser waits for the winner when nothing is cached
+NAMESPACE_LOCAL_TTL = 2  # seconds a process trusts its copy of a school's generation
+
+
+class LocalLRU:
+    """Thread-safe in-process LRU with per-entry expiry."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalLRU(maxsize=getattr(settings, 'LOCAL_CACHE_SIZE', 1024))
+
+_flight_locks = {}
+_flight_guard = threading.Lock()
+
+
+def _flight_lock(key):
+    with _flight_guard:
+        lock = _flight_locks.get(key)
+        if lock is None:
+            if len(_flight_locks) > 4096:
+                _flight_locks.clear()
+            lock = _flight_locks[key] = threading.Lock()
+        return lock
+
+
+# --- Namespaces ---
+
+def _namespace_key(school_id):
+    return f'ns_{school_id if school_id is not None else GLOBAL_NAMESPACE}'
+
+
+def get_namespace(school_id):
+    """Current generation of a school's namespace (1 if never bumped)."""
+    key = _namespace_key(school_id)
+    generation = local_cache.get(key)
+    if generation is None:
+        generation = cache.get(key)
+        if generation is None:
+            generation = 1
+            cache.add(key, generation, timeout=None)
+        local_cache.set(key, generation, NAMESPACE_LOCAL_TTL)
+    return generation
+
+
+def bump_namespace(school_id):
+    """Invalidate every cached value of a school in one step."""
+    key = _namespace_key(school_id)
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+        generation = cache.incr(key)
+    if generation is None:
+        # Shared cache unavailable: at least move this process forward
+        generation = (local_cache.get(key) or 1) + 1
+    local_cache.set(key, generation, NAMESPACE_LOCAL_TTL)
+    return generation
+
+
+def make_key(prefix, school_id, *args, **kwargs):
+    """Deterministic key: namespace + prefix + digest of the arguments."""
+    parts = json.dumps([args, kwargs], sort_keys=True, default=str)
+    digest = hashlib.sha1(parts.encode()).hexdigest()[:16]
+    scope = school_id if school_id is not None else GLOBAL_NAMESPACE
+    return f'sc_{scope}_{get_namespace(school_id)}_{prefix}_{digest}'
+
 
 def cache_key_for_school(prefix, school_id):
     """Generate a consistent cache key for school-specific data"""
-    return f'{prefix}_{school_id}'
+    return make_key(prefix, school_id)
+
+
+# --- Read-through with single flight ---
+
+def get_or_compute(prefix, school_id, compute, timeout=300, stale_ttl=None, key_args=(), key_kwargs=None):
+    """
+    Return the cached value for (prefix, school_id, key_args), computing it
+    with `compute()` on a miss. Entries stay servable for `stale_ttl`
+    seconds past `timeout` (default: timeout / 5) while one caller refreshes.
+    """
+    if stale_ttl is None:
+        stale_ttl = timeout // 5
+    key = make_key(prefix, school_id, *key_args, **(key_kwargs or {}))
+
+    entry = _read(key)
+    if entry is not None and entry[1] > time.time():
+        return entry[0]
+
+    # Expired (stale) or missing: only one caller recomputes
+    lock = _flight_lock(key)
+    if not lock.acquire(blocking=entry is None, timeout=WAIT_FOR_FILL if entry is None else -1):
+        return entry[0] if entry is not None else compute()
+    try:
+        return _refresh(key, entry, compute, timeout, stale_ttl)
+    finally:
+        lock.release()
+
+
+def _read(key):
+    """(value, fresh_until) from the local tier, else the shared one; None on a miss."""
+    entry = local_cache.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is not None:
+            _store_local(key, entry)
+    return entry
+
+
+def _refresh(key, entry, compute, timeout, stale_ttl):
+    """Recompute `key` (holding this process's flight lock), unless another process already is."""
+    fresh = local_cache.get(key)
+    if fresh is not None and fresh[1] > time.time():
+        return fresh[0]
+
+    lock_key = f'{key}_lock'
+    owner = cache.add(lock_key, 1, timeout=LOCK_TIMEOUT)
+    if owner is False:
+        # Another process is recomputing: serve the stale value, or wait for its result
+        served = entry if entry is not None else _wait_for_fill(key)
+        if served is not None:
+            return served[0]
+
+    try:
+        value = compute()
+        entry = (value, time.time() + timeout)
+        cache.set(key, entry, timeout=timeout + stale_ttl)
+        _store_local(key, entry, stale_ttl)
+        return value
+    finally:
+        if owner:
+            cache.delete(lock_key)
+
+
+def _store_local(key, entry, stale_ttl=0):
+    # Keep it locally until it is no longer servable, even stale; this is
+    # also what keeps us going while Redis is down
+    ttl = max(entry[1] - time.time(), 0) + stale_ttl
+    if ttl > 0:
+        local_cache.set(key, entry, ttl)
+
+
+def _wait_for_fill(key):
+    deadline = time.monotonic() + WAIT_FOR_FILL
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            _store_local(key, entry)
+            return entry
+    return None
 
 
 def invalidate_school_cache(school_id, *prefixes):
-    """Invalidate multiple cache keys for a school"""
-    for prefix in prefixes:
-        cache_key = cache_key_for_school(prefix, school_id)
-        cache.delete(cache_key)
+    """
+    Invalidate cached data for a school.
 
+    All of the school's keys live in one generational namespace, so this is
+    a single counter bump regardless of `prefixes` (kept for compatibility).
+    """
+    bump_namespace(school_id)
 
-def cached_query(cache_key_prefix, timeout=300):
+
+def cached_query(cache_key_prefix, timeout=300, stale_ttl=None, school_arg='school_id'):
     """
-    Decorator to cache function results
-    
+    Decorator to cache function results in the school's namespace
+
+    The school is taken from the argument named `school_arg` (global
+    namespace if the function has none); the remaining arguments form the
+    key.
+
     Usage:
         @cached_query('student_count', timeout=600)
         def get_student_count(school_id):
             return Student.objects.filter(school_id=school_id).count()
     """
     def decorator(func):
+        signature = inspect.signature(func)
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            # Generate cache key from function args
-            cache_key = f'{cache_key_prefix}_{args}_{kwargs}'
-            
-            # Try to get from cache
-            result = cache.get(cache_key)
-            
-            if result is None:
-                # Calculate and cache
-                result = func(*args, **kwargs)
-                cache.set(cache_key, result, timeout=timeout)
-            
-            return result
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            school_id = arguments.pop(school_arg, None)
+            return get_or_compute(
+                cache_key_prefix, school_id, lambda: func(*args, **kwargs),
+                timeout=timeout, stale_ttl=stale_ttl, key_kwargs=arguments,
+            )
         return wrapper
     return decorator
 
 
 def get_dashboard_stats(school_id):
     """
-    Get cached dashboard statistics for a school
-    Cache for 5 minutes to reduce database load
-    """
-    from students.models import Student
-    from staff.models import CoreUser
-    from finance.models import Invoice
-    
-    cache_key = cache_key_for_school('dashboard_stats', school_id)
-    stats = cache.get(cache_key)
-    
-    if not stats:
-        stats = {
-            'total_students': Student.objects.filter(
-                school__school_id=school_id, is_active=True
-            ).count(),
-            'total_staff': CoreUser.objects.filter(
-                school__school_id=school_id,
-                role__in=['TEACHER', 'SCHOOL_ADMIN', 'PRINCIPAL']
-            ).count(),
-            'pending_invoices': Invoice.objects.filter(
-                school__school_id=school_id,
-                status='PENDING'
-            ).count(),
-            'pending_amount': Invoice.objects.filter(
-                school__school_id=school_id,
-                status='PENDING'
-            ).aggregate(
-                total=Sum('balance_amount')
-            )['total'] or 0,
-        }
-        
-        # Cache for 5 minutes
-        cache.set(cache_key, stats, timeout=300)
-    
-    return stats
-
-
-def get_cached_fee_structure(class_id):
-    """
-    Get cached fee structure for a class
-    Cache for 1 hour as fee structures change infrequently
+    Dashboard statistics for a school
+
+    Read from the school's counters row (reports.counters), which is kept
+    current on every write, so there is nothing to cache or go stale.
     """
-    from finance.models import FeeStructure
-    
-    cache_key = f'fee_structure_{class_id}'
-    structure = cache.get(cache_key)
-    
-    if not structure:
-        structure = list(
-            FeeStructure.objects.filter(
-                class_assigned_id=class_id
-            ).select_related('category').values(
-                'id', 'category__name', 'amount', 'term'
-            )
-        )
-        
-        # Cache for 1 hour
-        cache.set(cache_key, structure, timeout=3600)
-    
-    return structure
+    from core.middleware import resolve_school_pk
+    from reports import counters
+
+    stats = counters.snapshot(resolve_school_pk(school_id))
+    return {
+        'total_students': stats['active_students'],
+        'total_staff': stats['staff'],
+        'pending_invoices': stats['pending_invoices'],
+        'pending_amount': stats['pending_amount'],
+    }
 
 
 def invalidate_student_cache(school_id):
     """Invalidate all student-related caches"""
-    invalidate_school_cache(
-        school_id,
-        'dashboard_stats',
-        'active_students',
-        'student_count'
-    )
+    invalidate_school_cache(school_id)
 
 
 def invalidate_invoice_cache(school_id):
     """Invalidate all invoice-related caches"""
-    invalidate_school_cache(
-        school_id,
-        'dashboard_stats',
-        'pending_invoices',
-        'fee_summary'
-    )
+    invalidate_school_cache(school_id)
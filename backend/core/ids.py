@@ -0,0 +1,213 @@
+"""
+Business ID allocation.
+
+IDs keep the `PREFIX-<digits>-<tag>` shape (INV-0000042-000B), where the
+digits are a monotonic sequence per (prefix, school) and the tag is the
+school PK in base 36 (0000 = global). The sequence part has at least 7
+digits, so new IDs never collide with legacy ones (6 digit timestamp).
+
+Each thread leases a block of numbers from BusinessIdSequence with a single
+UPDATE and hands them out without further round trips. Blocks never
+overlap between workers: the counter is only ever moved forward.
+
+On PostgreSQL the lease runs on a dedicated autocommit connection, so it
+neither waits for nor is undone by the caller's transaction. Elsewhere it
+runs on the default connection; a block leased inside a transaction is
+then only trusted while that transaction is alive (a rollback also rolls
+the counter back, so the block is dropped).
+
+Settings:
+    BUSINESS_ID_BLOCK_SIZE = 50
+"""
+import string
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import F
+
+SEQUENCE_DIGITS = 7
+TAG_DIGITS = 4
+_BASE36 = string.digits + string.ascii_uppercase
+
+_local = threading.local()
+
+
+def get_block_size():
+    return getattr(settings, 'BUSINESS_ID_BLOCK_SIZE', 50)
+
+
+def school_tag(scope):
+    value, digits = int(scope), []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(_BASE36[remainder])
+    return ''.join(reversed(digits)).rjust(TAG_DIGITS, '0')
+
+
+def format_business_id(prefix, value, scope=0):
+    return f"{prefix}-{value:0{SEQUENCE_DIGITS}d}-{school_tag(scope)}"
+
+
+def _scope(school):
+    if school is None:
+        return 0
+    return int(getattr(school, 'pk', school) or 0)
+
+
+class _Block:
+    __slots__ = ('next', 'end', 'confirmed')
+
+    def __init__(self, start, end, confirmed):
+        self.next = start
+        self.end = end  # exclusive
+        self.confirmed = confirmed
+
+    def __call__(self):
+        # on_commit callback: the lease is durable now
+        self.confirmed = True
+
+    @property
+    def remaining(self):
+        return self.end - self.next
+
+    def take(self, count):
+        start = self.next
+        self.next += count
+        return range(start, start + count)
+
+
+def _blocks():
+    blocks = getattr(_local, 'blocks', None)
+    if blocks is None:
+        blocks = _local.blocks = {}
+    return blocks
+
+
+def reset():
+    """Forget leased blocks held by this thread (after flush/migrate in tests)."""
+    _local.blocks = {}
+
+
+def _usable(block):
+    if block is None or block.remaining <= 0:
+        return False
+    if block.confirmed:
+        return True
+    # Tentative block: still fine while its transaction is open
+    connection = connections[DEFAULT_DB_ALIAS]
+    return any(item[1] is block for item in connection.run_on_commit)
+
+
+# --- Leasing ---
+
+def _lease_connection():
+    """
+    This thread's autocommit connection for leases. It lives outside the
+    request cycle, so it gets the checks Django runs on request boundaries
+    here: dropped after an error or past CONN_MAX_AGE, and reopened.
+    """
+    connection = getattr(_local, 'lease_connection', None)
+    if connection is None:
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        _local.lease_connection = connection
+    else:
+        connection.close_if_unusable_or_obsolete()
+    connection.ensure_connection()
+    return connection
+
+
+def _lease_postgresql(prefix, scope, size):
+    table = 'core_businessidsequence'
+    connection = _lease_connection()
+    with connection.cursor() as cursor:
+        for _ in range(2):
+            cursor.execute(
+                f"UPDATE {table} SET next_value = next_value + %s "
+                f"WHERE prefix = %s AND scope = %s RETURNING next_value",
+                [size, prefix, scope],
+            )
+            row = cursor.fetchone()
+            if row:
+                return row[0] - size
+            cursor.execute(
+                f"INSERT INTO {table} (prefix, scope, next_value) VALUES (%s, %s, 1) "
+                f"ON CONFLICT (prefix, scope) DO NOTHING",
+                [prefix, scope],
+            )
+    raise RuntimeError(f"Could not lease business IDs for {prefix}/{scope}")
+
+
+def _lease_orm(prefix, scope, size):
+    from .models import BusinessIdSequence
+
+    rows = BusinessIdSequence.objects.filter(prefix=prefix, scope=scope)
+    for _ in range(2):
+        with transaction.atomic():
+            # UPDATE first: takes the row/write lock before we read the value
+            if rows.update(next_value=F('next_value') + size):
+                return rows.values_list('next_value', flat=True).get() - size
+        try:
+            with transaction.atomic():
+                BusinessIdSequence.objects.create(prefix=prefix, scope=scope, next_value=1)
+        except IntegrityError:
+            pass  # Another worker created it first
+    raise RuntimeError(f"Could not lease business IDs for {prefix}/{scope}")
+
+
+def _lease(prefix, scope, size):
+    connection = connections[DEFAULT_DB_ALIAS]
+    if connection.vendor == 'postgresql':
+        start = _lease_postgresql(prefix, scope, size)
+        return _Block(start, start + size, confirmed=True)
+
+    start = _lease_orm(prefix, scope, size)
+    block = _Block(start, start + size, confirmed=not connection.in_atomic_block)
+    if not block.confirmed:
+        transaction.on_commit(block)
+    return block
+
+
+# --- Public API ---
+
+def reserve(prefix, count, school=None):
+    """Reserve `count` consecutive-ish business IDs for (prefix, school), e.g. for bulk_create."""
+    if count <= 0:
+        return []
+    scope = _scope(school)
+    blocks = _blocks()
+    key = (prefix, scope)
+    values = []
+
+    block = blocks.get(key)
+    if _usable(block):
+        values.extend(block.take(min(count, block.remaining)))
+
+    missing = count - len(values)
+    if missing:
+        # One lease covers the whole batch plus a normal block for later calls
+        block = _lease(prefix, scope, missing + get_block_size())
+        values.extend(block.take(missing))
+        blocks[key] = block
+
+    return [format_business_id(prefix, value, scope) for value in values]
+
+
+def allocate(prefix, school=None):
+    """Next business ID for (prefix, school)."""
+    return reserve(prefix, 1, school=school)[0]
+
+
+def assign(objs, field, prefix):
+    """
+    Fill `field` on every object in `objs` that has no ID yet, grouped by
+    its school, with one reservation per school. Use before bulk_create().
+    """
+    pending = {}
+    for obj in objs:
+        if not getattr(obj, field):
+            pending.setdefault(getattr(obj, 'school_id', None), []).append(obj)
+    for school_pk, group in pending.items():
+        for obj, business_id in zip(group, reserve(prefix, len(group), school=school_pk)):
+            setattr(obj, field, business_id)
+    return objs
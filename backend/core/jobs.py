@@ -0,0 +1,357 @@
+"""
+Background jobs.
+
+Long operations (annual fee generation, payroll, promotions, exports)
+used to run inside the HTTP request and hit gunicorn's worker timeout.
+Views now enqueue a Job row and return its ID right away; a worker process
+(`python manage.py runworker`) runs it and records state, progress, the
+structured result or the error. Clients poll /api/jobs/<id>/.
+
+The queue is the database itself, so it runs anywhere the app runs: no
+Redis or broker needed. Workers claim jobs with a compare-and-set UPDATE
+(plus SKIP LOCKED on PostgreSQL) and hold a lease that a heartbeat thread
+extends while the handler runs; a job whose worker died is picked up again
+once its lease expires, or marked FAILED if it has no attempts left.
+
+Handlers live in `<app>/jobs.py` and are found by autodiscover():
+
+    @jobs.register('finance.generate_payroll')
+    def generate_payroll(job, month):
+        ...
+        job.progress(done, total, 'Generating payslips')
+        return {'generated': 12}
+
+    job = jobs.enqueue('finance.generate_payroll', {'month': '2025-06-01'},
+                       school=request.user.school, user=request.user)
+
+Settings:
+    JOBS_EAGER = False        # run jobs in-process on commit (local dev without a worker)
+    JOBS_LEASE_SECONDS = 300  # how long a claimed job stays with its worker without a heartbeat
+    JOBS_RETRY_DELAY = 30     # seconds before a failed attempt is retried (x attempt number)
+
+Files a job produces (exports) go to the database in FILE_CHUNK_SIZE
+pieces with store_file(), since the worker's disk is not the web
+service's; read_file() streams them back a piece at a time.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .middleware import set_current_school, set_current_user
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+# Bytes per JobFileChunk row
+FILE_CHUNK_SIZE = 1024 * 1024
+
+# Roles that see every job of their school, not only the ones they started
+JOB_ADMIN_ROLES = ('SUPER_ADMIN', 'SCHOOL_ADMIN', 'PRINCIPAL', 'ACCOUNTANT')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def register(name):
+    """Decorator registering `func(job, **payload)` as the handler of job `name`."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def autodiscover():
+    autodiscover_modules('jobs')
+
+
+def get_handler(name):
+    return _registry.get(name)
+
+
+# --- Producer side ---
+
+def enqueue(name, payload=None, school=None, user=None, max_attempts=1):
+    """Queue job `name` with a JSON-serialisable `payload` and return the Job."""
+    from .models import Job
+
+    if name not in _registry:
+        raise ValueError(f"Unknown job: {name}")
+    job = Job.objects.create(
+        name=name,
+        payload=payload or {},
+        school_id=getattr(school, 'pk', school),
+        created_by_id=getattr(user, 'pk', user),
+        max_attempts=max_attempts,
+    )
+    if _setting('JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_job(job.pk))
+    return job
+
+
+# --- Worker side ---
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _lease():
+    return timezone.now() + timedelta(seconds=_setting('JOBS_LEASE_SECONDS', 300))
+
+
+def _fail_abandoned(now):
+    """Fail jobs whose worker died on their last attempt: nothing will run them again."""
+    from .models import Job
+
+    abandoned = Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_until__lt=now, attempts__gte=F('max_attempts')
+    ).update(
+        status=Job.STATUS_FAILED,
+        error='Worker stopped before the job finished',
+        finished_at=now,
+        locked_until=None,
+    )
+    if abandoned:
+        logger.warning("Marked %d abandoned job(s) as failed", abandoned)
+
+
+def claim(worker=None):
+    """Take the oldest runnable job for this worker, or None."""
+    from .models import Job
+
+    worker = worker or worker_name()
+    _fail_abandoned(timezone.now())
+    for _ in range(5):
+        now = timezone.now()
+        runnable = Job.objects.filter(
+            Q(status=Job.STATUS_QUEUED, run_after__lte=now)
+            # Worker died mid-run, with attempts left
+            | Q(status=Job.STATUS_RUNNING, locked_until__lt=now, attempts__lt=F('max_attempts'))
+        ).order_by('run_after', 'id')
+
+        with transaction.atomic():
+            if connections[runnable.db].vendor == 'postgresql':
+                runnable = runnable.select_for_update(skip_locked=True)
+            candidate = runnable.values('pk', 'status', 'attempts').first()
+            if candidate is None:
+                return None
+            # Compare-and-set: only one worker wins, even without row locks
+            won = Job.objects.filter(
+                pk=candidate['pk'], status=candidate['status'], attempts=candidate['attempts']
+            ).update(
+                status=Job.STATUS_RUNNING,
+                attempts=F('attempts') + 1,
+                worker=worker[:100],
+                started_at=now,
+                locked_until=_lease(),
+            )
+        if won:
+            return Job.objects.select_related('school', 'created_by').get(pk=candidate['pk'])
+    return None
+
+
+class JobContext:
+    """What a handler gets as `job`: the row plus progress reporting."""
+
+    def __init__(self, job):
+        self.job = job
+        self.id = job.pk
+        self.school = job.school
+        self.user = job.created_by
+
+    def progress(self, done, total=100, message=''):
+        from .models import Job
+
+        percent = int(done * 100 / total) if total else 100
+        percent = max(0, min(percent, 99))  # 100 means finished
+        Job.objects.filter(pk=self.id).update(
+            progress=percent, message=message[:255], locked_until=_lease()
+        )
+
+
+class _Heartbeat(threading.Thread):
+    """Extends a running job's lease every third of the lease, until stopped."""
+
+    def __init__(self, job):
+        super().__init__(name=f'job-{job.pk}-heartbeat', daemon=True)
+        self.job_pk = job.pk
+        self.worker = job.worker
+        self.stopped = threading.Event()
+
+    def run(self):
+        from .models import Job
+
+        interval = _setting('JOBS_LEASE_SECONDS', 300) / 3
+        try:
+            while not self.stopped.wait(interval):
+                Job.objects.filter(
+                    pk=self.job_pk, status=Job.STATUS_RUNNING, worker=self.worker
+                ).update(locked_until=_lease())
+        except Exception:
+            logger.exception("Heartbeat of job %s stopped", self.job_pk)
+        finally:
+            connections.close_all()  # This thread's own connections
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """Run a claimed job and record the outcome. Returns the final status."""
+    from .models import Job
+
+    handler = get_handler(job.name)
+    context = JobContext(job)
+    set_current_school(school_pk=job.school_id)
+    set_current_user(job.created_by)
+    heartbeat = _Heartbeat(job)
+    heartbeat.start()
+    started = time.monotonic()
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {job.name}")
+        result = handler(context, **job.payload)
+    except Exception as e:
+        logger.exception("Job %s (%s) failed on attempt %s", job.pk, job.name, job.attempts)
+        fields = {'error': f"{type(e).__name__}: {e}", 'locked_until': None}
+        if job.attempts < job.max_attempts:
+            delay = _setting('JOBS_RETRY_DELAY', 30) * job.attempts
+            fields.update(status=Job.STATUS_QUEUED, run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            fields.update(
+                status=Job.STATUS_FAILED,
+                finished_at=timezone.now(),
+                result={'traceback': traceback.format_exc(limit=20)},
+            )
+        Job.objects.filter(pk=job.pk).update(**fields)
+        return fields['status']
+    finally:
+        heartbeat.stop()
+        set_current_school()
+        set_current_user()
+
+    logger.info("Job %s (%s) finished in %.2fs", job.pk, job.name, time.monotonic() - started)
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.STATUS_SUCCEEDED,
+        progress=100,
+        result=result,
+        error='',
+        finished_at=timezone.now(),
+        locked_until=None,
+    )
+    return Job.STATUS_SUCCEEDED
+
+
+def run_job(job_pk):
+    """Claim and run one specific job (eager mode)."""
+    from .models import Job
+
+    won = Job.objects.filter(pk=job_pk, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_RUNNING,
+        attempts=F('attempts') + 1,
+        worker=worker_name()[:100],
+        started_at=timezone.now(),
+        locked_until=_lease(),
+    )
+    if won:
+        return run(Job.objects.select_related('school', 'created_by').get(pk=job_pk))
+    return None
+
+
+def work(max_jobs=None, worker=None):
+    """Run jobs until the queue is empty (or `max_jobs` ran). Returns how many ran."""
+    count = 0
+    while max_jobs is None or count < max_jobs:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def store_file(job_pk, chunks):
+    """Store the bytes of `chunks` as job `job_pk`'s output file. Returns its size."""
+    from .models import JobFileChunk
+
+    # Left by an earlier attempt. Plain DELETE, as the audit signals would
+    # otherwise make Django load every chunk (audit.archive_period)
+    stale = JobFileChunk.objects.filter(job_id=job_pk)
+    stale._raw_delete(stale.db)
+    buffer = bytearray()
+    index = size = 0
+    for chunk in chunks:
+        buffer += chunk
+        size += len(chunk)
+        while len(buffer) >= FILE_CHUNK_SIZE:
+            JobFileChunk.objects.create(job_id=job_pk, index=index, data=bytes(buffer[:FILE_CHUNK_SIZE]))
+            del buffer[:FILE_CHUNK_SIZE]
+            index += 1
+    if buffer or not index:
+        JobFileChunk.objects.create(job_id=job_pk, index=index, data=bytes(buffer))
+    return size
+
+
+def has_file(job):
+    return job.file_chunks.exists()
+
+
+def read_file(job):
+    """The job's output file, as chunks of bytes (one row in memory at a time)."""
+    from .models import JobFileChunk
+
+    indexes = list(JobFileChunk.objects.filter(job=job).order_by('index').values_list('index', flat=True))
+    for index in indexes:
+        yield bytes(JobFileChunk.objects.values_list('data', flat=True).get(job=job, index=index))
+
+
+def visible_to(user):
+    """Jobs `user` may see: their own, or all of their school's for admin and finance roles."""
+    from .models import Job
+
+    if user.is_superuser:
+        return Job.objects.all()
+    jobs = Job.objects.filter(school_id=user.school_id)
+    if getattr(user, 'role', None) not in JOB_ADMIN_ROLES:
+        jobs = jobs.filter(created_by=user)
+    return jobs
+
+
+def accepted(job):
+    """Body of the 202 response returned by views that enqueue a job."""
+    from django.urls import reverse
+
+    return {
+        'success': True,
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('job-status', args=[job.pk]),
+    }
+
+
+def serialize(job):
+    return {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': job.result if job.status != job.STATUS_FAILED else None,
+        'error': job.error or None,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,61 @@
+"""
+Management command to roll closed months of AuditLog out to compressed files.
+Run with: python manage.py archive_audit_logs --keep-months 3
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.utils import timezone
+
+from core import audit
+from core.models import AuditLog
+
+
+class Command(BaseCommand):
+    help = 'Archives closed monthly AuditLog buckets to gzip JSONL files under MEDIA_ROOT'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--keep-months',
+            type=int,
+            default=3,
+            help='Number of most recent months (including the current one) to keep in the hot table',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would be archived without making changes',
+        )
+
+    def handle(self, *args, **options):
+        keep_months = options['keep_months']
+        dry_run = options.get('dry_run', False)
+        if keep_months < 1:
+            raise CommandError('--keep-months must be at least 1 (the current month is never archived)')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        now = timezone.localtime()
+        months = now.year * 12 + (now.month - 1) - (keep_months - 1)
+        cutoff = (months // 12) * 100 + (months % 12) + 1
+
+        buckets = (
+            AuditLog.objects.filter(period__lt=cutoff)
+            .values('period')
+            .annotate(entries=Count('id'))
+            .order_by('period')
+        )
+        if not buckets:
+            self.stdout.write(self.style.SUCCESS(f'Nothing to archive before {cutoff}'))
+            return
+
+        for bucket in buckets:
+            period = bucket['period']
+            if dry_run:
+                self.stdout.write(f"  Would archive {period}: {bucket['entries']} entries")
+                continue
+            archive = audit.archive_period(period)
+            if archive:
+                self.stdout.write(f"  Archived {period}: {archive.entries} entries -> {archive.path}")
+
+        self.stdout.write(self.style.SUCCESS('Audit log archival complete.'))
@@ -0,0 +1,122 @@
+"""
+Benchmark: how many queries does one audited save cost?
+
+Compares the legacy audit handlers (re-fetch of the row before every
+update, one INSERT per save, object_repr via str(instance)) with the
+buffered pipeline in core.audit and the dirty-field tracking in
+core.tracking. Everything runs
+inside a transaction that is rolled back, so it is safe on any database.
+
+Run with: python manage.py benchmark_audit --saves 50
+"""
+from decimal import Decimal
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models.signals import post_save, pre_save
+from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core import audit, signals
+from core.models import AuditLog
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_capture_previous_state(sender, instance, **kwargs):
+    """The pre-tracking handler: SELECT the old row before every update."""
+    if sender.__name__ in signals.IGNORED_MODELS or not instance.pk:
+        return
+    old_instance = sender.objects.filter(pk=instance.pk).first()
+    instance._old_state = model_to_dict(old_instance) if old_instance else None
+
+
+def legacy_log_save(sender, instance, created, **kwargs):
+    """The pre-pipeline handler: synchronous create + str(instance)."""
+    if sender.__name__ in signals.IGNORED_MODELS:
+        return
+    AuditLog.objects.create(
+        user=None,
+        action=AuditLog.ACTION_CREATE if created else AuditLog.ACTION_UPDATE,
+        model_name=sender.__name__,
+        object_id=str(instance.pk),
+        object_repr=str(instance),
+        changes=None,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Measure queries per audited save: legacy handler vs buffered audit pipeline'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--saves', type=int, default=50, help='Number of invoice saves per run')
+
+    def handle(self, *args, **options):
+        saves = options['saves']
+        results = []
+
+        try:
+            with transaction.atomic():
+                invoice_ids = self._create_fixtures(saves)
+
+                post_save.disconnect(signals.log_save)
+                pre_save.connect(legacy_capture_previous_state)
+                post_save.connect(legacy_log_save)
+                try:
+                    results.append(('legacy', self._measure(invoice_ids)))
+                finally:
+                    post_save.disconnect(legacy_log_save)
+                    pre_save.disconnect(legacy_capture_previous_state)
+                    post_save.connect(signals.log_save)
+
+                with override_settings(AUDIT_LOG_WRITER=audit.WRITER_BUFFERED):
+                    results.append(('buffered', self._measure(invoice_ids)))
+
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{'mode':<10} {'saves':>6} {'queries':>8} {'per save':>9} {'audit inserts':>14}")
+        for mode, (total, inserts) in results:
+            self.stdout.write(f"{mode:<10} {saves:>6} {total:>8} {total / saves:>9.2f} {inserts:>14}")
+
+    def _measure(self, invoice_ids):
+        from finance.models import Invoice
+
+        # Fresh instances without select_related, like a typical view/service
+        invoices = list(Invoice.objects.filter(id__in=invoice_ids))
+        with CaptureQueriesContext(connection) as ctx:
+            for invoice in invoices:
+                invoice.paid_amount += Decimal('1.00')
+                invoice.save()
+            # Stand-in for the commit that never happens inside the rollback block
+            audit.flush()
+
+        inserts = sum(1 for q in ctx.captured_queries if 'INSERT INTO "core_auditlog"' in q['sql'])
+        return len(ctx.captured_queries), inserts
+
+    def _create_fixtures(self, count):
+        from schools.models import School, AcademicYear
+        from students.models import Student
+        from finance.models import Invoice
+
+        school = School.objects.create(name='Audit Benchmark School')
+        year = AcademicYear.objects.create(
+            school=school, name='BENCH', start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+        )
+        student = Student.objects.create(
+            school=school, academic_year=year, first_name='Bench', last_name='Mark',
+            enrollment_number='BENCH-001', date_of_birth=date(2012, 1, 1), gender='M',
+        )
+        ids = []
+        for _ in range(count):
+            invoice = Invoice.objects.create(
+                school=school, student=student, academic_year=year,
+                total_amount=Decimal('10000.00'), due_date=date(2024, 6, 15),
+            )
+            ids.append(invoice.id)
+        audit.flush()
+        return ids
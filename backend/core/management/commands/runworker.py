@@ -0,0 +1,63 @@
+"""
+Management command to run queued background jobs (core.jobs).
+Run with: python manage.py runworker
+"""
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue until stopped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs that are queued now, then exit',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=2.0,
+            help='Seconds to wait between polls when the queue is empty',
+        )
+        parser.add_argument(
+            '--max-jobs',
+            type=int,
+            default=None,
+            help='Exit after running this many jobs (lets a supervisor recycle the process)',
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        worker = jobs.worker_name()
+        max_jobs = options['max_jobs']
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} started'))
+
+        done = 0
+        while not self.stopping and (max_jobs is None or done < max_jobs):
+            close_old_connections()
+            job = jobs.claim(worker)
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            self.stdout.write(f'  Job {job.pk} ({job.name}) started')
+            outcome = jobs.run(job)
+            done += 1
+            self.stdout.write(f'  Job {job.pk} ({job.name}) {outcome}')
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker} stopped after {done} job(s).'))
+
+    def _stop(self, signum, frame):
+        # Finish the current job, then exit
+        self.stopping = True
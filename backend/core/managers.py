@@ -0,0 +1,39 @@
+"""
+Tenant-scoped managers.
+
+Models with a `school` FK use `objects = TenantManager()` and list views
+call `Model.objects.for_current_school()`. The filter goes straight to the
+local `school_id` column, so no JOIN to schools_school is needed.
+"""
+from django.db import models
+
+from .middleware import get_current_school_id, get_current_school_pk, resolve_school_pk
+
+
+class TenantQuerySet(models.QuerySet):
+    def for_school(self, school):
+        """Filter by a School instance, its integer PK or its business ID (SCH-...)."""
+        if isinstance(school, models.Model):
+            return self.filter(school_id=school.pk)
+        if isinstance(school, str) and not school.isdigit():
+            pk = resolve_school_pk(school)
+            return self.filter(school_id=pk) if pk is not None else self.none()
+        return self.filter(school_id=school)
+
+    def for_current_school(self):
+        """
+        Filter by the tenant bound by TenantMiddleware.
+
+        Unscoped when no tenant is bound (superuser / internal calls), empty
+        when the tenant header names a school that does not exist.
+        """
+        school_pk = get_current_school_pk()
+        if school_pk is not None:
+            return self.filter(school_id=school_pk)
+        if get_current_school_id():
+            return self.none()
+        return self
+
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    pass
@@ -1,11 +1,112 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
 from django.http import JsonResponse
 from django.utils.translation import gettext as _
 from asgiref.local import Local
 
 _thread_locals = Local()
 
+
+class SchoolKeyCache:
+    """
+    Process-level LRU mapping a school's business ID (SCH-...) to its
+    integer PK and back. Business IDs are immutable, so entries only go
+    stale when a school is deleted (see core.signals).
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._by_business_id = OrderedDict()
+        self._by_pk = {}
+        self._lock = threading.Lock()
+
+    def _store(self, business_id, pk):
+        self._by_business_id[business_id] = pk
+        self._by_business_id.move_to_end(business_id)
+        self._by_pk[pk] = business_id
+        while len(self._by_business_id) > self.maxsize:
+            _business_id, old_pk = self._by_business_id.popitem(last=False)
+            self._by_pk.pop(old_pk, None)
+
+    def get_pk(self, business_id):
+        with self._lock:
+            if business_id in self._by_business_id:
+                self._by_business_id.move_to_end(business_id)
+                return self._by_business_id[business_id]
+
+        from schools.models import School
+        pk = School.objects.filter(school_id=business_id).values_list('id', flat=True).first()
+        if pk is not None:
+            # Misses are not cached: an unknown header value must not pin memory
+            with self._lock:
+                self._store(business_id, pk)
+        return pk
+
+    def get_business_id(self, pk):
+        with self._lock:
+            if pk in self._by_pk:
+                business_id = self._by_pk[pk]
+                self._by_business_id.move_to_end(business_id)
+                return business_id
+
+        from schools.models import School
+        business_id = School.objects.filter(id=pk).values_list('school_id', flat=True).first()
+        if business_id is not None:
+            with self._lock:
+                self._store(business_id, pk)
+        return business_id
+
+    def forget(self, business_id=None, pk=None):
+        with self._lock:
+            if business_id is None:
+                business_id = self._by_pk.get(pk)
+            pk = self._by_business_id.pop(business_id, pk)
+            self._by_pk.pop(pk, None)
+
+    def clear(self):
+        with self._lock:
+            self._by_business_id.clear()
+            self._by_pk.clear()
+
+
+school_keys = SchoolKeyCache(maxsize=getattr(settings, 'TENANT_CACHE_SIZE', 1024))
+
+_UNRESOLVED = object()
+
+
+def resolve_school_pk(business_id):
+    """Integer PK for a school business ID (cached), or None if unknown."""
+    if not business_id:
+        return None
+    return school_keys.get_pk(business_id)
+
+
 def get_current_school_id():
-    return getattr(_thread_locals, 'school_id', None)
+    """Business ID (SCH-...) of the current tenant."""
+    school_id = getattr(_thread_locals, 'school_id', None)
+    if school_id is None:
+        school_pk = getattr(_thread_locals, 'school_pk', _UNRESOLVED)
+        if school_pk not in (_UNRESOLVED, None):
+            school_id = school_keys.get_business_id(school_pk)
+            _thread_locals.school_id = school_id
+    return school_id
+
+
+def get_current_school_pk():
+    """Integer PK of the current tenant, resolved at most once per request."""
+    school_pk = getattr(_thread_locals, 'school_pk', _UNRESOLVED)
+    if school_pk is _UNRESOLVED:
+        school_pk = resolve_school_pk(getattr(_thread_locals, 'school_id', None))
+        _thread_locals.school_pk = school_pk
+    return school_pk
+
+
+def set_current_school(school_id=None, school_pk=_UNRESOLVED):
+    """Bind the tenant for the current thread/task (requests, jobs, commands)."""
+    _thread_locals.school_id = school_id
+    _thread_locals.school_pk = school_pk
+
 
 class TenantMiddleware:
     """
@@ -16,30 +117,38 @@ class TenantMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
+        # Nothing may leak from the previous request served by this thread
+        set_current_school()
+
         if request.path.startswith('/admin/'):
             # Even for admin, we might want to log who did it if we can.
             if request.user.is_authenticated:
                 _thread_locals.user = request.user
+            else:
+                _thread_locals.user = None
             return self.get_response(request)
 
-        school_id = None
-        
         # 1. Source from Authenticated User (Highest Priority & Trust)
         if request.user.is_authenticated:
             _thread_locals.user = request.user # Store user for Audit Log
-            if hasattr(request.user, 'school') and request.user.school:
-                school_id = request.user.school.school_id
+            if getattr(request.user, 'school_id', None):
+                # FK column: no need to load the School row
+                set_current_school(school_pk=request.user.school_id)
+                return self.get_response(request)
         else:
             _thread_locals.user = None
-        
+
         # 2. Source from Header (For public endpoints / login)
-        if not school_id:
-            school_id = request.headers.get('X-School-ID')
-        
+        school_id = request.headers.get('X-School-ID')
         if school_id:
-            _thread_locals.school_id = school_id
-        
+            set_current_school(school_id=school_id)
+
         return self.get_response(request)
 
 def get_current_user():
     return getattr(_thread_locals, 'user', None)
+
+
+def set_current_user(user=None):
+    """Bind the acting user (audit attribution) outside of a request, e.g. in jobs."""
+    _thread_locals.user = user
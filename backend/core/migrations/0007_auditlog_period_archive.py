@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:14
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_period(apps, schema_editor):
+    AuditLog = apps.get_model('core', 'AuditLog')
+    bounds = AuditLog.objects.aggregate(first=models.Min('timestamp'), last=models.Max('timestamp'))
+    if not bounds['first']:
+        return
+    # One UPDATE per month instead of touching rows one by one
+    current = timezone.localtime(bounds['first']).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last = timezone.localtime(bounds['last'])
+    while current <= last:
+        if current.month == 12:
+            following = current.replace(year=current.year + 1, month=1)
+        else:
+            following = current.replace(month=current.month + 1)
+        AuditLog.objects.filter(timestamp__gte=current, timestamp__lt=following).update(
+            period=current.year * 100 + current.month
+        )
+        current = following
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_coreuser_can_manage_leaves'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditArchive',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('period', models.PositiveIntegerField(db_index=True)),
+                ('path', models.CharField(max_length=255)),
+                ('entries', models.PositiveIntegerField(default=0)),
+                ('first_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('last_timestamp', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['period', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='period',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['model_name', 'object_id', 'timestamp'], name='auditlog_object_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['user', 'timestamp'], name='auditlog_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['period'], name='auditlog_period_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_auditlog_period_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BusinessIdSequence',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('prefix', models.CharField(max_length=20)),
+                ('scope', models.PositiveIntegerField(default=0)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+            ],
+            options={
+                'unique_together': {('prefix', 'scope')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobFileChunk',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('index', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='file_chunks', to='core.job')),
+            ],
+            options={
+                'unique_together': {('job', 'index')},
+            },
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from schools.models import School
 from .utils import generate_business_id
@@ -63,7 +64,7 @@ class CoreUser(AbstractUser):
             elif self.role == self.ROLE_SCHOOL_ADMIN: prefix = 'ADM'
             elif self.role == self.ROLE_PRINCIPAL: prefix = 'PRN'
             
-            self.user_id = generate_business_id(prefix)
+            self.user_id = generate_business_id(prefix, school=self.school_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -88,8 +89,140 @@ class AuditLog(models.Model):
     object_repr = models.CharField(max_length=255)
     changes = models.JSONField(null=True, blank=True) # Stores old/new values
     timestamp = models.DateTimeField(auto_now_add=True)
+    # Monthly bucket (YYYYMM, local time). Closed buckets are rolled out to
+    # compressed files by `archive_audit_logs`, see AuditArchive.
+    period = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['model_name', 'object_id', 'timestamp'], name='auditlog_object_ts_idx'),
+            models.Index(fields=['user', 'timestamp'], name='auditlog_user_ts_idx'),
+            models.Index(fields=['period'], name='auditlog_period_idx'),
+        ]
+
+    @staticmethod
+    def period_for(value=None):
+        value = timezone.localtime(value) if value else timezone.localtime()
+        return value.year * 100 + value.month
+
+    def save(self, *args, **kwargs):
+        if not self.period:
+            self.period = self.period_for(self.timestamp)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.action} {self.model_name} by {self.user} at {self.timestamp}"
 
 
+class AuditArchive(models.Model):
+    """
+    One compressed JSONL segment (gzip, one AuditLog row per line) holding
+    entries rolled out of the hot AuditLog table.
+    """
+    id = models.AutoField(primary_key=True)
+    period = models.PositiveIntegerField(db_index=True)  # YYYYMM
+    path = models.CharField(max_length=255)  # Relative to MEDIA_ROOT
+    entries = models.PositiveIntegerField(default=0)
+    first_timestamp = models.DateTimeField(null=True, blank=True)
+    last_timestamp = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['period', 'id']
+
+    def __str__(self):
+        return f"{self.period} ({self.entries} entries)"
+
+
+
+
+class BusinessIdSequence(models.Model):
+    """
+    Counter behind business IDs (INV-..., RCP-...), one row per
+    (prefix, school). Workers lease blocks of numbers from it, see core.ids.
+    """
+    # Leases use queryset.update(); nothing worth diffing or auditing here
+    track_changes = False
+
+    id = models.AutoField(primary_key=True)
+    prefix = models.CharField(max_length=20)
+    scope = models.PositiveIntegerField(default=0)  # School PK, 0 = global (schools, users without school)
+    next_value = models.PositiveBigIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('prefix', 'scope')
+
+    def __str__(self):
+        return f"{self.prefix}/{self.scope}: {self.next_value}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work (fee generation, payroll, promotions, ...),
+    queued by a view and picked up by `manage.py runworker`. See core.jobs.
+    """
+    # Progress is written many times per run; nothing worth diffing or auditing
+    track_changes = False
+
+    STATUS_QUEUED = 'QUEUED'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_SUCCEEDED = 'SUCCEEDED'
+    STATUS_FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=100)  # Registered handler, e.g. 'finance.generate_annual_fees'
+    school = models.ForeignKey(School, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    created_by = models.ForeignKey('CoreUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    payload = models.JSONField(default=dict, blank=True)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)  # 0-100
+    message = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)  # Lease of the worker running it
+    worker = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['school', 'created_at'], name='job_school_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class JobFileChunk(models.Model):
+    """
+    A piece of a file produced by a job (e.g. a document export), kept in the
+    database so the web service can serve what a worker process wrote.
+    See core.jobs.store_file / read_file.
+    """
+    # Bulk binary data; nothing worth diffing or auditing
+    track_changes = False
+
+    id = models.AutoField(primary_key=True)
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name='file_chunks')
+    index = models.PositiveIntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        unique_together = ('job', 'index')
+
+    def __str__(self):
+        return f"Job #{self.job_id} chunk {self.index}"
@@ -1,7 +1,200 @@
+"""
+Pagination classes.
+
+Page-number pagination runs a COUNT(*) and an OFFSET scan for every page,
+which gets slower the deeper a client pages into a large table. Views that
+declare `keyset_ordering` (indexed, non-null columns ending with a unique
+one, e.g. ('-created_at', '-id')) also accept keyset (cursor) pagination:
+
+    GET /api/finance/receipts/?pagination=cursor          first page
+    GET /api/finance/receipts/?cursor=<opaque token>      following pages
+    GET /api/finance/receipts/?pagination=cursor&with_count=1
+
+Each page is a `WHERE (created_at, id) < (last seen)` range read on the
+index. The cursor is a signed token (clients must not build their own).
+`with_count=1` adds a total, estimated by the planner on PostgreSQL for
+large results. Requests without these parameters keep page numbers, so
+clients can migrate one screen at a time.
+"""
+import json
+
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+# Below this many (estimated) rows an exact COUNT(*) is cheap enough
+APPROXIMATE_COUNT_THRESHOLD = 10000
+
+
+def approximate_count(queryset):
+    """(count, is_approximate): planner estimate on PostgreSQL, exact COUNT(*) otherwise."""
+    queryset = queryset.order_by()
+    if connections[queryset.db].vendor == 'postgresql':
+        try:
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+        except (ValueError, KeyError, IndexError, TypeError):
+            estimate = None
+        if estimate is not None and estimate >= APPROXIMATE_COUNT_THRESHOLD:
+            return estimate, True
+    return queryset.count(), False
+
+
+class KeysetPaginationMixin:
+    """
+    Opt-in keyset pagination on top of PageNumberPagination (see module
+    docstring). Active when the view has `keyset_ordering` and the request
+    carries `cursor` or `pagination=cursor`.
+    """
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    count_query_param = 'with_count'
+
+    def uses_keyset(self, request, view):
+        if not getattr(view, 'keyset_ordering', None):
+            return False
+        params = request.query_params
+        return self.cursor_query_param in params or params.get(self.mode_query_param) == 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.uses_keyset(request, view)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.ordering = tuple(view.keyset_ordering)
+        page_size = self.get_page_size(request)
+        model = queryset.model
+
+        token = request.query_params.get(self.cursor_query_param)
+        position, backwards = self.decode_cursor(token, model) if token else (None, False)
+
+        ordering = self._reverse(self.ordering) if backwards else self.ordering
+        page_qs = queryset.order_by(*ordering)
+        if position is not None:
+            page_qs = page_qs.filter(self._after(ordering, position))
+
+        rows = list(page_qs[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = approximate_count(queryset)
+
+        # Forward: more rows after this page -> next; came from a cursor -> previous
+        self.next_position = self.previous_position = None
+        if rows:
+            if backwards:
+                self.previous_position = self._position(rows[0]) if has_more else None
+                self.next_position = self._position(rows[-1])
+            else:
+                self.next_position = self._position(rows[-1]) if has_more else None
+                self.previous_position = self._position(rows[0]) if position is not None else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not getattr(self, 'keyset', False):
+            return super().get_paginated_response(data)
+
+        payload = {
+            'next': self._link(self.next_position, backwards=False),
+            'previous': self._link(self.previous_position, backwards=True),
+        }
+        if self.count is not None:
+            payload['count'], payload['count_is_approximate'] = self.count
+        payload['results'] = data
+        return Response(payload)
+
+    # --- Cursors ---
+
+    def encode_cursor(self, position, backwards):
+        return signing.dumps({'p': position, 'b': int(backwards)}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, token, model):
+        try:
+            payload = signing.loads(token, salt=CURSOR_SALT)
+            values = payload['p']
+            if len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                model._meta.get_field(name.lstrip('-')).to_python(value)
+                for name, value in zip(self.ordering, values)
+            ]
+            return position, bool(payload.get('b'))
+        except (signing.BadSignature, FieldDoesNotExist, ValidationError, KeyError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+
+    def _position(self, obj):
+        values = []
+        for name in self.ordering:
+            value = getattr(obj, obj._meta.get_field(name.lstrip('-')).attname)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return values
+
+    def _link(self, position, backwards):
+        if position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, backwards))
+
+    # --- Keyset filter ---
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+    def _after(self, ordering, position):
+        """Rows strictly after `position` in `ordering`: (a > x) OR (a = x AND b > y) ..."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, position):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        if not getattr(view, 'keyset_ordering', None):
+            return parameters
+        return parameters + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" for keyset pagination (first page).',
+                'schema': {'type': 'string', 'enum': ['cursor']},
+            },
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor from a previous next/previous link.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Cursor mode only: include an (approximate) total count.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
 
 
-class StandardResultsPagination(PageNumberPagination):
+class StandardResultsPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     Standard pagination for most endpoints.
     Returns 20 items per page by default.
@@ -12,7 +205,7 @@ class StandardResultsPagination(PageNumberPagination):
     max_page_size = 100
 
 
-class LargeResultsPagination(PageNumberPagination):
+class LargeResultsPagination(KeysetPaginationMixin, PageNumberPagination):
     """
     Pagination for endpoints that typically return larger datasets.
     Returns 50 items per page by default.
@@ -0,0 +1,130 @@
+"""
+Rendered-document cache.
+
+Rendered PDFs are stored under MEDIA_ROOT, addressed by what went into
+them:
+
+    MEDIA_ROOT/pdf_cache/<kind>/<pk>/<version>.pdf
+
+where `version` is a hash of the values that feed the template (the
+template context, plus a layout version of the caller's). A document whose
+inputs are unchanged is served from disk; any change to those inputs
+gives a new version, and writing it removes the older ones of that
+document. Saving or deleting the source row drops its directory too
+(finance.signals), so edits and payments never leave stale files behind.
+
+Downloads carry the version as ETag: a client that still has it gets 304
+without the file being opened.
+
+Usage:
+    return pdf_cache.serve(request, 'receipt', receipt.pk, context,
+                           lambda: render_receipt(context), f'Receipt_{receipt.receipt_no}.pdf')
+"""
+import hashlib
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponseNotModified
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = 'pdf_cache'
+
+
+def version(values):
+    """Content hash of the values that feed a document's template."""
+    encoded = json.dumps(values, cls=DjangoJSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()[:32]
+
+
+def directory(kind, pk):
+    return Path(settings.MEDIA_ROOT) / CACHE_DIR / kind / str(pk)
+
+
+def path(kind, pk, digest):
+    return directory(kind, pk) / f'{digest}.pdf'
+
+
+def lookup(kind, pk, values):
+    """(path or None, version): the cached file of this version, if any."""
+    digest = version(values)
+    target = path(kind, pk, digest)
+    return (target if target.exists() else None), digest
+
+
+def store(kind, pk, digest, content):
+    """Write rendered `content` as version `digest` and drop older versions. Returns the path."""
+    target = path(kind, pk, digest)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so concurrent readers never see half a file
+    handle, temporary = tempfile.mkstemp(dir=target.parent, suffix='.tmp')
+    with os.fdopen(handle, 'wb') as stream:
+        stream.write(content)
+    os.replace(temporary, target)
+    for stale in target.parent.glob('*.pdf'):
+        if stale != target:
+            stale.unlink(missing_ok=True)
+    return target
+
+
+def get_or_render(kind, pk, values, render):
+    """
+    (path, version, rendered) of the document. `render()` returns the PDF
+    bytes and is only called when this version is not on disk yet.
+    """
+    digest = version(values)
+    target, rendered = _fetch(kind, pk, digest, render)
+    return target, digest, rendered
+
+
+def _fetch(kind, pk, digest, render):
+    target = path(kind, pk, digest)
+    if target.exists():
+        return target, False
+
+    started = time.monotonic()
+    content = render()
+    target = store(kind, pk, digest, content)
+    logger.debug("Rendered %s %s (%d bytes) in %.3fs", kind, pk, len(content), time.monotonic() - started)
+    return target, True
+
+
+def invalidate(kind, pk):
+    """Drop every cached version of a document."""
+    shutil.rmtree(directory(kind, pk), ignore_errors=True)
+
+
+def _matches(request, etag):
+    candidates = request.headers.get('If-None-Match', '')
+    return any(candidate.strip().removeprefix('W/') in (etag, '*') for candidate in candidates.split(','))
+
+
+def serve(request, kind, pk, values, render, filename):
+    """
+    FileResponse of the cached document (rendered first if needed), with
+    its version as ETag; 304 when the client's copy is current.
+    """
+    digest = version(values)
+    etag = f'"{digest}"'
+    if _matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        target, _ = _fetch(kind, pk, digest, render)
+        try:
+            stream = open(target, 'rb')
+        except FileNotFoundError:
+            # Invalidated between the render and the open: serve it uncached
+            stream = io.BytesIO(render())
+        response = FileResponse(stream, filename=filename, content_type='application/pdf')
+    response['ETag'] = etag
+    # Always revalidate: the same URL shows the document's current version
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,6 +1,174 @@
+from django.core.cache import cache
 from rest_framework import permissions
 from .models import CoreUser
 
+# CoreUser boolean flags -> permission strings (as sent to the web/mobile clients)
+FLAG_PERMISSIONS = (
+    ('can_access_finance', 'can_access_finance'),
+    ('can_access_transport', 'can_access_transport'),
+    ('can_access_certificates', 'can_access_certificates'),
+    ('can_access_student_records', 'can_access_student_records'),
+    ('can_access_attendance', 'can_access_attendance'),
+    ('can_manage_payroll', 'core.can_manage_payroll'),
+    ('can_manage_leaves', 'core.can_manage_leaves'),
+    ('can_mark_manual_attendance', 'core.can_mark_manual_attendance'),
+    ('can_use_mobile_app', 'can_use_mobile_app'),
+)
+
+METHOD_ACTIONS = {
+    'GET': 'view',
+    'POST': 'add',
+    'PUT': 'change',
+    'PATCH': 'change',
+    'DELETE': 'delete',
+    'HEAD': 'view',
+    'OPTIONS': 'view',
+}
+
+PERMISSION_CACHE_TIMEOUT = 60 * 60
+GLOBAL_VERSION_KEY = 'perms_ver:global'
+
+# --- Compiled per-user permission sets ---
+
+def _user_version_key(user_pk):
+    return f'perms_ver:{user_pk}'
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Missing key: start the counter (another process may have raced us)
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def invalidate_user_permissions(user_pk):
+    """Called when a user's flags, groups or direct permissions change."""
+    _bump(_user_version_key(user_pk))
+
+
+def invalidate_all_permissions():
+    """Called when group permissions change (affects every member)."""
+    _bump(GLOBAL_VERSION_KEY)
+
+
+def compile_permissions(user):
+    """Django perms (user + groups) plus the CoreUser boolean flags, as one frozenset."""
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    compiled = set(user.get_all_permissions())
+    if user.is_superuser:
+        # Superuser gets ALL permissions regardless of flags
+        compiled.add('is_superuser')
+        compiled.update(name for _, name in FLAG_PERMISSIONS)
+    else:
+        compiled.update(name for flag, name in FLAG_PERMISSIONS if getattr(user, flag, False))
+    return frozenset(compiled)
+
+
+def get_permission_set(user):
+    """
+    Compiled permission set for `user`, computed at most once per request.
+
+    Backed by the shared cache under a key that embeds the user's and the
+    global permission versions, so bumping a version makes old entries
+    unreachable instead of having to find and delete them.
+    """
+    compiled = getattr(user, '_compiled_permissions', None)
+    if compiled is not None:
+        return compiled
+    if not user or not user.is_authenticated:
+        return frozenset()
+
+    user_key = _user_version_key(user.pk)
+    versions = cache.get_many([user_key, GLOBAL_VERSION_KEY])
+    key = f"perms:{user.pk}:{versions.get(user_key, 0)}:{versions.get(GLOBAL_VERSION_KEY, 0)}"
+
+    compiled = cache.get(key)
+    if compiled is None:
+        compiled = compile_permissions(user)
+        cache.set(key, compiled, timeout=PERMISSION_CACHE_TIMEOUT)
+
+    user._compiled_permissions = compiled
+    return compiled
+
+
+# --- View -> model resolution ---
+
+_view_models = {}
+
+
+def _view_class(view):
+    return view if isinstance(view, type) else type(view)
+
+
+def get_view_model(view):
+    """
+    Model a view operates on, resolved once per view class.
+
+    `queryset` class attributes are resolved when the URLconf loads (see
+    compile_view_models). Views that only define get_queryset() are
+    resolved on their first request and memoized from then on.
+    """
+    view_cls = _view_class(view)
+    if view_cls in _view_models:
+        return _view_models[view_cls]
+
+    queryset = getattr(view_cls, 'queryset', None)
+    if queryset is not None:
+        _view_models[view_cls] = queryset.model
+        return queryset.model
+
+    if isinstance(view, type) or not hasattr(view, 'get_queryset'):
+        if not hasattr(view_cls, 'get_queryset'):
+            # Custom APIView: no model to check against
+            _view_models[view_cls] = None
+        return None
+
+    try:
+        qs = view.get_queryset()
+    except Exception:
+        return None
+    if qs is None:
+        return None
+    _view_models[view_cls] = qs.model
+    return qs.model
+
+
+def compile_view_models(urlpatterns):
+    """Resolve the model of every DRF view reachable from `urlpatterns`."""
+    from django.urls import URLPattern, URLResolver
+
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            compile_view_models(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern):
+            view_cls = getattr(pattern.callback, 'cls', None)
+            if view_cls is not None:
+                get_view_model(view_cls)
+
+
+def has_model_permission(user, model_cls, action='view'):
+    """
+    Whether `user` may `action` ('view', 'add', 'change', 'delete') rows of
+    `model_cls`, as StandardPermission decides it. For views that pick the
+    model per request.
+    """
+    if user.is_superuser:
+        return True
+
+    perm_codename = f"{model_cls._meta.app_label}.{action}_{model_cls._meta.model_name}"
+
+    if perm_codename in get_permission_set(user):
+        return True
+
+    # Fallback: Allow SCHOOL_ADMIN to manage data if they don't have explicit Django perm
+    # This handles cases where Group permissions weren't set up perfectly in seeding
+    return user.role in [CoreUser.ROLE_SCHOOL_ADMIN, CoreUser.ROLE_PRINCIPAL]
+
+
 class StandardPermission(permissions.BasePermission):
     """
     Unified Permission Class.
@@ -18,62 +186,26 @@ class StandardPermission(permissions.BasePermission):
             return False
 
         # 3. Method-to-Action Mapping
-        # GET -> view
-        # POST -> add
-        # PUT/PATCH -> change
-        # DELETE -> delete
-        METHOD_ACTIONS = {
-            'GET': 'view',
-            'POST': 'add',
-            'PUT': 'change',
-            'PATCH': 'change',
-            'DELETE': 'delete',
-            'HEAD': 'view',
-            'OPTIONS': 'view',
-        }
-        
         action = METHOD_ACTIONS.get(request.method, 'view')
-        
-        # We need to know the model this view is handling.
-        # ViewSets usually have .queryset.model or .serializer_class.Meta.model
-        model_cls = None
-        if hasattr(view, 'queryset') and view.queryset is not None:
-             model_cls = view.queryset.model
-        elif hasattr(view, 'get_queryset'):
-             # Try to get queryset result
-             try:
-                 qs = view.get_queryset()
-                 if qs is not None: model_cls = qs.model
-             except:
-                 pass
-        
+
+        # We need to know the model this view is handling (resolved once per view class)
+        model_cls = get_view_model(view)
+
         if not model_cls:
             # Fallback if we can't determine model (e.g. custom APIView)
             # We assume view handles its own specific checks or allows authenticated
-            return True 
-
-        app_label = model_cls._meta.app_label
-        model_name = model_cls._meta.model_name
-        perm_codename = f"{app_label}.{action}_{model_name}"
-
-        if request.user.has_perm(perm_codename):
             return True
 
-        # Fallback: Allow SCHOOL_ADMIN to manage data if they don't have explicit Django perm
-        # This handles cases where Group permissions weren't set up perfectly in seeding
-        if request.user.role in [CoreUser.ROLE_SCHOOL_ADMIN, CoreUser.ROLE_PRINCIPAL]:
-            return True
-
-        return False
+        return has_model_permission(request.user, model_cls, action)
 
     def has_object_permission(self, request, view, obj):
         # 1. Superuser Bypass
         if request.user.is_superuser:
             return True
 
-        # 2. School Isolation
-        if hasattr(obj, 'school'):
-            if obj.school != request.user.school:
+        # 2. School Isolation (FK columns, no need to load either School)
+        if hasattr(obj, 'school_id') and hasattr(obj, 'school'):
+            if obj.school_id != request.user.school_id:
                 return False
-        
+
         return True
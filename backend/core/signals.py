@@ -1,71 +1,113 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_save, post_delete, post_migrate, m2m_changed
 from django.dispatch import receiver
-from django.forms.models import model_to_dict
-from django.db.utils import OperationalError, ProgrammingError
-from .models import AuditLog
-from .middleware import get_current_user
-import json
-from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.authtoken.models import Token
+from schools.models import School
+from .models import AuditLog, CoreUser
+from .middleware import get_current_user, school_keys
+from . import audit, authentication, ids, tracking
+from .permissions import invalidate_user_permissions as bump_user_permissions, invalidate_all_permissions
 
 
 # Ignore specific models to avoid noise/recursion
-IGNORED_MODELS = ['AuditLog', 'Session', 'LogEntry']
-
-@receiver(pre_save)
-def capture_previous_state(sender, instance, **kwargs):
-    if sender.__name__ in IGNORED_MODELS:
-        return
-    if instance.pk:
-        try:
-            old_instance = sender.objects.get(pk=instance.pk)
-            instance._old_state = model_to_dict(old_instance)
-        except sender.DoesNotExist:
-            instance._old_state = None
-    else:
-        instance._old_state = None
+# ('Migration' is the migration recorder, saved before core_auditlog exists)
+IGNORED_MODELS = [
+    'AuditLog', 'Session', 'LogEntry', 'Migration', 'BusinessIdSequence',
+    'SchoolCounters', 'DailyCounters', 'Job', 'StudentLedger',
+    'DailyCollection', 'MonthlyInvoicing', 'JobFileChunk', 'AuditArchive',
+]
 
 @receiver(post_save)
-def log_save(sender, instance, created, **kwargs):
+def log_save(sender, instance, created, using=None, **kwargs):
     if sender.__name__ in IGNORED_MODELS:
         return
-        
-    user = get_current_user()
+
     action = AuditLog.ACTION_CREATE if created else AuditLog.ACTION_UPDATE
-    
+
+    # Diff computed in memory from the snapshot taken at load time (core.tracking)
     changes = {}
-    if not created and hasattr(instance, '_old_state'):
-        new_state = model_to_dict(instance)
-        for key, value in new_state.items():
-            if key in instance._old_state and instance._old_state[key] != value:
-                changes[key] = {'old': str(instance._old_state[key]), 'new': str(value)}
-    
-    try:
-        AuditLog.objects.create(
-            user=user,
-            action=action,
-            model_name=sender.__name__,
-            object_id=str(instance.pk),
-            object_repr=str(instance),
-            changes=changes if changes else None
-        )
-    except (OperationalError, ProgrammingError):
-        # Table might not exist yet during migrations
-        pass
+    if not created:
+        for key, (old, new) in (tracking.saved_changes(instance) or {}).items():
+            changes[key] = {'old': str(old), 'new': str(new)}
+
+    # Buffered per transaction, flushed with one bulk_create on commit
+    audit.record(action, instance, user=get_current_user(), changes=changes, using=using)
 
 @receiver(post_delete)
-def log_delete(sender, instance, **kwargs):
+def log_delete(sender, instance, using=None, **kwargs):
     if sender.__name__ in IGNORED_MODELS:
         return
-        
-    user = get_current_user()
-    try:
-        AuditLog.objects.create(
-            user=user,
-            action=AuditLog.ACTION_DELETE,
-            model_name=sender.__name__,
-            object_id=str(instance.pk),
-            object_repr=str(instance),
-            changes={'info': 'Object Deleted'}
-        )
-    except (OperationalError, ProgrammingError):
-        pass
+
+    audit.record(
+        AuditLog.ACTION_DELETE,
+        instance,
+        user=get_current_user(),
+        changes={'info': 'Object Deleted'},
+        using=using,
+    )
+
+@receiver(post_delete, sender=School)
+def forget_school_key(sender, instance, **kwargs):
+    # Drop the business ID -> PK mapping used by TenantMiddleware
+    school_keys.forget(business_id=instance.school_id, pk=instance.pk)
+
+
+# --- Token auth cache invalidation (core.authentication) ---
+
+@receiver(post_save, sender=CoreUser)
+def invalidate_user_auth_cache(sender, instance, created, **kwargs):
+    if not created:
+        authentication.invalidate_user(instance.pk)
+    # Also on create: a reused PK must never see a previous user's set
+    bump_user_permissions(instance.pk)
+
+@receiver(post_delete, sender=CoreUser)
+def invalidate_deleted_user_auth_cache(sender, instance, **kwargs):
+    authentication.invalidate_user(instance.pk)
+
+@receiver(post_save, sender=School)
+def invalidate_school_auth_cache(sender, instance, created, **kwargs):
+    if not created:
+        authentication.invalidate_school(instance.pk)
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate_token(instance.key)
+
+# Memberships are read at signal time, so clear() is handled on pre_clear
+M2M_INVALIDATE_ACTIONS = ('post_add', 'post_remove', 'pre_clear')
+
+@receiver(m2m_changed, sender=CoreUser.groups.through)
+@receiver(m2m_changed, sender=CoreUser.user_permissions.through)
+def invalidate_user_permissions(sender, instance, action, pk_set, **kwargs):
+    if action not in M2M_INVALIDATE_ACTIONS:
+        return
+    if isinstance(instance, CoreUser):
+        authentication.invalidate_user(instance.pk)
+        bump_user_permissions(instance.pk)
+    elif pk_set:
+        # Reverse side (group.user_set / permission.user_set): pk_set holds user PKs
+        for user_pk in pk_set:
+            authentication.invalidate_user(user_pk)
+            bump_user_permissions(user_pk)
+    elif isinstance(instance, Group):
+        authentication.invalidate_group(instance.pk)
+        invalidate_all_permissions()
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_group_permissions(sender, instance, action, pk_set, **kwargs):
+    if action not in M2M_INVALIDATE_ACTIONS:
+        return
+    if isinstance(instance, Group):
+        authentication.invalidate_group(instance.pk)
+    else:
+        # Reverse side (permission.group_set): pk_set holds group PKs
+        for group_pk in pk_set or ():
+            authentication.invalidate_group(group_pk)
+    invalidate_all_permissions()
+
+
+@receiver(post_migrate)
+def reset_business_id_blocks(sender, **kwargs):
+    # migrate/flush may have reset the sequence table; leased blocks are void
+    ids.reset()
@@ -101,3 +101,773 @@ class TestPermissions:
         assert response.status_code == status.HTTP_200_OK
         assert len(response.data) == 1
         assert response.data[0]["first_name"] == "John"
+
+
+@pytest.mark.django_db
+class TestAuditPipeline:
+    """Tests for the buffered audit log pipeline (core.audit)."""
+
+    def _make_invoice(self):
+        from datetime import date
+        from decimal import Decimal
+        from schools.models import School, AcademicYear
+        from students.models import Student
+        from finance.models import Invoice
+
+        school = School.objects.create(name="Audit School")
+        year = AcademicYear.objects.create(
+            school=school, name="2024-25", start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+        )
+        student = Student.objects.create(
+            school=school, first_name="Audit", last_name="Kid", enrollment_number="AUD001",
+            date_of_birth=date(2012, 1, 1), gender="M", academic_year=year
+        )
+        return Invoice.objects.create(
+            school=school, student=student, academic_year=year,
+            total_amount=Decimal("1000.00"), due_date=date(2024, 6, 15)
+        )
+
+    @pytest.mark.django_db(transaction=True)
+    def test_entries_flushed_with_single_insert_on_commit(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from finance.models import Invoice
+        from core.models import AuditLog
+
+        invoice_id = self._make_invoice().id
+        AuditLog.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                for _ in range(5):
+                    invoice = Invoice.objects.get(id=invoice_id)
+                    invoice.paid_amount += 100
+                    invoice.save()
+
+        inserts = [q for q in ctx.captured_queries if 'INSERT INTO "core_auditlog"' in q['sql']]
+        assert len(inserts) == 1
+        assert AuditLog.objects.filter(model_name="Invoice", action=AuditLog.ACTION_UPDATE).count() == 5
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rolled_back_entries_are_dropped(self):
+        from django.db import transaction
+        from core.models import AuditLog
+
+        try:
+            with transaction.atomic():
+                self._make_invoice()
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+
+        assert not AuditLog.objects.filter(model_name="Invoice").exists()
+
+    @pytest.mark.django_db(transaction=True)
+    def test_rolled_back_savepoint_drops_only_its_entries(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from finance.models import Invoice
+        from core.models import AuditLog
+
+        invoice_id = self._make_invoice().id
+        AuditLog.objects.all().delete()
+
+        def pay(amount):
+            invoice = Invoice.objects.get(id=invoice_id)
+            invoice.paid_amount += amount
+            invoice.save()
+
+        with CaptureQueriesContext(connection) as ctx:
+            with transaction.atomic():
+                pay(100)
+                with transaction.atomic():
+                    pay(200)
+                try:
+                    with transaction.atomic():
+                        pay(300)
+                        raise RuntimeError("rollback")
+                except RuntimeError:
+                    pass
+                pay(400)
+
+        paid = [log.changes["paid_amount"]["new"] for log in AuditLog.objects.filter(model_name="Invoice").order_by("id")]
+        assert paid == ["100.00", "300.00", "700.00"]
+        inserts = [q for q in ctx.captured_queries if 'INSERT INTO "core_auditlog"' in q['sql']]
+        assert len(inserts) == 1
+
+    def test_object_repr_does_not_load_foreign_keys(self, django_assert_num_queries):
+        from core import audit
+        from finance.models import Invoice
+
+        invoice = Invoice.objects.get(id=self._make_invoice().id)
+        with django_assert_num_queries(0):
+            label = audit.describe(invoice)
+        assert label == f"Invoice {invoice.invoice_id}"
+
+
+@pytest.mark.django_db
+class TestDirtyFieldTracking:
+    """Tests for in-memory change tracking (core.tracking)."""
+
+    def test_update_diff_without_refetch(self, django_assert_num_queries):
+        from decimal import Decimal
+        from finance.models import Invoice
+        from core.models import AuditLog
+        from core import audit
+
+        invoice = Invoice.objects.get(id=TestAuditPipeline()._make_invoice().id)
+        invoice.paid_amount = Decimal("250.00")
+
+        # The UPDATE plus the dashboard counters' and fee ledger's F() updates:
+        # no SELECT of the old row, audit INSERT waits for commit
+        with django_assert_num_queries(3):
+            invoice.save()
+        audit.flush()
+
+        log = AuditLog.objects.filter(model_name="Invoice", action=AuditLog.ACTION_UPDATE).latest('timestamp')
+        assert log.changes["paid_amount"] == {"old": "0.00", "new": "250.00"}
+
+    def test_snapshot_resets_after_save(self):
+        from finance.models import Invoice
+        from core import tracking
+
+        invoice = Invoice.objects.get(id=TestAuditPipeline()._make_invoice().id)
+        invoice.paid_amount = 100
+        invoice.save()
+        assert tracking.has_changed(invoice, "paid_amount")
+        assert tracking.has_changed(invoice, "status")  # PENDING -> PARTIAL in save()
+        assert tracking.get_changes(invoice) == {}
+
+    def test_staff_attendance_tracks_few_fields(self):
+        from staff.models import StaffAttendance
+        from core import tracking
+
+        assert [name for name, _ in tracking._registry[StaffAttendance]] == ['school', 'date', 'status']
+
+
+@pytest.mark.django_db
+class TestAuditArchive:
+    """Tests for monthly audit buckets and cold archival."""
+
+    def _entry(self, period, object_id, when):
+        from core.models import AuditLog
+        log = AuditLog.objects.create(
+            action=AuditLog.ACTION_UPDATE, model_name="Invoice",
+            object_id=object_id, object_repr=f"Invoice {object_id}", period=period,
+        )
+        AuditLog.objects.filter(id=log.id).update(timestamp=when)
+        return log
+
+    def test_period_set_on_create(self):
+        from core.models import AuditLog
+        log = AuditLog.objects.create(action=AuditLog.ACTION_CREATE, model_name="X", object_id="1", object_repr="X")
+        assert log.period == AuditLog.period_for(log.timestamp)
+
+    def test_archive_and_query_across_hot_and_cold(self, settings, tmp_path):
+        from datetime import datetime
+        from django.utils import timezone
+        from core import audit
+        from core.models import AuditLog, AuditArchive
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        tz = timezone.get_current_timezone()
+        self._entry(202401, "7", datetime(2024, 1, 10, tzinfo=tz))
+        self._entry(202401, "8", datetime(2024, 1, 11, tzinfo=tz))
+        hot = self._entry(202402, "7", datetime(2024, 2, 5, tzinfo=tz))
+
+        archive = audit.archive_period(202401)
+
+        assert archive.entries == 2
+        assert (tmp_path / archive.path).exists()
+        assert not AuditLog.objects.filter(period=202401).exists()
+        assert AuditArchive.objects.count() == 1
+
+        rows = audit.history(model_name="Invoice", object_id=7)
+        assert [r["period"] for r in rows] == [202402, 202401]
+        assert rows[0]["id"] == hot.id
+
+        since = datetime(2024, 2, 1, tzinfo=tz)
+        assert len(audit.history(model_name="Invoice", since=since)) == 1
+
+
+    def test_history_stops_reading_archives_at_limit(self, settings, tmp_path, monkeypatch):
+        from datetime import datetime
+        from django.utils import timezone
+        from core import audit
+
+        settings.MEDIA_ROOT = str(tmp_path)
+        tz = timezone.get_current_timezone()
+        for month in (1, 2, 3):
+            self._entry(202400 + month, "7", datetime(2024, month, 10, 12, tzinfo=tz))
+            self._entry(202400 + month, "7", datetime(2024, month, 20, 12, tzinfo=tz))
+            audit.archive_period(202400 + month)
+
+        opened = []
+        read_archive = audit.read_archive
+        monkeypatch.setattr(audit, "read_archive", lambda archive: opened.append(archive.period) or read_archive(archive))
+
+        rows = audit.history(model_name="Invoice", limit=3)
+        assert [row["timestamp"].day for row in rows] == [20, 10, 20]
+        assert [row["period"] for row in rows] == [202403, 202403, 202402]
+        assert opened == [202403, 202402]  # January's segment is never read
+
+
+@pytest.mark.django_db
+class TestTenantScoping:
+    """Tests for the resolved-tenant fast path and TenantManager."""
+
+    def test_business_id_resolved_once(self, django_assert_num_queries):
+        from schools.models import School
+        from core.middleware import resolve_school_pk, school_keys
+
+        school_keys.clear()
+        school = School.objects.create(name="Tenant School")
+        with django_assert_num_queries(1):
+            assert resolve_school_pk(school.school_id) == school.pk
+            assert resolve_school_pk(school.school_id) == school.pk
+
+        business_id = school.school_id
+        school.delete()
+        assert resolve_school_pk(business_id) is None
+
+    def test_for_current_school_filters_local_column(self):
+        from schools.models import School
+        from finance.models import FeeCategory
+        from core.middleware import set_current_school
+
+        school = School.objects.create(name="Scoped School")
+        other = School.objects.create(name="Other School")
+        FeeCategory.objects.create(school=school, name="Tuition")
+        FeeCategory.objects.create(school=other, name="Tuition")
+
+        try:
+            set_current_school(school_id=school.school_id)
+            queryset = FeeCategory.objects.for_current_school()
+            assert "JOIN" not in str(queryset.query)
+            assert [c.school_id for c in queryset] == [school.pk]
+
+            set_current_school(school_id="SCH-DOES-NOT-EXIST")
+            assert not FeeCategory.objects.for_current_school().exists()
+        finally:
+            set_current_school()
+
+    def test_middleware_does_not_leak_previous_tenant(self, rf):
+        from django.contrib.auth.models import AnonymousUser
+        from core.middleware import TenantMiddleware, get_current_school_id, set_current_school
+
+        seen = []
+        middleware = TenantMiddleware(lambda request: seen.append(get_current_school_id()))
+        set_current_school(school_id="SCH-STALE")
+
+        request = rf.get("/api/students/")
+        request.user = AnonymousUser()
+        middleware(request)
+
+        assert seen == [None]
+
+
+@pytest.mark.django_db
+class TestCachedTokenAuthentication:
+    """Tests for the two-tier token auth cache (core.authentication)."""
+
+    @pytest.fixture(autouse=True)
+    def _isolated_cache(self, settings):
+        from core import authentication
+        from django.core.cache import cache
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        cache.clear()
+        authentication.local_tier.clear()
+        authentication.stats.reset()
+        yield
+        authentication.local_tier.clear()
+
+    def _token(self, django_user_model):
+        from rest_framework.authtoken.models import Token
+        from schools.models import School
+
+        school = School.objects.create(name="Auth School")
+        user = django_user_model.objects.create_user(
+            username="cached", password="pass12345", school=school, role="TEACHER"
+        )
+        return Token.objects.create(user=user)
+
+    def test_bundle_served_from_cache(self, django_user_model, django_assert_num_queries):
+        from core.authentication import CachedTokenAuthentication, get_stats
+
+        token = self._token(django_user_model)
+        auth = CachedTokenAuthentication()
+        auth.authenticate_credentials(token.key)
+
+        with django_assert_num_queries(0):
+            user, _ = auth.authenticate_credentials(token.key)
+            assert user.school.name == "Auth School"
+            user.has_perm("finance.view_invoice")
+
+        stats = get_stats()
+        assert (stats['miss'], stats['local_hit']) == (1, 1)
+
+    def test_shared_tier_used_after_local_expiry(self, django_user_model, django_assert_num_queries):
+        from core import authentication
+
+        token = self._token(django_user_model)
+        auth = authentication.CachedTokenAuthentication()
+        auth.authenticate_credentials(token.key)
+        authentication.local_tier.clear()
+
+        with django_assert_num_queries(0):
+            auth.authenticate_credentials(token.key)
+        assert authentication.get_stats()['shared_hit'] == 1
+
+    def test_stats_are_logged_and_served(self, client, django_user_model, monkeypatch, caplog):
+        from core import authentication
+
+        token = self._token(django_user_model)
+        auth = authentication.CachedTokenAuthentication()
+        monkeypatch.setattr(authentication.stats, "logged_at", authentication.stats.logged_at - 301)
+        with caplog.at_level("INFO", logger="core.authentication"):
+            auth.authenticate_credentials(token.key)
+            auth.authenticate_credentials(token.key)
+        # One line for the first lookup after a quiet interval, none for the next
+        assert [record.getMessage() for record in caplog.records] == [
+            "Token auth cache: {'local_hit': 0, 'shared_hit': 0, 'miss': 1, 'total': 1, 'hit_rate': 0.0}"
+        ]
+
+        response = client.get("/")
+        assert response.json()["auth_cache"]["local_hit"] == 1
+
+    def test_deactivation_invalidates(self, django_user_model, django_capture_on_commit_callbacks):
+        from rest_framework.exceptions import AuthenticationFailed
+        from core.authentication import CachedTokenAuthentication
+
+        token = self._token(django_user_model)
+        auth = CachedTokenAuthentication()
+        user, _ = auth.authenticate_credentials(token.key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_active = False
+            user.save()
+
+        with pytest.raises(AuthenticationFailed):
+            auth.authenticate_credentials(token.key)
+
+    def test_token_delete_invalidates(self, django_user_model, django_capture_on_commit_callbacks):
+        from rest_framework.exceptions import AuthenticationFailed
+        from core.authentication import CachedTokenAuthentication
+
+        token = self._token(django_user_model)
+        auth = CachedTokenAuthentication()
+        key = token.key
+        auth.authenticate_credentials(key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            token.delete()
+
+        with pytest.raises(AuthenticationFailed):
+            auth.authenticate_credentials(key)
+
+
+@pytest.mark.django_db
+class TestPermissionMatrix:
+    """Tests for compiled permission sets and view model resolution."""
+
+    @pytest.fixture(autouse=True)
+    def _locmem_cache(self, settings):
+        from django.core.cache import cache
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        cache.clear()
+
+    def test_compiled_set_includes_flags_and_perms(self, django_user_model):
+        from django.contrib.auth.models import Permission
+        from core.permissions import get_permission_set
+
+        user = django_user_model.objects.create_user(
+            username="flags", password="pass12345", role="TEACHER", can_manage_payroll=True
+        )
+        user.user_permissions.add(Permission.objects.get(codename="view_invoice"))
+
+        perms = get_permission_set(django_user_model.objects.get(pk=user.pk))
+        assert "finance.view_invoice" in perms
+        assert "core.can_manage_payroll" in perms
+        assert "can_access_finance" not in perms
+
+    def test_version_bump_recompiles(self, django_user_model, django_assert_num_queries):
+        from core.permissions import get_permission_set
+
+        user = django_user_model.objects.create_user(username="bump", password="pass12345", role="TEACHER")
+        get_permission_set(django_user_model.objects.get(pk=user.pk))
+
+        # Served from the shared cache on a fresh instance
+        fresh = django_user_model.objects.get(pk=user.pk)
+        with django_assert_num_queries(0):
+            assert "can_access_finance" not in get_permission_set(fresh)
+
+        user.can_access_finance = True
+        user.save()
+        assert "can_access_finance" in get_permission_set(django_user_model.objects.get(pk=user.pk))
+
+    def test_view_model_resolved_once(self):
+        from finance.views import InvoiceViewSet
+        from finance.models import Invoice
+        from core.permissions import get_view_model, _view_models
+
+        _view_models.pop(InvoiceViewSet, None)
+        assert get_view_model(InvoiceViewSet) is Invoice
+        assert _view_models[InvoiceViewSet] is Invoice
+
+    def test_login_reuses_compiled_set(self, api_client, django_user_model):
+        django_user_model.objects.create_user(
+            username="loginflags", password="pass12345", role="TEACHER", can_access_attendance=True
+        )
+        response = api_client.post(
+            "/api/login/", {"username": "loginflags", "password": "pass12345"}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert "can_access_attendance" in response.data["permissions"]
+
+
+@pytest.mark.django_db
+class TestBusinessIdAllocator:
+    """Tests for block-leased business IDs (core.ids)."""
+
+    @pytest.fixture(autouse=True)
+    def _fresh_blocks(self):
+        from core import ids
+        ids.reset()
+
+    def test_ids_are_sequential_per_school(self, django_assert_num_queries):
+        from schools.models import School
+        from core.utils import generate_business_id
+
+        school = School.objects.create(name="Seq School")
+        first = generate_business_id('INV', school=school)
+        # The rest of the block is handed out without touching the DB
+        with django_assert_num_queries(0):
+            second = generate_business_id('INV', school=school)
+
+        from core.ids import school_tag
+        assert first.startswith('INV-') and first.endswith(f"-{school_tag(school.pk)}")
+        assert int(second.split('-')[1]) == int(first.split('-')[1]) + 1
+
+    def test_batch_reservation_is_unique(self, settings):
+        from core.utils import reserve_business_ids
+
+        settings.BUSINESS_ID_BLOCK_SIZE = 5
+        batch = reserve_business_ids('RCP', 12, school=3) + reserve_business_ids('RCP', 7, school=3)
+        assert len(set(batch)) == 19
+
+    def test_rolled_back_lease_is_not_reused(self):
+        from django.db import transaction
+        from core import ids
+        from core.models import BusinessIdSequence
+
+        try:
+            with transaction.atomic():
+                ids.allocate('TST', school=9)
+                raise RuntimeError("rollback")
+        except RuntimeError:
+            pass
+
+        value = ids.allocate('TST', school=9)
+        assert value == ids.format_business_id('TST', 1, 9)
+        assert BusinessIdSequence.objects.get(prefix='TST', scope=9).next_value > 1
+
+    def test_lease_connection_is_checked_before_reuse(self, monkeypatch):
+        from core import ids
+
+        connection = ids._lease_connection()
+        try:
+            checks = []
+            monkeypatch.setattr(connection, "close_if_unusable_or_obsolete", lambda: checks.append(1))
+            assert ids._lease_connection() is connection
+            assert checks == [1]
+        finally:
+            connection.close()
+            del ids._local.lease_connection
+
+    def test_assign_fills_objects_for_bulk_create(self):
+        from core import ids
+        from finance.models import Invoice
+
+        objs = [Invoice(school_id=1), Invoice(school_id=2), Invoice(school_id=1, invoice_id="INV-LEGACY")]
+        ids.assign(objs, 'invoice_id', 'INV')
+        assert objs[0].invoice_id == ids.format_business_id('INV', 1, 1)
+        assert objs[1].invoice_id == ids.format_business_id('INV', 1, 2)
+        assert objs[2].invoice_id == "INV-LEGACY"  # Already had one
+
+
+class TestTenantCache:
+    """Tests for the two-tier, namespaced cache layer (core.cache_utils)."""
+
+    @pytest.fixture(autouse=True)
+    def _locmem_cache(self, settings):
+        from django.core.cache import cache
+        from core import cache_utils
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        cache.clear()
+        cache_utils.local_cache.clear()
+
+    def test_namespace_bump_invalidates_school_only(self):
+        from core import cache_utils
+
+        calls = []
+        compute = lambda: calls.append(1) or len(calls)
+        assert cache_utils.get_or_compute('stats', 'SCH-A', compute) == 1
+        assert cache_utils.get_or_compute('stats', 'SCH-B', compute) == 2
+        assert cache_utils.get_or_compute('stats', 'SCH-A', compute) == 1
+
+        cache_utils.invalidate_school_cache('SCH-A')
+        cache_utils.local_cache.clear()
+        assert cache_utils.get_or_compute('stats', 'SCH-A', compute) == 3
+        assert cache_utils.get_or_compute('stats', 'SCH-B', compute) == 2
+
+    def test_single_flight_on_cold_key(self):
+        import threading
+        import time
+        from core import cache_utils
+
+        calls = []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache_utils.get_or_compute('cold', 'SCH-C', slow)))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert results == [42] * 8
+        assert len(calls) == 1
+
+    def test_stale_value_served_while_refreshing(self, monkeypatch):
+        import time
+        from core import cache_utils
+
+        cache_utils.get_or_compute('stale', 'SCH-D', lambda: 'old', timeout=10, stale_ttl=60)
+        real_time = time.time
+        monkeypatch.setattr(cache_utils.time, 'time', lambda: real_time() + 30)
+
+        # Another process holds the refresh lock: we get the stale value
+        key = cache_utils.make_key('stale', 'SCH-D')
+        from django.core.cache import cache
+        cache.add(f'{key}_lock', 1)
+        assert cache_utils.get_or_compute('stale', 'SCH-D', lambda: 'new', timeout=10, stale_ttl=60) == 'old'
+
+        cache.delete(f'{key}_lock')
+        assert cache_utils.get_or_compute('stale', 'SCH-D', lambda: 'new', timeout=10, stale_ttl=60) == 'new'
+
+    def test_local_tier_covers_shared_outage(self, settings):
+        from core import cache_utils
+
+        settings.CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        calls = []
+        compute = lambda: calls.append(1) or 'value'
+        cache_utils.get_or_compute('outage', 'SCH-E', compute)
+        cache_utils.get_or_compute('outage', 'SCH-E', compute)
+        assert len(calls) == 1
+
+    def test_cached_query_keys_by_arguments(self):
+        from core.cache_utils import cached_query
+
+        calls = []
+
+        @cached_query('count', timeout=60)
+        def count(school_id, status='PENDING'):
+            calls.append((school_id, status))
+            return len(calls)
+
+        assert count('SCH-F') == count('SCH-F', status='PENDING') == 1
+        assert count('SCH-F', status='PAID') == 2
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+    """Tests for opt-in cursor pagination (core.pagination)."""
+
+    def _attendance(self, client, days=7):
+        from datetime import date, timedelta
+        from schools.models import AcademicYear
+        from students.models import Student, Attendance
+
+        year = AcademicYear.objects.create(
+            school=client.school, name="2024-25", start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+        )
+        student = Student.objects.create(
+            school=client.school, first_name="Page", last_name="Kid", enrollment_number="PG001",
+            date_of_birth=date(2012, 1, 1), gender="M", academic_year=year
+        )
+        for offset in range(days):
+            Attendance.objects.create(
+                school=client.school, student=student, date=date(2024, 6, 1) + timedelta(days=offset), status='P'
+            )
+        return list(Attendance.objects.order_by('-date', '-id').values_list('id', flat=True))
+
+    def test_walks_all_rows_in_order(self, authenticated_client):
+        expected = self._attendance(authenticated_client)
+
+        seen, pages = [], []
+        url = "/api/attendance/?pagination=cursor&page_size=3"
+        while url:
+            response = authenticated_client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert "count" not in response.data
+            pages.append(response.data)
+            seen.extend(row["id"] for row in response.data["results"])
+            url = response.data["next"]
+
+        assert seen == expected
+        assert len(pages) == 3
+        assert pages[0]["previous"] is None
+
+        # Going back from the second page returns the first one
+        back = authenticated_client.get(pages[1]["previous"])
+        assert [row["id"] for row in back.data["results"]] == expected[:3]
+        assert back.data["previous"] is None
+
+    def test_optional_count_and_page_numbers_untouched(self, authenticated_client):
+        self._attendance(authenticated_client)
+
+        response = authenticated_client.get("/api/attendance/?pagination=cursor&page_size=3&with_count=1")
+        assert response.data["count"] == 7
+        assert response.data["count_is_approximate"] is False
+
+        response = authenticated_client.get("/api/attendance/?page_size=3")
+        assert response.data["count"] == 7
+        assert "page=2" in response.data["next"]
+
+    def test_tampered_cursor_is_rejected(self, authenticated_client):
+        response = authenticated_client.get("/api/attendance/?cursor=not-a-cursor")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestBackgroundJobs:
+    """Tests for the database job queue (core.jobs)."""
+
+    @pytest.fixture
+    def failing_job(self):
+        from core import jobs
+
+        @jobs.register('tests.fail')
+        def fail(job, reason):
+            raise RuntimeError(reason)
+
+        yield 'tests.fail'
+        jobs._registry.pop('tests.fail', None)
+
+    def test_endpoint_enqueues_and_worker_runs(self, authenticated_client):
+        from core import jobs
+        from core.models import Job
+
+        response = authenticated_client.post("/api/finance/payroll/generate/", {"month": "2025-06-01"}, format="json")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        job_id = response.data["job_id"]
+        assert response.data["status_url"] == f"/api/jobs/{job_id}/"
+        assert Job.objects.get(pk=job_id).status == Job.STATUS_QUEUED
+
+        assert jobs.work() == 1
+
+        response = authenticated_client.get(f"/api/jobs/{job_id}/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["status"] == Job.STATUS_SUCCEEDED
+        assert response.data["progress"] == 100
+        assert response.data["result"]["message"] == "Payroll Generation Completed"
+
+    def test_failure_is_recorded_and_retried(self, failing_job):
+        from core import jobs
+        from core.models import Job
+
+        job = jobs.enqueue(failing_job, {"reason": "boom"}, max_attempts=2)
+        assert jobs.work() == 1
+        job.refresh_from_db()
+        assert job.status == Job.STATUS_QUEUED  # Retry scheduled later
+        assert job.error == "RuntimeError: boom"
+
+        Job.objects.filter(pk=job.pk).update(run_after=job.created_at)
+        assert jobs.work() == 1
+        job.refresh_from_db()
+        assert job.status == Job.STATUS_FAILED
+        assert job.attempts == 2
+        assert jobs.serialize(job)["result"] is None  # Traceback stays server side
+
+    def test_claim_is_exclusive_and_expired_leases_are_reclaimed(self, failing_job):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core import jobs
+        from core.models import Job
+
+        job = jobs.enqueue(failing_job, {"reason": "x"}, max_attempts=2)
+        assert jobs.claim("worker-a").pk == job.pk
+        assert jobs.claim("worker-b") is None
+
+        # worker-a died: once its lease is over, another worker takes the job
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = jobs.claim("worker-b")
+        assert reclaimed.worker == "worker-b"
+        assert reclaimed.attempts == 2
+
+    def test_expired_job_without_attempts_left_is_failed(self, failing_job):
+        from datetime import timedelta
+        from django.utils import timezone
+        from core import jobs
+        from core.models import Job
+
+        job = jobs.enqueue(failing_job, {"reason": "x"}, max_attempts=1)
+        assert jobs.claim("worker-a").pk == job.pk
+
+        # worker-a died on the only attempt: the job is failed, not run again
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+        assert jobs.claim("worker-b") is None
+        job.refresh_from_db()
+        assert job.status == Job.STATUS_FAILED
+        assert job.attempts == 1
+        assert job.locked_until is None
+
+    def test_heartbeat_stops_with_the_job(self, failing_job):
+        import threading
+        from core import jobs
+
+        job = jobs.enqueue(failing_job, {"reason": "x"})
+        jobs.work()
+        assert not any(thread.name == f"job-{job.pk}-heartbeat" for thread in threading.enumerate())
+
+    def test_jobs_are_tenant_isolated(self, authenticated_client, failing_job):
+        from core import jobs
+        from schools.models import School
+
+        other = jobs.enqueue(failing_job, {"reason": "x"}, school=School.objects.create(name="Other"))
+        response = authenticated_client.get(f"/api/jobs/{other.pk}/")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_staff_only_see_their_own_jobs(self, authenticated_client, django_user_model, failing_job):
+        from core import jobs
+
+        teacher = django_user_model.objects.create_user(
+            username="teacher", password=None, school=authenticated_client.school, role="TEACHER"
+        )
+        admins = jobs.enqueue(failing_job, {"reason": "x"}, school=authenticated_client.school,
+                              user=authenticated_client.user)
+        own = jobs.enqueue(failing_job, {"reason": "x"}, school=authenticated_client.school, user=teacher)
+
+        authenticated_client.force_authenticate(user=teacher)
+        assert authenticated_client.get(f"/api/jobs/{admins.pk}/").status_code == status.HTTP_404_NOT_FOUND
+        assert authenticated_client.get(f"/api/jobs/{own.pk}/").status_code == status.HTTP_200_OK
+
+        # School admins see every job of the school
+        authenticated_client.force_authenticate(user=authenticated_client.user)
+        assert authenticated_client.get(f"/api/jobs/{own.pk}/").status_code == status.HTTP_200_OK
+
+    def test_runworker_once(self, failing_job):
+        from django.core.management import call_command
+        from core import jobs
+        from core.models import Job
+
+        job = jobs.enqueue(failing_job, {"reason": "x"})
+        call_command("runworker", "--once")
+        assert Job.objects.get(pk=job.pk).status == Job.STATUS_FAILED
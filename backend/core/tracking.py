@@ -0,0 +1,149 @@
+"""
+Dirty-field tracking.
+
+Registered models get their field values snapshotted when an instance is
+loaded from the database (`Model.from_db`). At save time the changed
+fields are computed in memory, so the audit diff no longer needs a
+re-fetch of the row before every update.
+
+Models opt out (or narrow tracking down to a few fields) with a class
+attribute:
+
+    class StaffAttendance(models.Model):
+        track_changes = False              # no snapshot, no audit diff
+        track_changes = ('status',)        # only these fields
+
+Usage:
+    tracking.get_changes(instance)      # {field_name: (old, new)} for the pending save
+    tracking.saved_changes(instance)    # same, for the save that just happened (post_save)
+    tracking.has_changed(instance, 'status')
+"""
+import copy
+
+from django.apps import apps
+from django.db.models.signals import pre_save
+
+# model class -> tuple of (field name, attname) pairs being tracked
+_registry = {}
+
+SNAPSHOT_ATTR = '_loaded_values'
+SAVED_CHANGES_ATTR = '_saved_changes'
+
+
+def _tracked_fields(model, names=None):
+    # Same field set model_to_dict() used for the old diff: editable, concrete, non-m2m
+    fields = []
+    for field in model._meta.concrete_fields:
+        if not field.editable:
+            continue
+        if names is not None and field.name not in names and field.attname not in names:
+            continue
+        fields.append((field.name, field.attname))
+    return tuple(fields)
+
+
+def register(model, fields=None):
+    """Start tracking `model`. `fields` restricts tracking to the given field names."""
+    if model in _registry:
+        return
+    _registry[model] = _tracked_fields(model, set(fields) if fields is not None else None)
+
+    original = model.from_db.__func__
+
+    def from_db(cls, db, field_names, values):
+        instance = original(cls, db, field_names, values)
+        snapshot(instance)
+        return instance
+
+    model.from_db = classmethod(from_db)
+
+
+def autodiscover(ignored=()):
+    """Register every installed model, honouring the `track_changes` opt-out."""
+    for model in apps.get_models():
+        if model.__name__ in ignored:
+            continue
+        option = getattr(model, 'track_changes', True)
+        if option is False:
+            continue
+        register(model, fields=None if option is True else option)
+
+
+def is_tracked(model):
+    return model in _registry
+
+
+def snapshot(instance):
+    """Record the current (loaded) field values as the clean state."""
+    fields = _registry.get(instance.__class__)
+    if fields is None:
+        return
+    data = instance.__dict__
+    state = {}
+    for name, attname in fields:
+        # Deferred fields are absent from __dict__; they are simply not tracked
+        if attname in data:
+            value = data[attname]
+            if isinstance(value, (dict, list)):
+                value = copy.deepcopy(value)
+            state[attname] = value
+    setattr(instance, SNAPSHOT_ATTR, state)
+
+
+def get_changes(instance, update_fields=None):
+    """
+    Fields changed since the instance was loaded, as {field_name: (old, new)}.
+
+    Returns None when nothing is known about the clean state (instance was
+    not loaded from the DB, or its model is not tracked).
+    """
+    fields = _registry.get(instance.__class__)
+    state = getattr(instance, SNAPSHOT_ATTR, None)
+    if fields is None or state is None:
+        return None
+    data = instance.__dict__
+    changes = {}
+    for name, attname in fields:
+        if update_fields is not None and name not in update_fields and attname not in update_fields:
+            continue
+        if attname in state and attname in data and state[attname] != data[attname]:
+            changes[name] = (state[attname], data[attname])
+    return changes
+
+
+def saved_changes(instance):
+    """Changes written by the most recent save(), readable from post_save receivers."""
+    return getattr(instance, SAVED_CHANGES_ATTR, None)
+
+
+def has_changed(instance, field_name):
+    changes = saved_changes(instance)
+    if changes is None:
+        changes = get_changes(instance) or {}
+    return field_name in changes
+
+
+def _capture_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    if sender not in _registry or raw:
+        return
+    if instance._state.adding:
+        setattr(instance, SAVED_CHANGES_ATTR, None)
+    else:
+        setattr(instance, SAVED_CHANGES_ATTR, get_changes(instance, update_fields))
+
+    # What is about to be written becomes the clean state for the next save
+    if update_fields is None or getattr(instance, SNAPSHOT_ATTR, None) is None:
+        snapshot(instance)
+    else:
+        previous = getattr(instance, SNAPSHOT_ATTR)
+        snapshot(instance)
+        fresh = getattr(instance, SNAPSHOT_ATTR)
+        previous.update({
+            attname: fresh[attname]
+            for name, attname in _registry[sender]
+            if (name in update_fields or attname in update_fields) and attname in fresh
+        })
+        setattr(instance, SNAPSHOT_ATTR, previous)
+
+
+pre_save.connect(_capture_changes, dispatch_uid='core.tracking.capture_changes')
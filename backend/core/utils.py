@@ -1,13 +1,19 @@
-import secrets
-import string
-import time
+from . import ids
 
-def generate_business_id(prefix: str) -> str:
+
+def generate_business_id(prefix: str, school=None) -> str:
     """
     Generates a unique, sortable, immutable business ID.
-    Format: PREFIX-TIMESTAMP-RANDOM
-    Example: SCH-1702934-AB92
+    Format: PREFIX-SEQUENCE-SCHOOLTAG
+    Example: INV-0000042-000B
+
+    The sequence is monotonic per (prefix, school) and leased in blocks
+    (see core.ids), so IDs never collide, even across workers. `school`
+    may be a School instance or PK; leave it out for global objects.
     """
-    timestamp = str(int(time.time()))[-6:] # Last 6 digits of timestamp for reasonable uniqueness/sorting
-    random_str = ''.join(secrets.choice(string.ascii_uppercase + string.digits) for _ in range(4))
-    return f"{prefix}-{timestamp}-{random_str}"
+    return ids.allocate(prefix, school=school)
+
+
+def reserve_business_ids(prefix: str, count: int, school=None) -> list:
+    """Pre-assign `count` business IDs in one go, e.g. before bulk_create()."""
+    return ids.reserve(prefix, count, school=school)
@@ -2,7 +2,9 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
-from rest_framework.permissions import AllowAny
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from . import jobs
+from .permissions import get_permission_set
 
 class LoginApiView(APIView):
     permission_classes = [AllowAny]
@@ -17,35 +19,9 @@ class LoginApiView(APIView):
             # Supabase is Writable: Create token if missing
             token, created = Token.objects.get_or_create(user=user)
             
-            # Gather standard permissions (Flattened from User + Groups)
-            all_permissions = user.get_all_permissions() # returns {'app.perm', ...}
-            
-            # Combine everything into a single list
-            # We want specific strings like 'students.add_student', 'finance.view_invoice'
-            permission_list = list(all_permissions)
-
-            # Keep legacy custom flags for backwards compatibility if needed, 
-            # but primary source is now permission_list
-            if user.is_superuser: permission_list.append('is_superuser')
-
-            # --- Custom Boolean Permissions ---
-            # If user is superuser, grant ALL permissions regardless of flags
-            if user.is_superuser:
-                permission_list.extend([
-                    'can_access_finance', 'can_access_transport', 'can_access_certificates',
-                    'can_access_student_records', 'can_access_attendance', 'core.can_manage_payroll',
-                    'core.can_manage_leaves', 'core.can_mark_manual_attendance', 'can_use_mobile_app'
-                ])
-            else:
-                if user.can_access_finance: permission_list.append('can_access_finance')
-                if user.can_access_transport: permission_list.append('can_access_transport')
-                if user.can_access_certificates: permission_list.append('can_access_certificates')
-                if user.can_access_student_records: permission_list.append('can_access_student_records')
-                if user.can_access_attendance: permission_list.append('can_access_attendance')
-                if user.can_manage_payroll: permission_list.append('core.can_manage_payroll')
-                if user.can_manage_leaves: permission_list.append('core.can_manage_leaves')
-                if user.can_mark_manual_attendance: permission_list.append('core.can_mark_manual_attendance')
-                if user.can_use_mobile_app: permission_list.append('can_use_mobile_app')
+            # Django perms (user + groups) and the can_* flags, compiled once
+            # and shared with StandardPermission (core.permissions)
+            permission_list = sorted(get_permission_set(user))
 
             return Response({
                 'token': token.key,
@@ -77,3 +53,14 @@ class HeaderDebugView(APIView):
             'meta_proto': request.META.get('HTTP_X_FORWARDED_PROTO'),
             'meta_https': request.META.get('HTTPS'),
         })
+
+
+class JobStatusView(APIView):
+    """Polling endpoint for background jobs (core.jobs): state, progress, result or error."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, job_id):
+        job = jobs.visible_to(request.user).filter(pk=job_id).first()
+        if job is None:
+            return Response({'error': 'Job not found'}, status=404)
+        return Response(jobs.serialize(job))
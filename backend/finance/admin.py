@@ -1,7 +1,7 @@
 from django.contrib import admin
 from .models import (
     FeeCategory, FeeStructure, Invoice, Receipt, Salary, StaffSalaryStructure,
-    StudentFeeBreakup, PaymentAllocation,
+    StudentFeeBreakup, PaymentAllocation, StudentLedger,
     # Fee Settlement Models (Phase 2)
     FeeInstallment, FeeDiscount, CertificateFee
 )
@@ -70,3 +70,17 @@ class FeeDiscountAdmin(admin.ModelAdmin):
 class CertificateFeeAdmin(admin.ModelAdmin):
     list_display = ('certificate_type', 'fee_amount', 'school', 'is_active')
     list_filter = ('is_active', 'school', 'certificate_type')
+
+@admin.register(StudentLedger)
+class StudentLedgerAdmin(admin.ModelAdmin):
+    """Read-only: rows are maintained by finance.ledger / rebuild_ledger."""
+    list_display = ('student', 'academic_year', 'invoiced', 'paid', 'waived', 'balance', 'updated_at')
+    list_filter = ('academic_year', 'school')
+    list_select_related = ('student', 'academic_year')
+    search_fields = ('student__first_name', 'student__last_name', 'student__enrollment_number')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
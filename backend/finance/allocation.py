@@ -0,0 +1,146 @@
+"""
+Payment allocation strategies.
+
+Decide how a payment is split over the open lines of an invoice (fee heads,
+or installments). Every strategy takes `lines` (anything with `key`,
+`balance` and, depending on the strategy, `name`, `due_date`) and an
+amount in paise, and returns {key: Decimal} such that:
+
+    sum(result.values()) == min(amount, sum of balances)   exactly
+    0 < result[key] <= balance of that line
+
+Strategies (School.fee_allocation_strategy):
+
+    EQUAL             water-filling: equal shares, a line that cannot absorb
+                      its share is paid off and the rest is shared again
+    TUITION_FIRST     tuition heads first, then the others in order
+    OLDEST_DUE_FIRST  earliest due date first (installments)
+    TAX_PROPORTIONAL  every line gets the same fraction of its balance, so
+                      base and GST are collected pro rata on part payments
+
+All splits are computed with Decimal in whole paise; the paise a split
+cannot divide evenly go to the first lines in `key` order, so the same
+input always gives the same result.
+
+Usage:
+    split = allocation.allocate(lines, Decimal('2400.00'), 'EQUAL')
+"""
+from collections import namedtuple
+from decimal import Decimal, ROUND_DOWN
+
+PAISA = Decimal('0.01')
+
+EQUAL = 'EQUAL'
+TUITION_FIRST = 'TUITION_FIRST'
+OLDEST_DUE_FIRST = 'OLDEST_DUE_FIRST'
+TAX_PROPORTIONAL = 'TAX_PROPORTIONAL'
+
+Line = namedtuple('Line', ['key', 'balance', 'name', 'due_date'], defaults=('', None))
+
+
+def _open(lines):
+    return [line for line in lines if line.balance > 0]
+
+
+def _sequential(lines, amount):
+    """Pay lines off one after the other, in the given order."""
+    allocations = {}
+    remaining = amount
+    for line in lines:
+        if remaining <= 0:
+            break
+        paid = min(line.balance, remaining)
+        allocations[line.key] = paid
+        remaining -= paid
+    return allocations
+
+
+def water_fill(lines, amount):
+    """
+    Equal-share split in one pass over the lines sorted by balance: lines
+    smaller than an equal share of what is left are paid off, the others
+    all get the same level (plus one paisa each for the residue).
+    """
+    lines = sorted(_open(lines), key=lambda line: (line.balance, line.key))
+    allocations = {}
+    remaining = amount
+    for index, line in enumerate(lines):
+        if remaining <= 0:
+            break
+        count = len(lines) - index
+        if line.balance * count <= remaining:
+            allocations[line.key] = line.balance
+            remaining -= line.balance
+            continue
+        # Every line left is bigger than its share: one level for all of them.
+        # A line bigger than the level is at least one paisa bigger, so the
+        # residue paise always fit.
+        level = (remaining / count).quantize(PAISA, rounding=ROUND_DOWN)
+        residue = int((remaining - level * count) / PAISA)
+        for position, rest in enumerate(sorted(lines[index:], key=lambda line: line.key)):
+            paid = level + (PAISA if position < residue else 0)
+            if paid > 0:
+                allocations[rest.key] = paid
+        break
+    return allocations
+
+
+def tuition_first(lines, amount):
+    """Tuition heads first, then everything else, each group in key order."""
+    ordered = sorted(_open(lines), key=lambda line: ('tuition' not in line.name.lower(), line.key))
+    return _sequential(ordered, amount)
+
+
+def oldest_due_first(lines, amount):
+    """Earliest due date first; lines without a due date come last."""
+    ordered = sorted(
+        _open(lines),
+        key=lambda line: (line.due_date is None, line.due_date or 0, line.key),
+    )
+    return _sequential(ordered, amount)
+
+
+def tax_proportional(lines, amount):
+    """
+    Pro rata to the balances (largest remainder, in paise): the same share
+    of every head, and so of every head's GST, is collected.
+    """
+    lines = _open(lines)
+    total = sum(line.balance for line in lines)
+    if amount >= total:
+        return {line.key: line.balance for line in lines}
+
+    allocations = {}
+    remainders = []
+    for line in lines:
+        exact = line.balance * amount / total
+        paid = exact.quantize(PAISA, rounding=ROUND_DOWN)
+        allocations[line.key] = paid
+        remainders.append((-(exact - paid), line.key))
+    # Hand out the paise lost to rounding, biggest remainder first
+    residue = int((amount - sum(allocations.values())) / PAISA)
+    for _, key in sorted(remainders)[:residue]:
+        allocations[key] += PAISA
+    return {key: paid for key, paid in allocations.items() if paid > 0}
+
+
+STRATEGIES = {
+    EQUAL: water_fill,
+    TUITION_FIRST: tuition_first,
+    OLDEST_DUE_FIRST: oldest_due_first,
+    TAX_PROPORTIONAL: tax_proportional,
+}
+
+
+def allocate(lines, amount, strategy=EQUAL):
+    """Split `amount` (Decimal, whole paise) over `lines` with `strategy`."""
+    try:
+        func = STRATEGIES[strategy or EQUAL]
+    except KeyError:
+        raise ValueError(f"Unknown allocation strategy: {strategy}")
+    amount = Decimal(amount)
+    if amount != amount.quantize(PAISA):
+        raise ValueError(f"Payment amount {amount} is not in whole paise")
+    if amount <= 0:
+        return {}
+    return func(lines, amount)
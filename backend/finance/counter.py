@@ -0,0 +1,150 @@
+"""
+Fee counter.
+
+One round trip per family at the cash counter, instead of the student fee
+summary, a receipt POST and a PDF fetch:
+
+    find_students(school, q)     GR number, roll number or mobile, one query
+    open_invoices(student)       open invoices with their breakups, one query
+    suggest(invoices, amount)    how `amount` would be posted
+    collect(...)                 post it and re-read the balances
+
+A payment is spread over the open invoices oldest due first and, within an
+invoice, over its heads with the school's fee_allocation_strategy
+(finance.allocation), so suggest() shows exactly what collect() posts:
+collect() writes one receipt per invoice through
+FeeService.process_payment(). Everything runs in one transaction.
+
+Usage:
+    students = counter.find_students(school, '9876543210')
+    invoices = counter.open_invoices(students[0])
+    counter.suggest(invoices, Decimal('5000.00'), school.fee_allocation_strategy)
+    counter.collect(school, students[0], Decimal('5000.00'), 'CASH', request.user)
+"""
+import re
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Replace
+
+from . import allocation
+from .receivables import OPEN_STATUSES
+
+# Students returned when a query matches more than one (the cashier picks)
+MAX_MATCHES = 10
+
+# Mobile numbers are matched on their last ten digits (drops +91 / 0 prefixes)
+MOBILE_DIGITS = 10
+# Separators people type into stored numbers, ignored when matching
+MOBILE_SEPARATORS = (' ', '-', '(', ')', '.')
+
+
+def _bare_mobile():
+    expression = F('emergency_mobile')
+    for separator in MOBILE_SEPARATORS:
+        expression = Replace(expression, Value(separator), Value(''))
+    return expression
+
+
+def find_students(school, query):
+    """
+    Active students of `school` whose GR number, roll number (enrollment
+    number) or emergency mobile matches `query`, at most MAX_MATCHES.
+    """
+    from students.models import Student
+
+    query = (query or '').strip()
+    if not query:
+        return []
+    students = Student.objects.for_school(school).filter(is_active=True)
+    match = Q(gr_number__iexact=query) | Q(enrollment_number__iexact=query)
+    digits = re.sub(r'\D', '', query)
+    if len(digits) >= MOBILE_DIGITS:
+        students = students.alias(bare_mobile=_bare_mobile())
+        match |= Q(bare_mobile__endswith=digits[-MOBILE_DIGITS:])
+    return list(
+        students.filter(match)
+        .select_related('current_class', 'section').order_by('first_name', 'last_name', 'id')[:MAX_MATCHES]
+    )
+
+
+def open_invoices(student):
+    """
+    The student's unpaid invoices, oldest due first, each with
+    `open_breakups` (head and balance), read in one query.
+    """
+    from .models import StudentFeeBreakup
+
+    breakups = (
+        StudentFeeBreakup.objects.filter(invoice__student=student, invoice__status__in=OPEN_STATUSES)
+        .select_related('invoice', 'head').order_by('invoice__due_date', 'invoice_id', 'id')
+    )
+    invoices = {}
+    for breakup in breakups:
+        if breakup.invoice_id not in invoices:
+            invoices[breakup.invoice_id] = breakup.invoice
+            breakup.invoice.open_breakups = []
+        invoices[breakup.invoice_id].open_breakups.append(breakup)
+    return list(invoices.values())
+
+
+def _balance(breakup):
+    return breakup.amount - breakup.paid_amount
+
+
+def collectable(invoice):
+    """What process_payment() can post to `invoice`: the balance of its heads."""
+    return sum((_balance(breakup) for breakup in invoice.open_breakups), Decimal('0.00'))
+
+
+def suggest(invoices, amount, strategy):
+    """
+    [{'invoice': Invoice, 'amount': Decimal, 'heads': {breakup_pk: Decimal}}]
+    for the invoices `amount` reaches, oldest due first. Raises ValueError
+    when `amount` is not positive or more than is open.
+    """
+    amount = Decimal(amount)
+    pending = sum((collectable(invoice) for invoice in invoices), Decimal('0.00'))
+    if amount <= 0:
+        raise ValueError("Amount must be positive")
+    if amount > pending:
+        raise ValueError(f"Amount {amount} exceeds the pending balance {pending}")
+
+    per_invoice = allocation.allocate([
+        allocation.Line(index, collectable(invoice), due_date=invoice.due_date)
+        for index, invoice in enumerate(invoices)
+    ], amount, allocation.OLDEST_DUE_FIRST)
+    plan = []
+    for index, invoice in enumerate(invoices):
+        if index not in per_invoice:
+            continue
+        # Same lines as FeeService.process_payment() builds from the locked rows
+        heads = allocation.allocate([
+            allocation.Line(b.pk, _balance(b), b.head.name, invoice.due_date)
+            for b in invoice.open_breakups
+        ], per_invoice[index], strategy)
+        plan.append({'invoice': invoice, 'amount': per_invoice[index], 'heads': heads})
+    return plan
+
+
+def collect(school, student, amount, mode, user, transaction_id='', invoice=None):
+    """
+    Post `amount` to the student's open invoices (only `invoice`, if given)
+    as suggest() splits it. Returns (receipts, invoices after posting).
+    """
+    from .services import FeeService
+
+    strategy = school.fee_allocation_strategy
+    with transaction.atomic():
+        invoices = open_invoices(student)
+        if invoice is not None:
+            invoices = [item for item in invoices if item.pk == getattr(invoice, 'pk', invoice)]
+        receipts = [
+            FeeService.process_payment(
+                entry['invoice'], entry['amount'], mode, user,
+                transaction_id=transaction_id, strategy=strategy,
+            )
+            for entry in suggest(invoices, amount, strategy)
+        ]
+    return receipts, open_invoices(student)
@@ -0,0 +1,125 @@
+"""
+Discount resolution for invoice generation.
+
+All active FeeDiscounts of a school and year that are valid on the invoice
+due date are loaded with one query into an index
+
+    {(student_pk, category_pk or None): [FeeDiscount, ...]}
+
+and applied in memory to the (class, section) breakup templates, so bulk
+generation does not run a query per student. Only students with discounts
+get a template of their own.
+
+Per student, category discounts are applied before discounts on all fees,
+and within each group percentages before fixed amounts, every one to what
+is left of the heads after the previous ones:
+
+    PERCENTAGE  value% of each head it covers
+    FIXED       up to value, spread over the heads it covers pro rata
+                (finance.allocation, exact in paise)
+
+A discounted head keeps its GST share: base and tax shrink in proportion.
+What was applied is stored on StudentFeeBreakup (discount_amount, plus
+discount_details with each discount's ID, reason and amount), so the
+invoice keeps explaining itself after the discounts change.
+
+Usage:
+    index = discounts.load_index(school, academic_year, on_date=due_date)
+    template = discounts.apply(template, index.for_student(student_pk))
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from . import allocation
+from .fee_matrix import template_totals
+
+PAISA = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+class DiscountIndex(dict):
+    """{(student_pk, category_pk or None): [FeeDiscount, ...]} with per-student lookup."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._by_student = defaultdict(list)
+        for (student_pk, _), discounts in self.items():
+            self._by_student[student_pk].extend(discounts)
+
+    def for_student(self, student_pk):
+        return self._by_student.get(student_pk, [])
+
+
+def load_index(school, academic_year, on_date=None):
+    """Active discounts of the year (valid on `on_date`, if given), one query."""
+    from .models import FeeDiscount
+
+    discounts = FeeDiscount.objects.for_school(school).filter(academic_year=academic_year, is_active=True)
+    if on_date is not None:
+        discounts = discounts.filter(valid_from__lte=on_date, valid_until__gte=on_date)
+
+    index = defaultdict(list)
+    for discount in discounts.order_by('id'):
+        index[(discount.student_id, discount.category_id)].append(discount)
+    return DiscountIndex(index)
+
+
+def _order(discount):
+    return (discount.category_id is None, discount.discount_type != 'PERCENTAGE', discount.pk)
+
+
+def _reductions(discount, heads):
+    """{head position: amount} one discount takes off `heads` ([(position, balance)])."""
+    covered = [(position, balance) for position, balance in heads
+               if balance > 0 and discount.category_id in (None, position[1])]
+    if not covered:
+        return {}
+    if discount.discount_type == 'PERCENTAGE':
+        rate = min(discount.discount_value, HUNDRED) / HUNDRED
+        return {position: (balance * rate).quantize(PAISA) for position, balance in covered}
+    lines = [allocation.Line(position, balance) for position, balance in covered]
+    return allocation.allocate(lines, discount.discount_value.quantize(PAISA), allocation.TAX_PROPORTIONAL)
+
+
+def apply(template, discounts):
+    """
+    A copy of `template` (from finance.fee_matrix) with `discounts`
+    taken off its heads, or `template` itself when nothing applies.
+    """
+    if not discounts:
+        return template
+
+    rows = [dict(row) for row in template['breakups']]
+    remaining = {(index, row['head_id']): row['amount'] for index, row in enumerate(rows)}
+    details = defaultdict(list)
+    for discount in sorted(discounts, key=_order):
+        for position, amount in _reductions(discount, list(remaining.items())).items():
+            amount = min(amount, remaining[position])
+            if amount <= 0:
+                continue
+            remaining[position] -= amount
+            details[position[0]].append({
+                'discount_id': discount.pk,
+                'reason': discount.reason,
+                'type': discount.discount_type,
+                'value': str(discount.discount_value),
+                'amount': str(amount),
+            })
+    if not details:
+        return template
+
+    for (index, _), net in remaining.items():
+        row = rows[index]
+        if index not in details:
+            continue
+        gross = row['amount']
+        base = (row['base_amount'] * net / gross).quantize(PAISA) if gross else Decimal('0.00')
+        row.update(
+            amount=net,
+            base_amount=base,
+            tax_amount=net - base,
+            discount_amount=gross - net,
+            discount_details=details[index],
+        )
+
+    return template_totals(rows)
@@ -0,0 +1,123 @@
+"""
+Invoice and receipt PDFs.
+
+Each document is built from a context dict holding exactly what its
+template shows; the context is also the document's version key in the
+rendered-document cache (core.pdf_cache), so a download re-renders only
+after something on the page changed. Bump LAYOUT_VERSION when a template
+or the drawing code changes.
+
+Usage:
+    return documents.serve_invoice(request, invoice)
+    return documents.serve_receipt(request, receipt)
+    pdf = documents.render(documents.INVOICE, documents.invoice_context(invoice))
+"""
+import io
+
+from django.template.loader import render_to_string
+
+from core import pdf_cache
+
+LAYOUT_VERSION = 1
+
+INVOICE = 'invoice'
+RECEIPT = 'receipt'
+
+
+class RenderError(Exception):
+    pass
+
+
+def invoice_context(invoice):
+    student = invoice.student
+    return {
+        'layout': LAYOUT_VERSION,
+        'school_name': invoice.school.name,
+        'student_name': f"{student.first_name} {student.last_name}",
+        'enrollment_number': student.enrollment_number,
+        'class_name': str(student.current_class) if student.current_class else "N/A",
+        'section': str(student.section) if student.section else "N/A",
+        'father_name': student.father_name,
+        'mother_name': student.mother_name,
+        'mobile': student.emergency_mobile,
+        'address': student.address,
+        'dob': student.date_of_birth.strftime('%Y-%m-%d') if student.date_of_birth else "",
+        'invoice_id': invoice.invoice_id,
+        'date': invoice.created_at.strftime('%Y-%m-%d'),
+        'due_date': invoice.due_date,
+        'status': invoice.status,
+        'title': f"Fee Invoice {invoice.academic_year.name}",
+        'amount': invoice.total_amount,
+    }
+
+
+def render_invoice(context):
+    from xhtml2pdf import pisa
+
+    buffer = io.BytesIO()
+    pisa_status = pisa.CreatePDF(render_to_string('invoice.html', context), dest=buffer)
+    if pisa_status.err:
+        raise RenderError('PDF generation failed')
+    return buffer.getvalue()
+
+
+def receipt_context(receipt):
+    return {
+        'layout': LAYOUT_VERSION,
+        'receipt_no': receipt.receipt_no,
+        'date': receipt.date,
+        'amount': receipt.amount,
+    }
+
+
+def render_receipt(context):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+
+    p.setFont("Helvetica-Bold", 20)
+    p.drawCentredString(width/2, height - 50, "FEE RECEIPT")
+
+    p.setFont("Helvetica", 12)
+    y = height - 150
+    p.drawString(100, y, f"Receipt No: {context['receipt_no']}")
+    y -= 20
+    p.drawString(100, y, f"Date: {context['date']}")
+    y -= 20
+    p.drawString(100, y, f"Amount: Rs. {context['amount']}")
+
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+
+def filename(kind, context):
+    if kind == INVOICE:
+        return f"invoice_{context['invoice_id']}.pdf"
+    return f"Receipt_{context['receipt_no']}.pdf"
+
+
+def render(kind, context):
+    """PDF bytes of a document from its context (no database access: runs in export workers)."""
+    return render_invoice(context) if kind == INVOICE else render_receipt(context)
+
+
+def serve_invoice(request, invoice):
+    context = invoice_context(invoice)
+    return pdf_cache.serve(
+        request, INVOICE, invoice.pk, context, lambda: render_invoice(context), filename(INVOICE, context),
+    )
+
+
+def serve_receipt(request, receipt):
+    context = receipt_context(receipt)
+    return pdf_cache.serve(
+        request, RECEIPT, receipt.pk, context, lambda: render_receipt(context), filename(RECEIPT, context),
+    )
+
+
+def invalidate(kind, pk):
+    pdf_cache.invalidate(kind, pk)
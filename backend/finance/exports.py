@@ -0,0 +1,352 @@
+"""
+Batch PDF export.
+
+Every receipt of a day, or every invoice of a class, as one download:
+
+    select(school, kind, params)       the receipts/invoices to export
+    rendered(kind, documents)          (filename, path) per document, in order
+    zip_stream(files)                  a ZIP archive, as chunks of bytes
+    pdf_stream(files)                  one merged PDF, as chunks of bytes
+
+Documents come from the rendered-document cache (core.pdf_cache); the ones
+not rendered yet are rendered BATCH_SIZE at a time on a process pool
+(PDF_EXPORT_WORKERS processes, default up to 4) and stored in the cache,
+so the next export of the same documents only reads files.
+
+Memory stays bounded whatever the batch size: contexts are read with
+.iterator(), at most one batch of rendered PDFs is held at once, and both
+outputs are written while they are read, a file chunk at a time. The ZIP
+is written to an unseekable stream (data descriptors), and the merged PDF
+copies each document's objects under new numbers and writes the page tree
+and cross-reference table last; only offsets and page numbers are kept.
+
+Batches over INLINE_LIMIT documents are exported by the
+'finance.export_documents' job instead; the file goes to the database
+(core.jobs.store_file), where the web service can serve it whichever
+machine the worker ran on. The job reports progress and its result
+carries the download URL.
+
+Usage:
+    documents = exports.select(school, 'receipts', {'date': '2025-06-10'})
+    chunks = exports.zip_stream(exports.rendered(exports.KINDS['receipts'], documents))
+"""
+import datetime
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import jobs, pdf_cache
+
+from . import documents
+
+KINDS = {'receipts': documents.RECEIPT, 'invoices': documents.INVOICE}
+FORMATS = ('zip', 'pdf')
+CONTENT_TYPES = {'zip': 'application/zip', 'pdf': 'application/pdf'}
+
+# Larger batches are exported by a job instead of inside the request
+INLINE_LIMIT = 200
+JOB = 'finance.export_documents'
+# Documents rendered (and held in memory) at a time
+BATCH_SIZE = 32
+# Bytes copied per read from a cached PDF
+STREAM_CHUNK = 64 * 1024
+
+# Exported files older than this are removed when the next export is written
+EXPORT_RETENTION = datetime.timedelta(days=1)
+
+
+def _date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def _receipts(school, params):
+    from .models import Receipt
+
+    receipts = Receipt.objects.for_school(school)
+    day = _date(params, 'date')
+    date_from, date_to = _date(params, 'date_from'), _date(params, 'date_to')
+    if day:
+        receipts = receipts.filter(date=day)
+    if date_from:
+        receipts = receipts.filter(date__gte=date_from)
+    if date_to:
+        receipts = receipts.filter(date__lte=date_to)
+    if params.get('mode'):
+        receipts = receipts.filter(mode=params['mode'])
+    if params.get('class_id'):
+        receipts = receipts.filter(invoice__student__current_class_id=params['class_id'])
+    return receipts.order_by('date', 'id')
+
+
+def _invoices(school, params):
+    from .models import Invoice
+
+    invoices = Invoice.objects.for_school(school)
+    if params.get('academic_year'):
+        invoices = invoices.filter(academic_year_id=params['academic_year'])
+    if params.get('class_id'):
+        invoices = invoices.filter(student__current_class_id=params['class_id'])
+    if params.get('section_id'):
+        invoices = invoices.filter(student__section_id=params['section_id'])
+    if params.get('status'):
+        invoices = invoices.filter(status=params['status'])
+    return invoices.order_by('student__section__name', 'student__enrollment_number', 'id')
+
+
+_SELECTORS = {'receipts': _receipts, 'invoices': _invoices}
+
+
+def select(school, kind, params):
+    """
+    Receipts (date, or date_from/date_to; mode, class_id) or invoices
+    (academic_year, class_id, section_id, status) of `school`, in export
+    order. Raises ValueError for an unknown kind or a malformed date.
+    """
+    if kind not in _SELECTORS:
+        raise ValueError(f"type must be one of: {', '.join(KINDS)}")
+    return _SELECTORS[kind](school, params)
+
+
+def _contexts(kind, queryset):
+    """(pk, template context) of each document, read in chunks."""
+    if kind == documents.INVOICE:
+        queryset = queryset.select_related(
+            'school', 'academic_year', 'student__current_class', 'student__section'
+        )
+        build = documents.invoice_context
+    else:
+        build = documents.receipt_context
+    for row in queryset.iterator(chunk_size=BATCH_SIZE * 4):
+        yield row.pk, build(row)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _init_worker():
+    # Spawned workers start without Django; forked ones already have it
+    import django
+    django.setup()
+
+
+def _workers():
+    return getattr(settings, 'PDF_EXPORT_WORKERS', min(4, os.cpu_count() or 1))
+
+
+def rendered(kind, queryset, progress=None, workers=None):
+    """
+    (filename, path of the cached PDF) for each document of `queryset`.
+    `progress(done)` is called after every batch.
+    """
+    workers = _workers() if workers is None else workers
+    done = 0
+    with ExitStack() as stack:
+        pool = None
+        for batch in _batches(_contexts(kind, queryset), BATCH_SIZE):
+            found = [(pk, context, *pdf_cache.lookup(kind, pk, context)) for pk, context in batch]
+            missing = [(pk, context, digest) for pk, context, path, digest in found if path is None]
+            if len(missing) > 1 and workers > 1:
+                if pool is None:
+                    pool = stack.enter_context(ProcessPoolExecutor(workers, initializer=_init_worker))
+                contents = pool.map(documents.render, [kind] * len(missing), [context for _, context, _ in missing])
+            else:
+                contents = (documents.render(kind, context) for _, context, _ in missing)
+            stored = {
+                pk: pdf_cache.store(kind, pk, digest, content)
+                for (pk, _, digest), content in zip(missing, contents)
+            }
+            for pk, context, path, _ in found:
+                yield documents.filename(kind, context), path or stored[pk]
+            done += len(batch)
+            if progress:
+                progress(done)
+
+
+def _copy(path):
+    with open(path, 'rb') as source:
+        yield from iter(lambda: source.read(STREAM_CHUNK), b'')
+
+
+class _Sink(io.RawIOBase):
+    """Unseekable write target whose bytes are handed on as they arrive."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_stream(files):
+    """A ZIP (stored: PDFs are compressed already) of `files`, as chunks."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+        for name, path in files:
+            with archive.open(name, 'w') as entry:
+                for chunk in _copy(path):
+                    entry.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+class _PdfWriter:
+    """Writes PDF objects one at a time and remembers only where they start."""
+
+    def __init__(self):
+        self.offsets = {}
+        self.position = 0
+        self.next_number = 1
+
+    def reserve(self):
+        number = self.next_number
+        self.next_number += 1
+        return number
+
+    def emit(self, data):
+        self.position += len(data)
+        return data
+
+    def obj(self, number, value):
+        self.offsets[number] = self.position
+        body = io.BytesIO()
+        value.write_to_stream(body)
+        return self.emit(b'%d 0 obj\n' % number + body.getvalue() + b'\nendobj\n')
+
+    def xref(self, root):
+        start = self.position
+        lines = [b'xref\n0 %d\n' % self.next_number, b'0000000000 65535 f \n']
+        lines += [b'%010d 00000 n \n' % self.offsets[number] for number in range(1, self.next_number)]
+        lines.append(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_number, root, start))
+        return b''.join(lines)
+
+
+class _Remapper:
+    """Gives the objects of one source PDF new numbers in the merged output."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.numbers = {}
+        self.queue = []
+
+    def ref(self, indirect):
+        from pypdf.generic import IndirectObject
+
+        key = (indirect.idnum, indirect.generation)
+        if key not in self.numbers:
+            self.numbers[key] = self.writer.reserve()
+            self.queue.append(indirect)
+        return IndirectObject(self.numbers[key], 0, None)
+
+    def remap(self, value):
+        from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+        # dict/list level access: pypdf's own accessors would resolve references
+        if isinstance(value, IndirectObject):
+            return self.ref(value)
+        if isinstance(value, DictionaryObject):
+            for key, item in list(dict.items(value)):
+                dict.__setitem__(value, key, self.remap(item))
+        elif isinstance(value, ArrayObject):
+            for index, item in enumerate(list.__iter__(value)):
+                list.__setitem__(value, index, self.remap(item))
+        return value
+
+
+def _document_objects(writer, path, parent):
+    """
+    Copy one PDF's pages (and everything they use) under new object
+    numbers. Yields the bytes to write; returns the new page numbers.
+    """
+    from pypdf import PdfReader
+    from pypdf.generic import IndirectObject, NameObject
+
+    reader = PdfReader(path)
+    remapper = _Remapper(writer)
+
+    # Pages come flattened (inherited resources copied in), so their old
+    # parents are not needed
+    pages = [remapper.ref(page.indirect_reference).idnum for page in reader.pages]
+    page_keys = {(page.indirect_reference.idnum, page.indirect_reference.generation) for page in reader.pages}
+    while remapper.queue:
+        indirect = remapper.queue.pop(0)
+        key = (indirect.idnum, indirect.generation)
+        value = reader.get_object(indirect)
+        if key in page_keys:
+            dict.__setitem__(value, NameObject('/Parent'), IndirectObject(parent, 0, None))
+        yield writer.obj(remapper.numbers[key], remapper.remap(value))
+    return pages
+
+
+def pdf_stream(files):
+    """One PDF with the pages of all `files`, in order, as chunks."""
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject
+
+    writer = _PdfWriter()
+    pages_root = writer.reserve()
+    catalog = writer.reserve()
+    yield writer.emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    kids = []
+    for _, path in files:
+        kids += yield from _document_objects(writer, path, pages_root)
+
+    yield writer.obj(pages_root, DictionaryObject({
+        NameObject('/Type'): NameObject('/Pages'),
+        NameObject('/Kids'): ArrayObject(IndirectObject(number, 0, None) for number in kids),
+        NameObject('/Count'): NumberObject(len(kids)),
+    }))
+    yield writer.obj(catalog, DictionaryObject({
+        NameObject('/Type'): NameObject('/Catalog'),
+        NameObject('/Pages'): IndirectObject(pages_root, 0, None),
+    }))
+    yield writer.xref(catalog)
+
+
+def stream(kind, queryset, output, progress=None, workers=None):
+    """The export of `queryset` as `output` ('zip' or 'pdf'), as chunks of bytes."""
+    files = rendered(kind, queryset, progress=progress, workers=workers)
+    chunks = zip_stream(files) if output == 'zip' else pdf_stream(files)
+    return (chunk for chunk in chunks if chunk)
+
+
+def _prune():
+    from core.models import JobFileChunk
+
+    cutoff = timezone.now() - EXPORT_RETENTION
+    expired = JobFileChunk.objects.filter(job__name=JOB, job__finished_at__lt=cutoff)
+    expired._raw_delete(expired.db)  # Without loading the file bytes (jobs.store_file)
+
+
+def write(kind, queryset, output, job_pk, progress=None):
+    """Export as job `job_pk`'s output file (jobs). Returns its size in bytes."""
+    _prune()
+    return jobs.store_file(job_pk, stream(kind, queryset, output, progress=progress))
@@ -0,0 +1,146 @@
+"""
+Fee structure resolver.
+
+The effective fees of a student are the class-wide FeeStructures of the
+year with that section's overrides on top. For every (class, section) of a
+school's year the resolved heads are compiled once, GST split and invoice
+round-off included:
+
+    {(class_pk, section_pk or None): template or None}
+
+    template = {
+        'total_amount': Decimal, 'round_off_amount': Decimal,
+        'breakups': [{'head_id', 'head_name', 'structure_amount', 'gst_rate',
+                      'is_tax_inclusive', 'amount', 'base_amount', 'tax_amount'}, ...],
+    }
+
+The compiled matrix is cached per (school, year) in the school's cache
+namespace (core.cache_utils). Saving or deleting a FeeStructure or
+FeeCategory bumps that namespace (finance.signals), so the next read
+recompiles. Templates are shared between callers and must not be
+modified; finance.discounts works on copies.
+
+Usage:
+    template = fee_matrix.resolve(school, academic_year, class_pk, section_pk)
+    matrix = fee_matrix.get_matrix(school, academic_year)    # generation: one cache read
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+from core import cache_utils
+
+CACHE_PREFIX = 'fee_matrix'
+CACHE_TIMEOUT = 3600  # Invalidated on change; the timeout only bounds memory
+
+
+def _pk(value):
+    return getattr(value, 'pk', value)
+
+
+def load_structures(school, academic_year):
+    """
+    All FeeStructures of the year in one query, as
+    {(class_pk, section_pk or None): {category_pk: row}}.
+    """
+    from .models import FeeStructure
+
+    matrix = {}
+    rows = FeeStructure.objects.for_school(_pk(school)).filter(academic_year_id=_pk(academic_year)).values(
+        'class_assigned_id', 'section_id', 'category_id', 'amount',
+        'category__name', 'category__gst_rate', 'category__is_tax_inclusive',
+    )
+    for row in rows:
+        matrix.setdefault((row['class_assigned_id'], row['section_id']), {})[row['category_id']] = row
+    return matrix
+
+
+def build_template(matrix, class_pk, section_pk):
+    """
+    Breakup rows and totals shared by every student of (class, section),
+    or None when no fees are defined for them.
+    Priority: Section Specific > Class General
+    """
+    final_structures = dict(matrix.get((class_pk, None), {}))
+    if section_pk is not None:
+        final_structures.update(matrix.get((class_pk, section_pk), {}))
+    if not final_structures:
+        return None
+
+    # Calculate Totals & GST
+    breakup_data = []
+    for category_pk, struct in sorted(final_structures.items()):
+        rate = struct['category__gst_rate']
+        inclusive = struct['category__is_tax_inclusive']
+        amount = struct['amount']  # This is the structure amount
+
+        if inclusive:
+            # Formula: Base = Amount / (1 + Rate/100)
+            base = amount / (1 + (rate / Decimal('100.00')))
+            tax = amount - base
+            total_head = amount
+        else:
+            # Formula: Tax = Amount * (Rate/100)
+            base = amount
+            tax = base * (rate / Decimal('100.00'))
+            total_head = base + tax
+
+        # Round to 2 decimal places for storage
+        breakup_data.append({
+            'head_id': category_pk,
+            'head_name': struct['category__name'],
+            'structure_amount': amount,
+            'gst_rate': rate,
+            'is_tax_inclusive': inclusive,
+            'amount': total_head.quantize(Decimal('0.01')),
+            'base_amount': base.quantize(Decimal('0.01')),
+            'tax_amount': tax.quantize(Decimal('0.01')),
+        })
+
+    return template_totals(breakup_data)
+
+
+def template_totals(breakup_data):
+    """Breakup template with the invoice total, rounded to the nearest rupee."""
+    gross_total = sum((row['amount'] for row in breakup_data), Decimal('0.00'))
+
+    # Total Round Off Logic (Round to nearest Integer)
+    final_total = gross_total.quantize(Decimal('1.'), rounding=ROUND_HALF_UP)
+    return {
+        'total_amount': final_total,
+        'round_off_amount': final_total - gross_total,
+        'breakups': breakup_data,
+    }
+
+
+def compile_matrix(school, academic_year):
+    """Resolved templates of every (class, section) that has fee structures."""
+    structures = load_structures(school, academic_year)
+    compiled = {}
+    for class_pk, section_pk in structures:
+        compiled[(class_pk, section_pk)] = build_template(structures, class_pk, section_pk)
+        compiled.setdefault((class_pk, None), build_template(structures, class_pk, None))
+    return compiled
+
+
+def get_matrix(school, academic_year):
+    """The compiled matrix of (school, year), from the cache when current."""
+    return cache_utils.get_or_compute(
+        CACHE_PREFIX, _pk(school), lambda: compile_matrix(school, academic_year),
+        timeout=CACHE_TIMEOUT, key_args=(_pk(academic_year),),
+    )
+
+
+def lookup(matrix, class_pk, section_pk):
+    """Template of (class, section) in a compiled matrix; sections without overrides use the class's."""
+    if (class_pk, section_pk) in matrix:
+        return matrix[(class_pk, section_pk)]
+    return matrix.get((class_pk, None))
+
+
+def resolve(school, academic_year, class_pk, section_pk=None):
+    """Effective fees of (class, section) in the year, or None if none are defined."""
+    return lookup(get_matrix(school, academic_year), _pk(class_pk), _pk(section_pk))
+
+
+def invalidate(school_pk):
+    """Drop the compiled matrices of a school (every year)."""
+    cache_utils.invalidate_school_cache(school_pk)
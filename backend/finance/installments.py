@@ -0,0 +1,210 @@
+"""
+Bulk installment plans.
+
+A plan is a list of shares of the invoice total with their due dates:
+
+    [{'percent': 40, 'due_date': '2025-04-10'},
+     {'percent': 30, 'due_date': '2025-08-10'},
+     {'percent': 30, 'due_date': '2025-12-10'}]
+
+generate() applies it to every open invoice of an academic year (optionally
+one class or section) that has no installments yet. Each invoice total is
+split in whole paise (largest remainder, so the installments add up to the
+total exactly); what the invoice has already been paid is posted to the
+earliest installments, as process_payment() would have.
+
+Installments are written with chunked bulk_create() and IDs reserved per
+chunk (core.ids). preview() runs the same split without writing and
+returns per-class totals.
+
+Usage:
+    plan = installments.parse_plan(request.data['plan'])
+    installments.preview(school, year, plan, class_id=3)
+    installments.generate(school, year, plan, class_id=3)    # 'finance.generate_installments' job
+"""
+import datetime
+import logging
+import time
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+
+from django.db import models, transaction
+
+from core import audit, ids
+from core.middleware import get_current_user
+from core.models import AuditLog
+
+from . import allocation
+
+logger = logging.getLogger(__name__)
+
+PAISA = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+# Invoices per bulk_create() batch (one transaction each)
+CHUNK_SIZE = 500
+
+
+def parse_plan(plan):
+    """
+    Validate a plan (list of {'percent', 'due_date'}) and return it as
+    [(Decimal percent, date due), ...]. Raises ValueError.
+    """
+    if not isinstance(plan, (list, tuple)) or not plan:
+        raise ValueError("plan must be a non-empty list of {percent, due_date}")
+    parsed = []
+    for number, item in enumerate(plan, start=1):
+        try:
+            percent = Decimal(str(item['percent']))
+            due_date = item['due_date']
+            if not isinstance(due_date, datetime.date):
+                due_date = datetime.date.fromisoformat(str(due_date))
+        except (KeyError, TypeError, InvalidOperation, ValueError):
+            raise ValueError(f"Installment {number}: percent and due_date (YYYY-MM-DD) are required")
+        if percent <= 0:
+            raise ValueError(f"Installment {number}: percent must be positive")
+        if parsed and due_date <= parsed[-1][1]:
+            raise ValueError(f"Installment {number}: due dates must be in increasing order")
+        parsed.append((percent, due_date))
+    if sum(percent for percent, _ in parsed) != HUNDRED:
+        raise ValueError("Installment percentages must add up to 100")
+    return parsed
+
+
+def split(total, plan):
+    """
+    Split `total` into len(plan) amounts in whole paise that add up to it
+    exactly. The paise lost to rounding go to the largest remainders,
+    earliest installment first on ties.
+    """
+    total = Decimal(total)
+    exact = [total * percent / HUNDRED for percent, _ in plan]
+    amounts = [value.quantize(PAISA, rounding=ROUND_DOWN) for value in exact]
+    residue = int((total - sum(amounts)) / PAISA)
+    order = sorted(range(len(plan)), key=lambda index: (-(exact[index] - amounts[index]), index))
+    for index in order[:residue]:
+        amounts[index] += PAISA
+    return amounts
+
+
+def open_invoices(school, academic_year, class_id=None, section_id=None):
+    """Unpaid invoices of the year (and class/section) without installments."""
+    from .models import FeeInstallment, Invoice
+
+    invoices = Invoice.objects.for_school(school).filter(academic_year=academic_year).exclude(status='PAID')
+    if class_id:
+        invoices = invoices.filter(student__current_class_id=class_id)
+    if section_id:
+        invoices = invoices.filter(student__section_id=section_id)
+    return invoices.exclude(models.Exists(FeeInstallment.objects.filter(invoice=models.OuterRef('pk'))))
+
+
+def _rows(invoices):
+    """(invoice_pk, class_pk, class name, total, paid) for each invoice, by class then id."""
+    return invoices.order_by('student__current_class__order', 'student__current_class_id', 'id').values_list(
+        'id', 'student__current_class_id', 'student__current_class__name', 'total_amount', 'paid_amount',
+    )
+
+
+def _build(invoice_pk, school_pk, total, paid, plan):
+    """Unsaved installments of one invoice, with its paid amount posted oldest due first."""
+    from .models import FeeInstallment
+
+    amounts = split(total, plan)
+    lines = [
+        allocation.Line(number, amount, due_date=due_date)
+        for number, (amount, (_, due_date)) in enumerate(zip(amounts, plan), start=1)
+    ]
+    posted = allocation.allocate(lines, min(paid, total), allocation.OLDEST_DUE_FIRST)
+    result = []
+    for line in lines:
+        paid_part = posted.get(line.key, Decimal('0.00'))
+        result.append(FeeInstallment(
+            school_id=school_pk,
+            invoice_id=invoice_pk,
+            installment_number=line.key,
+            amount=line.balance,
+            due_date=line.due_date,
+            paid_amount=paid_part,
+            # Same rule as FeeInstallment.save(), which bulk_create() skips
+            status='PAID' if paid_part >= line.balance else 'PENDING',
+        ))
+    return result
+
+
+def _summarise(rows, plan):
+    """Per-class totals of what the plan would create for `rows`."""
+    by_class = {}
+    for _, class_pk, class_name, total, _ in rows:
+        entry = by_class.setdefault(class_pk, {
+            'class_id': class_pk,
+            'class_name': class_name or 'Unassigned',
+            'invoices': 0,
+            'total_amount': Decimal('0.00'),
+            'installments': [
+                {'number': number, 'due_date': due_date, 'amount': Decimal('0.00')}
+                for number, (_, due_date) in enumerate(plan, start=1)
+            ],
+        })
+        entry['invoices'] += 1
+        entry['total_amount'] += total
+        for installment, amount in zip(entry['installments'], split(total, plan)):
+            installment['amount'] += amount
+    return list(by_class.values())
+
+
+def preview(school, academic_year, plan, class_id=None, section_id=None):
+    """What generate() would create, per class, without writing anything."""
+    by_class = _summarise(list(_rows(open_invoices(school, academic_year, class_id, section_id))), plan)
+    return {
+        'dry_run': True,
+        'invoices': sum(entry['invoices'] for entry in by_class),
+        'installments': sum(entry['invoices'] for entry in by_class) * len(plan),
+        'total_amount': sum((entry['total_amount'] for entry in by_class), Decimal('0.00')),
+        'by_class': by_class,
+    }
+
+
+def generate(school, academic_year, plan, class_id=None, section_id=None, chunk_size=None, progress=None):
+    """
+    Create the plan's installments for every matching invoice. Returns the
+    same per-class summary as preview(). `progress(done, total, message)`
+    is called after every chunk (jobs).
+    """
+    from .models import FeeInstallment
+
+    started = time.monotonic()
+    chunk_size = int(chunk_size or CHUNK_SIZE)
+    school_pk = getattr(school, 'pk', school)
+    rows = list(_rows(open_invoices(school, academic_year, class_id, section_id)))
+
+    user = get_current_user()
+    created = 0
+    for offset in range(0, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        with transaction.atomic():
+            objs = [
+                installment
+                for invoice_pk, _, _, total, paid in chunk
+                for installment in _build(invoice_pk, school_pk, total, paid, plan)
+            ]
+            FeeInstallment.objects.bulk_create(ids.assign(objs, 'installment_id', 'INST'), batch_size=1000)
+            for installment in objs:
+                audit.record(AuditLog.ACTION_CREATE, installment, user=user)
+        created += len(objs)
+        if progress:
+            progress(offset + len(chunk), len(rows), 'Creating installments')
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        "Installment plan for school %s, year %s: %d installments on %d invoices in %.2fs",
+        school_pk, getattr(academic_year, 'pk', academic_year), created, len(rows), elapsed,
+    )
+    by_class = _summarise(rows, plan)
+    return {
+        'dry_run': False,
+        'invoices': len(rows),
+        'installments': created,
+        'total_amount': sum((entry['total_amount'] for entry in by_class), Decimal('0.00')),
+        'by_class': by_class,
+        'elapsed_seconds': round(elapsed, 3),
+    }
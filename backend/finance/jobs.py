@@ -0,0 +1,69 @@
+"""
+Background job handlers for finance (see core.jobs).
+"""
+import datetime
+
+from core import jobs
+
+
+@jobs.register('finance.generate_annual_fees')
+def generate_annual_fees(job, academic_year_id, options=None):
+    from schools.models import AcademicYear
+    from .services import FeeService
+
+    academic_year = AcademicYear.objects.get(id=academic_year_id, school=job.school)
+    return FeeService.generate_annual_fees(academic_year, job.school, options, progress=job.progress)
+
+
+@jobs.register('finance.generate_payroll')
+def generate_payroll(job, month):
+    from .services import PayrollService
+
+    target_month = datetime.date.fromisoformat(month)
+    return PayrollService.generate_month(job.school, target_month, generated_by=job.user, progress=job.progress)
+
+
+@jobs.register('finance.mark_overdue')
+def mark_overdue(job):
+    from . import overdue
+
+    schools = [job.school.pk] if job.school else None
+    totals = overdue.sweep(schools, progress=job.progress)
+    # Job results are JSON: school keys become strings anyway
+    totals['by_school'] = {str(pk): counts for pk, counts in totals['by_school'].items()}
+    return totals
+
+
+@jobs.register('finance.generate_installments')
+def generate_installments(job, academic_year_id, plan, class_id=None, section_id=None):
+    import json
+    from django.core.serializers.json import DjangoJSONEncoder
+    from schools.models import AcademicYear
+    from . import installments
+
+    academic_year = AcademicYear.objects.get(id=academic_year_id, school=job.school)
+    result = installments.generate(
+        job.school, academic_year, installments.parse_plan(plan),
+        class_id=class_id, section_id=section_id, progress=job.progress,
+    )
+    # Amounts and due dates as JSON strings
+    return json.loads(json.dumps(result, cls=DjangoJSONEncoder))
+
+
+@jobs.register('finance.export_documents')
+def export_documents(job, kind, params, output='zip'):
+    from django.urls import reverse
+    from . import exports
+
+    queryset = exports.select(job.school, kind, params)
+    total = queryset.count()
+    size = exports.write(
+        exports.KINDS[kind], queryset, output, job.id,
+        progress=lambda done: job.progress(done, total, f'Rendered {done} of {total}'),
+    )
+    return {
+        'documents': total,
+        'format': output,
+        'size': size,
+        'download_url': reverse('document-export-download', args=[job.id]),
+    }
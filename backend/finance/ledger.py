@@ -0,0 +1,244 @@
+"""
+Per-student fee ledger.
+
+StudentLedger keeps, per (student, academic year), what was invoiced,
+paid and waived and the resulting balance. Every invoice save moves it by
+the difference between the old and new total/paid amounts (known from
+core.tracking) with a single
+
+    UPDATE finance_studentledger SET invoiced = invoiced + %s, ... WHERE ...
+
+inside the caller's transaction; waivers then move their part of "paid"
+to "waived". Pending-fee screens read and sort the stored balances.
+
+Writes that bypass signals must report themselves: record_created() after
+Invoice.objects.bulk_create(), refresh() after a queryset.update() of
+amounts. rebuild() (the rebuild_ledger command) recomputes everything
+from the invoices.
+
+Usage:
+    ledger.record_created(invoices)              # after bulk_create(invoices)
+    ledger.record_waiver(invoice, amount)        # after posting a WAIVER receipt
+    ledger.rebuild(school_pk)                    # full recount, returns drift
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from core import tracking
+
+AMOUNTS = ('invoiced', 'paid', 'waived', 'balance')
+WAIVER_MODE = 'WAIVER'
+
+ZERO = Decimal('0')
+
+
+def _key(invoice):
+    return (invoice.school_id, invoice.student_id, invoice.academic_year_id)
+
+
+def _amount(value):
+    return Decimal(str(value or 0))
+
+
+def _contribute(deltas, key, invoiced=ZERO, paid=ZERO, waived=ZERO, sign=1):
+    values = deltas[key]
+    values['invoiced'] += sign * invoiced
+    values['paid'] += sign * paid
+    values['waived'] += sign * waived
+    values['balance'] += sign * (invoiced - paid - waived)
+
+
+def _new_deltas():
+    return defaultdict(lambda: {name: ZERO for name in AMOUNTS})
+
+
+# --- Writes ---
+
+def apply(deltas):
+    """Add `deltas` ({(school, student, year): {amount: delta}}) to the ledger rows."""
+    from .models import StudentLedger
+
+    # Fixed order, so two transactions never lock the same rows the other way round
+    for (school_pk, student_pk, year_pk), values in sorted(deltas.items()):
+        changes = {name: F(name) + amount for name, amount in values.items() if amount}
+        if not changes:
+            continue
+        lookup = {'student_id': student_pk, 'academic_year_id': year_pk}
+        changes['updated_at'] = timezone.now()
+        if StudentLedger.objects.filter(**lookup).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                StudentLedger.objects.create(school_id=school_pk, **lookup, **values)
+        except IntegrityError:
+            # Created concurrently
+            StudentLedger.objects.filter(**lookup).update(**changes)
+
+
+def record_save(invoice, created):
+    deltas = _new_deltas()
+    if created:
+        _contribute(deltas, _key(invoice), _amount(invoice.total_amount), _amount(invoice.paid_amount))
+    else:
+        changes = tracking.saved_changes(invoice)
+        if changes is None:
+            # Saved without a loaded snapshot: old values unknown, recount
+            refresh(invoice.student_id, invoice.academic_year_id)
+            return
+        if 'student' in changes or 'academic_year' in changes or 'school' in changes:
+            old = {name: changes[name][0] for name in ('student', 'academic_year') if name in changes}
+            refresh(invoice.student_id, invoice.academic_year_id)
+            refresh(old.get('student', invoice.student_id), old.get('academic_year', invoice.academic_year_id))
+            return
+        old_total, new_total = changes.get('total_amount', (invoice.total_amount, invoice.total_amount))
+        old_paid, new_paid = changes.get('paid_amount', (invoice.paid_amount, invoice.paid_amount))
+        _contribute(
+            deltas, _key(invoice),
+            _amount(new_total) - _amount(old_total),
+            _amount(new_paid) - _amount(old_paid),
+        )
+    apply(deltas)
+
+
+def record_delete(invoice):
+    # The invoice's waiver receipts are deleted with it: recount the row
+    refresh(invoice.student_id, invoice.academic_year_id)
+
+
+def record_created(invoices):
+    """Post invoices inserted with bulk_create() (no post_save signal is sent)."""
+    from .models import StudentLedger
+
+    deltas = _new_deltas()
+    for invoice in invoices:
+        _contribute(deltas, _key(invoice), _amount(invoice.total_amount), _amount(invoice.paid_amount))
+    if not deltas:
+        return
+
+    # Generation mostly opens new (student, year) rows: insert those in one go
+    existing = set(StudentLedger.objects.filter(
+        student_id__in={key[1] for key in deltas},
+        academic_year_id__in={key[2] for key in deltas},
+    ).values_list('student_id', 'academic_year_id'))
+    new_keys = sorted(key for key in deltas if (key[1], key[2]) not in existing)
+    try:
+        with transaction.atomic():
+            StudentLedger.objects.bulk_create([
+                StudentLedger(school_id=key[0], student_id=key[1], academic_year_id=key[2], **deltas[key])
+                for key in new_keys
+            ], batch_size=500)
+    except IntegrityError:
+        # Some were created concurrently: fall back to row by row
+        apply(deltas)
+        return
+    apply({key: values for key, values in deltas.items() if (key[1], key[2]) in existing})
+
+
+def record_waiver(invoice, amount):
+    """Reclassify `amount` already posted to the invoice's paid amount as waived."""
+    deltas = _new_deltas()
+    amount = _amount(amount)
+    _contribute(deltas, _key(invoice), paid=-amount, waived=amount)
+    apply(deltas)
+
+
+def refresh(student_pk, year_pk):
+    """Recount one (student, year) row from its invoices."""
+    from .models import StudentLedger
+
+    rows = compute(student_id=student_pk, academic_year_id=year_pk)
+    values = rows.get((student_pk, year_pk))
+    if values is None:
+        StudentLedger.objects.filter(student_id=student_pk, academic_year_id=year_pk).delete()
+        return
+    school_pk = values.pop('school_id')
+    if StudentLedger.objects.filter(student_id=student_pk, academic_year_id=year_pk).update(
+        updated_at=timezone.now(), **values
+    ):
+        return
+    try:
+        with transaction.atomic():
+            StudentLedger.objects.create(
+                school_id=school_pk, student_id=student_pk, academic_year_id=year_pk, **values
+            )
+    except IntegrityError:
+        StudentLedger.objects.filter(student_id=student_pk, academic_year_id=year_pk).update(**values)
+
+
+# --- Full recounts ---
+
+def compute(**filters):
+    """
+    Ledger values from the invoices matching `filters` as
+    {(student_pk, year_pk): {'school_id', 'invoiced', 'paid', 'waived', 'balance'}}.
+    """
+    from .models import Invoice, Receipt
+
+    rows = {}
+    invoices = Invoice.objects.filter(**filters).values('school_id', 'student_id', 'academic_year_id').annotate(
+        invoiced=Sum('total_amount'), settled=Sum('paid_amount'),
+    ).order_by()
+    for row in invoices:
+        invoiced, settled = _amount(row['invoiced']), _amount(row['settled'])
+        rows[(row['student_id'], row['academic_year_id'])] = {
+            'school_id': row['school_id'],
+            'invoiced': invoiced,
+            'paid': settled,
+            'waived': ZERO,
+            'balance': invoiced - settled,
+        }
+
+    waivers = Receipt.objects.filter(
+        mode=WAIVER_MODE, **{f'invoice__{name}': value for name, value in filters.items()}
+    ).values('invoice__student_id', 'invoice__academic_year_id').annotate(total=Sum('amount')).order_by()
+    for row in waivers:
+        values = rows.get((row['invoice__student_id'], row['invoice__academic_year_id']))
+        if values is not None:
+            waived = _amount(row['total'])
+            values['waived'] = waived
+            values['paid'] -= waived
+    return rows
+
+
+def rebuild(school_pk, dry_run=False):
+    """
+    Recompute every ledger row of a school from its invoices and fix the
+    stored rows. Returns the drift found as {(student_pk, year_pk): (stored, actual)}
+    balances (None for a missing or stale row).
+    """
+    from .models import StudentLedger
+
+    actual = compute(school_id=school_pk)
+    stored = {
+        (row.student_id, row.academic_year_id): row
+        for row in StudentLedger.objects.filter(school_id=school_pk)
+    }
+
+    drift = {}
+    to_create, to_update = [], []
+    for key, values in actual.items():
+        row = stored.pop(key, None)
+        if row is None:
+            drift[key] = (None, values['balance'])
+            to_create.append(StudentLedger(
+                student_id=key[0], academic_year_id=key[1],
+                **{name: value for name, value in values.items()}
+            ))
+        elif any(getattr(row, name) != values[name] for name in AMOUNTS):
+            drift[key] = (row.balance, values['balance'])
+            for name in AMOUNTS:
+                setattr(row, name, values[name])
+            to_update.append(row)
+    for key, row in stored.items():
+        drift[key] = (row.balance, None)  # No invoices left
+
+    if not dry_run:
+        with transaction.atomic():
+            StudentLedger.objects.bulk_create(to_create, batch_size=500)
+            StudentLedger.objects.bulk_update(to_update, AMOUNTS, batch_size=500)
+            StudentLedger.objects.filter(pk__in=[row.pk for row in stored.values()]).delete()
+    return drift
@@ -0,0 +1,91 @@
+"""
+Benchmark: cold render vs cached serve of invoice and receipt PDFs.
+
+Renders each document once (xhtml2pdf for invoices, reportlab for
+receipts) and then serves it again from the rendered-document cache
+(core.pdf_cache), reporting the average time of each. Fixtures are created
+inside a transaction that is rolled back and the PDFs are written to a
+temporary MEDIA_ROOT, so it is safe on any database.
+
+Run with: python manage.py benchmark_pdf_cache --documents 20
+"""
+import tempfile
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.utils import override_settings
+
+from finance import documents
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _timed_serve(serve, request, document):
+    started = time.perf_counter()
+    response = serve(request, document)
+    b''.join(response.streaming_content)
+    response.close()
+    return time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Measure cold render vs cached serve times of invoice and receipt PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=20, help='Invoices (and receipts) to render')
+
+    def handle(self, *args, **options):
+        count = options['documents']
+        request = RequestFactory().get('/')
+        results = []
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            try:
+                with transaction.atomic():
+                    invoices, receipts = self._create_fixtures(count)
+                    for kind, serve, rows in (
+                        (documents.INVOICE, documents.serve_invoice, invoices),
+                        (documents.RECEIPT, documents.serve_receipt, receipts),
+                    ):
+                        cold = sum(_timed_serve(serve, request, row) for row in rows)
+                        cached = sum(_timed_serve(serve, request, row) for row in rows)
+                        results.append((kind, len(rows), cold, cached))
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+        self.stdout.write(f"{'document':<10} {'count':>6} {'cold ms':>9} {'cached ms':>10} {'speedup':>8}")
+        for kind, rows, cold, cached in results:
+            self.stdout.write(
+                f"{kind:<10} {rows:>6} {cold / rows * 1000:>9.2f} {cached / rows * 1000:>10.2f} "
+                f"{cold / cached if cached else 0:>7.1f}x"
+            )
+
+    def _create_fixtures(self, count):
+        from schools.models import School, AcademicYear
+        from students.models import Student
+        from finance.models import Invoice, Receipt
+
+        school = School.objects.create(name='PDF Benchmark School')
+        year = AcademicYear.objects.create(
+            school=school, name='BENCH', start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+        )
+        student = Student.objects.create(
+            school=school, academic_year=year, first_name='Bench', last_name='Mark',
+            enrollment_number='BENCH-001', date_of_birth=date(2012, 1, 1), gender='M',
+        )
+        invoices, receipts = [], []
+        for _ in range(count):
+            invoice = Invoice.objects.create(
+                school=school, student=student, academic_year=year,
+                total_amount=Decimal('10000.00'), due_date=date(2024, 6, 15),
+            )
+            invoices.append(invoice)
+            receipts.append(Receipt.objects.create(school=school, invoice=invoice, amount=Decimal('2500.00'), mode='CASH'))
+        return invoices, receipts
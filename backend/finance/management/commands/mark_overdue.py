@@ -0,0 +1,67 @@
+"""
+Management command to mark invoices and installments past their due date as OVERDUE.
+Run with: python manage.py mark_overdue   (daily, from cron)
+
+Each run is recorded as a 'finance.mark_overdue' job (core.jobs), so its
+counts stay visible in the Job table after the cron container exits.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core import jobs
+from core.models import Job
+from finance import overdue
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Marks PENDING/PARTIAL invoices and PENDING installments past their due date as OVERDUE'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='School ID (e.g. SCH-...) to sweep; all schools if omitted',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count what would be marked without changing anything',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        schools = School.objects.order_by('id')
+        school = None
+        if options.get('school'):
+            school = schools.filter(school_id=options['school']).first()
+            if school is None:
+                raise CommandError(f"School {options['school']} not found")
+            schools = schools.filter(pk=school.pk)
+        names = {str(pk): school_id for pk, school_id in schools.values_list('id', 'school_id')}
+
+        if dry_run:
+            totals = overdue.sweep([int(pk) for pk in names], dry_run=True)
+        else:
+            totals = self._run_job(school)
+        for school_pk, counts in totals['by_school'].items():
+            self.stdout.write(
+                f"  {names[str(school_pk)]}: {counts['invoices']} invoice(s), "
+                f"{counts['installments']} installment(s)"
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['invoices']} invoice(s) and {totals['installments']} installment(s) "
+            f"{'would be ' if dry_run else ''}marked overdue in {totals['seconds']:.2f}s."
+        ))
+
+    def _run_job(self, school):
+        job = jobs.enqueue('finance.mark_overdue', school=school)
+        jobs.run_job(job.pk)  # Already ran if JOBS_EAGER
+        job.refresh_from_db()
+        if job.status != Job.STATUS_SUCCEEDED:
+            raise CommandError(f"Overdue sweep failed (job {job.pk}): {job.error}")
+        self.stdout.write(f"Recorded as job {job.pk}")
+        return job.result
@@ -0,0 +1,44 @@
+"""
+Management command to recompute the per-student fee ledger from invoices.
+Run with: python manage.py rebuild_ledger --school SCH-...
+"""
+from django.core.management.base import BaseCommand
+
+from finance import ledger
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Recomputes StudentLedger rows (invoiced/paid/waived/balance) from invoices and receipts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='School ID (e.g. SCH-...) to rebuild; all schools if omitted',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without fixing it',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        schools = School.objects.order_by('id')
+        if options.get('school'):
+            schools = schools.filter(school_id=options['school'])
+
+        rows = 0
+        for school in schools.only('id', 'school_id'):
+            drift = ledger.rebuild(school.pk, dry_run=dry_run)
+            if drift:
+                rows += len(drift)
+                self.stdout.write(self.style.WARNING(f'  {school.school_id}: {len(drift)} ledger row(s) off'))
+                for (student_pk, year_pk), (stored, actual) in sorted(drift.items())[:20]:
+                    self.stdout.write(f'    student {student_pk}, year {year_pk}: {stored} -> {actual}')
+
+        self.stdout.write(self.style.SUCCESS(f'Ledger rebuilt ({rows} row(s) corrected).'))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0010_feestructure_gst_rate_feestructure_is_tax_inclusive'),
+        ('schools', '0010_school_geofence_radius'),
+        ('students', '0006_student_gr_number_alter_student_enrollment_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['school', '-created_at', '-id'], name='invoice_school_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['school', '-created_at', '-id'], name='receipt_school_created_idx'),
+        ),
+    ]
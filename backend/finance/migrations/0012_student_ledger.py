@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    Invoice = apps.get_model('finance', 'Invoice')
+    Receipt = apps.get_model('finance', 'Receipt')
+    StudentLedger = apps.get_model('finance', 'StudentLedger')
+
+    waived = {
+        (row['invoice__student_id'], row['invoice__academic_year_id']): row['total']
+        for row in Receipt.objects.filter(mode='WAIVER').values(
+            'invoice__student_id', 'invoice__academic_year_id'
+        ).annotate(total=models.Sum('amount')).order_by()
+    }
+    rows = Invoice.objects.values('school_id', 'student_id', 'academic_year_id').annotate(
+        invoiced=models.Sum('total_amount'), settled=models.Sum('paid_amount'),
+    ).order_by()
+    ledgers = []
+    for row in rows.iterator():
+        waiver = waived.get((row['student_id'], row['academic_year_id'])) or 0
+        ledgers.append(StudentLedger(
+            school_id=row['school_id'],
+            student_id=row['student_id'],
+            academic_year_id=row['academic_year_id'],
+            invoiced=row['invoiced'] or 0,
+            paid=(row['settled'] or 0) - waiver,
+            waived=waiver,
+            balance=(row['invoiced'] or 0) - (row['settled'] or 0),
+        ))
+    StudentLedger.objects.bulk_create(ledgers, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0011_keyset_indexes'),
+        ('schools', '0011_school_fee_allocation_strategy'),
+        ('students', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoiced', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Invoiced')),
+                ('paid', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Paid')),
+                ('waived', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Waived')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Balance')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schools.academicyear')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='schools.school')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='fee_ledgers', to='students.student')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['school', '-balance'], name='ledger_school_balance_idx')],
+                'unique_together': {('student', 'academic_year')},
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
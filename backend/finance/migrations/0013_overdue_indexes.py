@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_student_ledger'),
+        ('schools', '0011_school_fee_allocation_strategy'),
+        ('students', '0007_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feeinstallment',
+            name='installment_school_status_idx',
+        ),
+        migrations.AddIndex(
+            model_name='feeinstallment',
+            index=models.Index(fields=['school', 'status', 'due_date'], name='installment_status_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['school', 'status', 'due_date'], name='invoice_status_due_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_overdue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentfeebreakup',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10, verbose_name='Discount Amount'),
+        ),
+        migrations.AddField(
+            model_name='studentfeebreakup',
+            name='discount_details',
+            field=models.JSONField(blank=True, default=list, help_text='[{discount_id, reason, type, value, amount}]'),
+        ),
+    ]
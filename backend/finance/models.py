@@ -5,10 +5,12 @@ from schools.models import School, AcademicYear, Class
 from students.models import Student
 from core.models import CoreUser
 from core.utils import generate_business_id
+from core.managers import TenantManager
 
 class FeeCategory(models.Model):
     name = models.CharField(_("Category Name"), max_length=100) # e.g. Tuition, Transport
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     description = models.TextField(blank=True)
     
     # GST Configuration
@@ -30,6 +32,7 @@ class FeeCategory(models.Model):
 
 class FeeStructure(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
     class_assigned = models.ForeignKey(Class, on_delete=models.CASCADE)
     # Added Section support as per requirements ("Can be different for each class and section")
@@ -55,6 +58,7 @@ class Invoice(models.Model):
     invoice_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='invoices')
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
     
@@ -74,13 +78,24 @@ class Invoice(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['school', '-created_at', '-id'], name='invoice_school_created_idx'),
+            # Overdue sweep (finance.overdue) and receivable filters
+            models.Index(fields=['school', 'status', 'due_date'], name='invoice_status_due_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.invoice_id:
-            self.invoice_id = generate_business_id('INV')
+            self.invoice_id = generate_business_id('INV', school=self.school_id)
         
-        # Auto update status base on amounts
+        # Auto update status base on amounts; OVERDUE (set by the sweeper) stays
+        # until the balance is cleared
         if self.paid_amount >= self.total_amount:
             self.status = 'PAID'
+        elif self.status == 'OVERDUE':
+            pass
         elif self.paid_amount > 0:
             self.status = 'PARTIAL'
         else:
@@ -92,6 +107,13 @@ class Invoice(models.Model):
     def balance_due(self):
         return self.total_amount - self.paid_amount
 
+    @property
+    def is_overdue(self):
+        # Also true between the due date and the next overdue sweep
+        return self.status == 'OVERDUE' or (
+            self.balance_due > 0 and self.due_date < timezone.localdate()
+        )
+
     def __str__(self):
         return f"{self.invoice_id} - {self.student.first_name}"
 
@@ -112,6 +134,10 @@ class StudentFeeBreakup(models.Model):
     
     paid_amount = models.DecimalField(_("Paid Amount"), max_digits=10, decimal_places=2, default=0)
     
+    # Discounts taken off `amount` at generation (finance.discounts)
+    discount_amount = models.DecimalField(_("Discount Amount"), max_digits=10, decimal_places=2, default=0)
+    discount_details = models.JSONField(default=list, blank=True, help_text="[{discount_id, reason, type, value, amount}]")
+    
     @property
     def balance(self):
         return self.amount - self.paid_amount
@@ -127,6 +153,7 @@ class Receipt(models.Model):
     receipt_no = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='receipts')
     amount = models.DecimalField(_("Amount Paid"), max_digits=10, decimal_places=2)
     round_off_amount = models.DecimalField(_("Round Off Amount"), max_digits=5, decimal_places=2, default=0.00)
@@ -145,9 +172,15 @@ class Receipt(models.Model):
     created_by = models.ForeignKey(CoreUser, on_delete=models.SET_NULL, null=True, related_name='receipts_created')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination order (core.pagination)
+            models.Index(fields=['school', '-created_at', '-id'], name='receipt_school_created_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.receipt_no:
-            self.receipt_no = generate_business_id('RCP')
+            self.receipt_no = generate_business_id('RCP', school=self.school_id)
         super().save(*args, **kwargs)
         # Note: Invoice paid_amount update and Allocation logic should handle 
         # centrally via Signals or Service layer to avoid circular logic here.
@@ -167,6 +200,40 @@ class PaymentAllocation(models.Model):
     def __str__(self):
         return f"Alloc {self.amount} to {self.fee_breakup.head.name}"
 
+class StudentLedger(models.Model):
+    """
+    Running fee totals of one student in one academic year.
+
+    balance = invoiced - paid - waived, kept in step with invoices and
+    payments by finance.ledger inside the same transaction, so pending-fee
+    screens read and sort stored balances instead of summing invoices.
+    `python manage.py rebuild_ledger` recomputes it from the invoices.
+    """
+    # Only ever written with queryset.update(); the invoices carry the audit trail
+    track_changes = False
+
+    school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='fee_ledgers')
+    academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
+
+    invoiced = models.DecimalField(_("Invoiced"), max_digits=12, decimal_places=2, default=0)
+    paid = models.DecimalField(_("Paid"), max_digits=12, decimal_places=2, default=0)
+    waived = models.DecimalField(_("Waived"), max_digits=12, decimal_places=2, default=0)
+    balance = models.DecimalField(_("Balance"), max_digits=12, decimal_places=2, default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('student', 'academic_year')
+        indexes = [
+            # Pending-fee screens: highest balance first
+            models.Index(fields=['school', '-balance'], name='ledger_school_balance_idx'),
+        ]
+
+    def __str__(self):
+        return f"Ledger {self.student_id} / {self.academic_year_id}: {self.balance}"
+
 class Holiday(models.Model):
     school = models.ForeignKey(School, on_delete=models.CASCADE)
     name = models.CharField(_("Holiday Name"), max_length=100)
@@ -198,6 +265,7 @@ class FeeInstallment(models.Model):
     installment_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     invoice = models.ForeignKey(Invoice, on_delete=models.CASCADE, related_name='installments')
     
     installment_number = models.IntegerField(help_text="1, 2, 3, etc.")
@@ -227,9 +295,9 @@ class FeeInstallment(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.installment_id:
-            self.installment_id = generate_business_id('INST')
+            self.installment_id = generate_business_id('INST', school=self.school_id)
         
-        # Auto-update status
+        # Auto-update status (PENDING/OVERDUE stay as they are until paid off)
         if self.paid_amount >= self.amount:
             self.status = 'PAID'
             if not self.paid_date:
@@ -242,7 +310,7 @@ class FeeInstallment(models.Model):
         unique_together = ('invoice', 'installment_number')
         ordering = ['installment_number']
         indexes = [
-            models.Index(fields=['school', 'status'], name='installment_school_status_idx'),
+            models.Index(fields=['school', 'status', 'due_date'], name='installment_status_due_idx'),
             models.Index(fields=['invoice', 'installment_number'], name='installment_invoice_num_idx'),
             models.Index(fields=['due_date'], name='installment_due_date_idx'),
         ]
@@ -254,6 +322,7 @@ class FeeInstallment(models.Model):
 class FeeDiscount(models.Model):
     """Manage student discounts/scholarships"""
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='fee_discounts')
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.CASCADE)
     
@@ -319,6 +388,7 @@ class FeeDiscount(models.Model):
 class CertificateFee(models.Model):
     """Fee configuration for certificates"""
     school = models.ForeignKey(School, on_delete=models.CASCADE)
+    objects = TenantManager()
     
     # Certificate types from certificates app
     CERTIFICATE_TYPE_CHOICES = [
@@ -494,7 +564,7 @@ class Salary(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.salary_id:
-            self.salary_id = generate_business_id('PAY')
+            self.salary_id = generate_business_id('PAY', school=self.school_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
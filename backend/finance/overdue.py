@@ -0,0 +1,89 @@
+"""
+Overdue sweeper.
+
+Invoices and installments past their due date with a balance left move to
+OVERDUE, per school, with one set-based statement each:
+
+    UPDATE finance_invoice SET status = 'OVERDUE'
+     WHERE school_id = %s AND status IN ('PENDING', 'PARTIAL') AND due_date < %s
+
+served by the (school, status, due_date) indexes. OVERDUE is sticky: save()
+keeps it until the balance is cleared (then PAID), so the sweep only ever
+has to look at rows that are still PENDING/PARTIAL.
+
+The dashboard counters count unpaid OVERDUE invoices as pending, so the
+sweep leaves them unchanged and does not need a refresh.
+
+Runs daily from cron (`python manage.py mark_overdue`) or as the
+'finance.mark_overdue' background job.
+
+Usage:
+    overdue.sweep()                          # {'schools', 'invoices', 'installments', 'seconds'}
+    overdue.sweep_school(school_pk, today)   # {'invoices': n, 'installments': m}
+"""
+import logging
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OVERDUE = 'OVERDUE'
+INVOICE_OPEN = ('PENDING', 'PARTIAL')
+INSTALLMENT_OPEN = ('PENDING',)
+
+
+def due(school_pk, today=None):
+    """(invoices, installments) querysets of a school's open rows past their due date."""
+    from .models import FeeInstallment, Invoice
+
+    today = today or timezone.localdate()
+    invoices = Invoice.objects.filter(school_id=school_pk, status__in=INVOICE_OPEN, due_date__lt=today)
+    installments = FeeInstallment.objects.filter(
+        school_id=school_pk, status__in=INSTALLMENT_OPEN, due_date__lt=today
+    )
+    return invoices, installments
+
+
+def sweep_school(school_pk, today=None, dry_run=False):
+    """Mark one school's overdue invoices and installments. Returns the counts."""
+    invoices, installments = due(school_pk, today)
+    if dry_run:
+        return {'invoices': invoices.count(), 'installments': installments.count()}
+    with transaction.atomic():
+        return {
+            'invoices': invoices.update(status=OVERDUE),
+            'installments': installments.update(status=OVERDUE),
+        }
+
+
+def sweep(school_pks=None, today=None, dry_run=False, progress=None):
+    """
+    Sweep the given schools (all if None). Returns the run totals, plus the
+    schools that had anything to mark in 'by_school'.
+    """
+    from schools.models import School
+
+    started = time.monotonic()
+    today = today or timezone.localdate()
+    if school_pks is None:
+        school_pks = list(School.objects.order_by('id').values_list('id', flat=True))
+
+    totals = {'schools': len(school_pks), 'invoices': 0, 'installments': 0, 'by_school': {}}
+    for index, school_pk in enumerate(school_pks):
+        counts = sweep_school(school_pk, today, dry_run=dry_run)
+        totals['invoices'] += counts['invoices']
+        totals['installments'] += counts['installments']
+        if counts['invoices'] or counts['installments']:
+            totals['by_school'][school_pk] = counts
+        if progress:
+            progress(index + 1, len(school_pks), 'Marking overdue fees')
+
+    totals['seconds'] = round(time.monotonic() - started, 3)
+    logger.info(
+        "Overdue sweep%s for %s: %s invoice(s), %s installment(s) in %s school(s), %.3fs",
+        ' (dry run)' if dry_run else '', today, totals['invoices'], totals['installments'],
+        totals['schools'], totals['seconds'],
+    )
+    return totals
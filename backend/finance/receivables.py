@@ -0,0 +1,144 @@
+"""
+Pending receivables.
+
+Reads behind PendingReceivablesView, sized for schools with tens of
+thousands of open invoices:
+
+    summary(invoices)            counts and totals in one conditional aggregate
+    rows(invoices)               flat rows, read with .iterator() in chunks
+    stream(invoices, summary)    the JSON document, generated row by row
+    buckets(invoices, group_by)  aggregated buckets per class, section or fee head
+
+Rows carry what the receivables screen shows (no breakups, no receipts);
+the invoice detail endpoints still serve the full invoice.
+"""
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.utils import timezone
+
+OPEN_STATUSES = ('PENDING', 'PARTIAL', 'OVERDUE')
+GROUPS = ('class', 'section', 'head')
+
+# Invoices fetched per round trip while streaming
+STREAM_CHUNK_SIZE = 1000
+
+_balance = ExpressionWrapper(F('total_amount') - F('paid_amount'), output_field=DecimalField())
+
+
+def summary(invoices):
+    """{'total_invoices', 'total_amount', 'total_paid', 'total_pending', 'overdue_*', 'by_status'} in one query."""
+    today = timezone.localdate()
+    overdue = Q(status='OVERDUE') | Q(due_date__lt=today)
+    totals = invoices.order_by().aggregate(
+        invoice_count=Count('id'),
+        amount=Sum('total_amount'),
+        paid=Sum('paid_amount'),
+        overdue_count=Count('id', filter=overdue),
+        overdue_pending=Sum(_balance, filter=overdue),
+        **{f'status_{status}': Count('id', filter=Q(status=status)) for status in OPEN_STATUSES},
+    )
+    amount = totals['amount'] or Decimal('0')
+    paid = totals['paid'] or Decimal('0')
+    return {
+        'total_invoices': totals['invoice_count'],
+        'total_amount': float(amount),
+        'total_paid': float(paid),
+        'total_pending': float(amount - paid),
+        'overdue_invoices': totals['overdue_count'],
+        'overdue_pending': float(totals['overdue_pending'] or 0),
+        'by_status': {status: totals[f'status_{status}'] for status in OPEN_STATUSES},
+    }
+
+
+def lean(invoices):
+    """The receivables queryset reduced to the columns rows() reads."""
+    return invoices.select_related('student', 'student__current_class').only(
+        'id', 'invoice_id', 'student_id', 'academic_year_id', 'total_amount', 'round_off_amount',
+        'paid_amount', 'due_date', 'status', 'created_at',
+        'student__first_name', 'student__last_name', 'student__current_class__name',
+    )
+
+
+def row(invoice):
+    student = invoice.student
+    return {
+        'id': invoice.pk,
+        'invoice_id': invoice.invoice_id,
+        'student': invoice.student_id,
+        'student_name': f"{student.first_name} {student.last_name}",
+        'class_name': student.current_class.name if student.current_class else None,
+        'total_amount': invoice.total_amount,
+        'paid_amount': invoice.paid_amount,
+        'balance_due': invoice.balance_due,
+        'round_off_amount': invoice.round_off_amount,
+        'due_date': invoice.due_date,
+        'status': invoice.status,
+        'is_overdue': invoice.is_overdue,
+        'academic_year': invoice.academic_year_id,
+        'created_at': invoice.created_at,
+    }
+
+
+def rows(invoices, chunk_size=STREAM_CHUNK_SIZE):
+    for invoice in lean(invoices).iterator(chunk_size=chunk_size):
+        yield row(invoice)
+
+
+def stream(invoices, totals):
+    """
+    The {"summary": ..., "invoices": [...]} document as chunks of JSON text,
+    for StreamingHttpResponse: memory stays flat however many invoices.
+    """
+    encoder = DjangoJSONEncoder()
+    yield '{"summary": ' + encoder.encode(totals) + ', "invoices": ['
+    first = True
+    for item in rows(invoices):
+        yield ('' if first else ',') + encoder.encode(item)
+        first = False
+    yield ']}'
+
+
+def buckets(invoices, group_by):
+    """Aggregated pending amounts per class, section or fee head, largest first."""
+    from .models import StudentFeeBreakup
+
+    if group_by == 'head':
+        breakups = StudentFeeBreakup.objects.filter(invoice__in=invoices.order_by().values('id'))
+        grouped = breakups.values('head_id', 'head__name').annotate(
+            invoice_count=Count('invoice_id', distinct=True),
+            amount=Sum('amount'),
+            paid=Sum('paid_amount'),
+        )
+
+        def key(item):
+            return {'head_id': item['head_id'], 'head_name': item['head__name']}
+    else:
+        fields = ['student__current_class_id', 'student__current_class__name']
+        if group_by == 'section':
+            fields += ['student__section_id', 'student__section__name']
+        grouped = invoices.order_by().values(*fields).annotate(
+            invoice_count=Count('id'),
+            amount=Sum('total_amount'),
+            paid=Sum('paid_amount'),
+        )
+
+        def key(item):
+            values = {'class_id': item['student__current_class_id'], 'class_name': item['student__current_class__name']}
+            if group_by == 'section':
+                values.update(section_id=item['student__section_id'], section_name=item['student__section__name'])
+            return values
+
+    result = []
+    for item in grouped.order_by():
+        amount, paid = item['amount'] or Decimal('0'), item['paid'] or Decimal('0')
+        result.append({
+            **key(item),
+            'invoices': item['invoice_count'],
+            'total_amount': float(amount),
+            'total_paid': float(paid),
+            'total_pending': float(amount - paid),
+        })
+    result.sort(key=lambda bucket: -bucket['total_pending'])
+    return result
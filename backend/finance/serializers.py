@@ -38,6 +38,7 @@ class StudentFeeBreakupSerializer(serializers.ModelSerializer):
             'id', 'head', 'head_name', 
             'amount', 'base_amount', 'tax_amount', 
             'paid_amount', 'balance',
+            'discount_amount', 'discount_details',
             'gst_rate', 'is_tax_inclusive'
         ]
 
@@ -143,8 +144,7 @@ class ReceiptSerializer(serializers.ModelSerializer):
             'date', 'mode',
             'transaction_id', 
             'created_by', 'created_by_name', 'created_at',
-            'collected_by', 'collected_by_name',
-            'remarks'
+            'collected_by_name',
         ]
         read_only_fields = ['receipt_no', 'date', 'created_at']
     
@@ -157,9 +157,8 @@ class ReceiptSerializer(serializers.ModelSerializer):
         return None
     
     def get_collected_by_name(self, obj):
-        if obj.collected_by:
-            return obj.collected_by.get_full_name()
-        return None
+        # Receipts are collected by whoever posts them
+        return self.get_created_by_name(obj)
 
 
 class ReceiptCreateSerializer(serializers.ModelSerializer):
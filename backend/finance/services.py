@@ -1,270 +1,282 @@
+import logging
+import time
 from decimal import Decimal
 from django.db import transaction, models
-from .models import Receipt, PaymentAllocation, StudentFeeBreakup, Invoice, FeeStructure
+from .models import Receipt, PaymentAllocation, StudentFeeBreakup, Invoice, FeeInstallment
+from . import allocation, discounts, fee_matrix, ledger, payroll
+from core import audit, ids
+from core.middleware import get_current_user
+from core.models import AuditLog
 from core.utils import generate_business_id
+from schools.models import School
 from datetime import date
 
+logger = logging.getLogger(__name__)
+
+# Students per bulk_create() batch (one transaction each)
+GENERATION_CHUNK_SIZE = 500
+
+
+def _create_invoices(school, academic_year, due_date, chunk):
+    """Insert one batch of (student_pk, enrollment_number, template) with their breakups."""
+    from reports import counters, rollups
+
+    with transaction.atomic():
+        invoices = [
+            Invoice(
+                school=school,
+                student_id=student_pk,
+                academic_year=academic_year,
+                total_amount=template['total_amount'],
+                round_off_amount=template['round_off_amount'],
+                paid_amount=Decimal('0.00'),
+                # Same rule as Invoice.save(), which bulk_create() skips
+                status='PAID' if template['total_amount'] <= 0 else 'PENDING',
+                due_date=due_date,
+            )
+            for student_pk, _, template in chunk
+        ]
+        Invoice.objects.bulk_create(ids.assign(invoices, 'invoice_id', 'INV'))
+
+        if any(invoice.pk is None for invoice in invoices):
+            # Backend without RETURNING on bulk insert
+            pks = dict(Invoice.objects.filter(
+                invoice_id__in=[invoice.invoice_id for invoice in invoices]
+            ).values_list('invoice_id', 'id'))
+            for invoice in invoices:
+                invoice.pk = pks[invoice.invoice_id]
+
+        # Create Breakups (The Snapshot)
+        breakups = StudentFeeBreakup.objects.bulk_create([
+            StudentFeeBreakup(
+                invoice=invoice,
+                head_id=data['head_id'],
+                amount=data['amount'],
+                base_amount=data['base_amount'],
+                tax_amount=data['tax_amount'],
+                discount_amount=data.get('discount_amount', 0),
+                discount_details=data.get('discount_details', []),
+                paid_amount=0,
+            )
+            for invoice, (_, _, template) in zip(invoices, chunk)
+            for data in template['breakups']
+        ])
+
+        # bulk_create() sends no signals: keep dashboards, ledgers and the audit trail in step
+        counters.record_created(invoices)
+        ledger.record_created(invoices)
+        rollups.record_created(invoices + breakups)
+        user = get_current_user()
+        for invoice in invoices:
+            audit.record(AuditLog.ACTION_CREATE, invoice, user=user)
+    return len(invoices)
+
+def _normalize_allocations(custom_allocations):
+    """[{'head_id': 1, 'amount': 200}, ...] or {head_id: amount} -> {head_id: Decimal}"""
+    allocation_map = {}
+    if isinstance(custom_allocations, list):
+        for item in custom_allocations:
+            allocation_map[int(item['head_id'])] = Decimal(str(item['amount']))
+    elif isinstance(custom_allocations, dict):
+        for k, v in custom_allocations.items():
+            allocation_map[int(k)] = Decimal(str(v))
+    return allocation_map
+
+
+def distribute_custom(breakups, amount, custom_allocations):
+    """Strict per-head split chosen by the cashier. Returns {breakup: amount}."""
+    allocation_map = _normalize_allocations(custom_allocations)
+
+    # Check Total Matches
+    alloc_total = sum(allocation_map.values())
+    if abs(alloc_total - amount) > Decimal('0.05'):  # allow small float variance
+        raise ValueError(f"allocation sum {alloc_total} does not match payment amount {amount}")
+
+    allocations = {}
+    for breakup in breakups:
+        alloc_amount = allocation_map.get(breakup.head_id, Decimal('0'))
+        if alloc_amount > 0 and breakup.amount > breakup.paid_amount:
+            # Validate Cap
+            balance = breakup.amount - breakup.paid_amount
+            if alloc_amount > balance + Decimal('0.05'):  # tolerance
+                raise ValueError(f"Allocation {alloc_amount} exceeds balance {balance} for {breakup.head.name}")
+            allocations[breakup] = min(alloc_amount, balance)  # Clamp to be safe
+    return allocations
+
+
 class FeeService:
     @staticmethod
-    def process_payment(invoice, amount, mode, created_by, transaction_id='', payment_data=None, custom_allocations=None, user=None):
+    def process_payment(invoice, amount, mode, created_by, transaction_id='', payment_data=None, custom_allocations=None, user=None,
+                        strategy=None):
         """
         Creates a receipt and distributes the amount.
         If custom_allocations is provided {head_id: amount}, uses strict distribution.
-        Else, distributes equally across unpaid fee heads.
+        Else, splits it over unpaid fee heads with the school's
+        fee_allocation_strategy (finance.allocation). Pending installments
+        are then paid oldest due first.
+
+        Safe under concurrent payments to the same invoice: the invoice and
+        then its breakups (by id) are locked with SELECT ... FOR UPDATE, the
+        split is computed in memory from the locked rows, and the writes are
+        one bulk_update, one bulk_create and one invoice update. The
+        `invoice` passed in is refreshed with the posted totals.
+        Callers that already hold the school pass its `strategy` to save
+        the lookup.
         """
         created_by = user if user else created_by
-        
+        amount = Decimal(str(amount))
+        if strategy is None:
+            strategy = School.objects.filter(pk=invoice.school_id).values_list(
+                'fee_allocation_strategy', flat=True
+            ).first()
+
         with transaction.atomic():
-            # 1. Create Receipt
+            # 1. Lock in a fixed order (invoice, breakups by id, installments
+            #    by number) so concurrent payments queue up instead of deadlocking
+            locked = Invoice.objects.select_for_update().get(pk=invoice.pk)
+            breakups = list(
+                StudentFeeBreakup.objects.select_for_update(of=('self',)).filter(invoice=locked)
+                .select_related('head').order_by('id')
+            )
+            installments = list(
+                FeeInstallment.objects.select_for_update().filter(invoice=locked)
+                .exclude(status='PAID').order_by('installment_number')
+            )
+
+            # 2. Distribution Logic, on the locked balances
+            if custom_allocations:
+                allocations = distribute_custom(breakups, amount, custom_allocations)
+            else:
+                by_pk = {breakup.pk: breakup for breakup in breakups}
+                split = allocation.allocate([
+                    allocation.Line(b.pk, b.amount - b.paid_amount, b.head.name, locked.due_date)
+                    for b in breakups
+                ], amount, strategy)
+                allocations = {by_pk[pk]: paid for pk, paid in split.items()}
+            allocations = {breakup: paid for breakup, paid in allocations.items() if paid > 0}
+
+            # 3. Create Receipt and persist the split
             receipt = Receipt.objects.create(
-                school=invoice.school,
-                invoice=invoice,
+                school_id=locked.school_id,
+                invoice=locked,
                 amount=amount,
                 mode=mode,
                 created_by=created_by,
                 transaction_id=transaction_id
             )
+            for breakup, paid in allocations.items():
+                breakup.paid_amount += paid
+            StudentFeeBreakup.objects.bulk_update(list(allocations), ['paid_amount'])
+            PaymentAllocation.objects.bulk_create([
+                PaymentAllocation(receipt=receipt, fee_breakup=breakup, amount=paid)
+                for breakup, paid in allocations.items()
+            ])
 
-            # 2. Get Unpaid Breakups
-            breakups = list(invoice.breakups.filter(paid_amount__lt=models.F('amount')))
-            
-            if not breakups:
-                # Surplus payment? Just update invoice for now.
-                invoice.paid_amount += amount
-                invoice.save()
-                return receipt
-
-            # 3. Distribution Logic
-            remaining_payment = Decimal(amount)
-            
-            # --- CUSTOM ALLOCATION PATH ---
-            if custom_allocations:
-                # custom_allocations = [{'head_id': 1, 'amount': 200}, ...] or {1: 200}
-                # Let's assume frontend sends {head_id: amount} dict or list of objects
-                 
-                # Normalize input to check balance
-                allocation_map = {} # head_id -> amount
-                if isinstance(custom_allocations, list):
-                     for item in custom_allocations:
-                         allocation_map[int(item['head_id'])] = Decimal(str(item['amount']))
-                elif isinstance(custom_allocations, dict):
-                     for k, v in custom_allocations.items():
-                         allocation_map[int(k)] = Decimal(str(v))
-                
-                # Check Total Matches
-                alloc_total = sum(allocation_map.values())
-                if abs(alloc_total - remaining_payment) > Decimal('0.05'): # allow small float variance
-                     # Force match if close? Or error?
-                     # Let's error to be safe
-                     raise ValueError(f"allocation sum {alloc_total} does not match payment amount {remaining_payment}")
-
-                for breakup in breakups:
-                    alloc_amount = allocation_map.get(breakup.head.id, Decimal('0'))
-                    
-                    if alloc_amount > 0:
-                        # Validate Cap
-                        balance = breakup.amount - breakup.paid_amount
-                        if alloc_amount > balance + Decimal('0.05'): # tolerance
-                            raise ValueError(f"Allocation {alloc_amount} exceeds balance {balance} for {breakup.head.name}")
-                        
-                        # Apply
-                        to_pay = min(alloc_amount, balance) # Clamp to be safe
-                        breakup.paid_amount += to_pay
-                        breakup.save()
-
-                        PaymentAllocation.objects.create(
-                            receipt=receipt,
-                            fee_breakup=breakup,
-                            amount=to_pay
-                        )
-                        remaining_payment -= to_pay
-                        
-            # --- AUTO DISTRIBUTION PATH ---
-            else:
-                # Loop until payment is exhausted or all heads paid
-                while remaining_payment > 0 and breakups:
-                    count = len(breakups)
-                    share = remaining_payment / count
-                    
-                    # Check for small decimal issues, round down to 2 places
-                    share = round(share, 2)
-                    
-                    # If share is 0 (due to very small remaining), dump all into first
-                    if share == 0:
-                        share = remaining_payment
-
-                    # Track which ones are fully paid in this iteration
-                    fully_paid_indices = []
-
-                    for i, breakup in enumerate(breakups):
-                        if remaining_payment <= 0:
-                            break
-
-                        balance = breakup.amount - breakup.paid_amount
-                        
-                        # Determine exact allocation for this head
-                        to_pay = min(balance, share)
-                        
-                        # Cap by remaining payment (crucial regarding rounding)
-                        to_pay = min(to_pay, remaining_payment)
-
-                        # Update Breakup
-                        breakup.paid_amount += to_pay
-                        breakup.save()
-
-                        # Create Allocation Record
-                        PaymentAllocation.objects.create(
-                            receipt=receipt,
-                            fee_breakup=breakup,
-                            amount=to_pay
-                        )
-
-                        remaining_payment -= to_pay
-                        
-                        if breakup.amount - breakup.paid_amount <= 0:
-                            fully_paid_indices.append(i)
-
-                    # Remove fully paid from list for next iteration/redistribution
-                    for index in sorted(fully_paid_indices, reverse=True):
-                        breakups.pop(index)
-
-            # 4. Update Invoice Total Paid
-            # Re-sum from allocations to be 100% accurate
-            total_paid = sum(b.paid_amount for b in invoice.breakups.all())
-            invoice.paid_amount = total_paid
-            invoice.save()
-            
-            # Update Invoice Status
-            if invoice.balance_due <= 0:
-                 invoice.status = 'PAID'
-            elif invoice.paid_amount > 0:
-                 invoice.status = 'PARTIAL'
-            invoice.save()
-
-            return receipt
+            # 4. Update Invoice once (save() derives the status; the ledger
+            #    follows through its post_save hook). The whole receipt counts:
+            #    what the open heads could not take (round-off paise, or a
+            #    payment on fully paid heads) stays on the invoice
+            locked.paid_amount += amount
+            locked.save(update_fields=['paid_amount', 'status'])
+            if mode == ledger.WAIVER_MODE:
+                ledger.record_waiver(locked, amount)
+
+            # 5. Installments: the receipt goes to the oldest due first
+            split = allocation.allocate([
+                allocation.Line(i.pk, i.amount - i.paid_amount, due_date=i.due_date)
+                for i in installments
+            ], amount, allocation.OLDEST_DUE_FIRST)
+            today = date.today()
+            for installment in installments:
+                installment.paid_amount += split.get(installment.pk, 0)
+                if installment.paid_amount >= installment.amount:
+                    installment.status = 'PAID'
+                    installment.paid_date = installment.paid_date or today
+            FeeInstallment.objects.bulk_update(
+                [i for i in installments if i.pk in split], ['paid_amount', 'status', 'paid_date']
+            )
+
+        invoice.paid_amount = locked.paid_amount
+        invoice.status = locked.status
+        receipt.invoice = invoice
+        return receipt
 
     @staticmethod
-    def generate_annual_fees(academic_year, school, options=None):
+    def generate_annual_fees(academic_year, school, options=None, progress=None):
         """
         Generates Invoices and Breakups for all active students in the academic year.
         Compatible with new schema: Looks up FeeStructure (Class+Section first, then Class only).
+
+        Set-based: the year's compiled fee matrix is read once
+        (finance.fee_matrix, cached per school and year), students that already have an invoice are
+        skipped with one anti-join, and invoices/breakups are written with
+        chunked bulk_create() using pre-allocated invoice IDs.
+        Student discounts valid on the due date are loaded once too and
+        applied in memory (finance.discounts), unless
+        options['auto_apply_discounts'] is false.
+        `progress(done, total, message)` is called after every chunk (jobs).
         """
         from students.models import Student
-        
+
         options = options or {}
-        students = Student.objects.filter(school=school, is_active=True)
-        
+        chunk_size = int(options.get('chunk_size') or GENERATION_CHUNK_SIZE)
+        started = time.monotonic()
+
+        matrix = fee_matrix.get_matrix(school, academic_year)
+        already_invoiced = Invoice.objects.filter(student=models.OuterRef('pk'), academic_year=academic_year)
+        students = list(
+            Student.objects.for_school(school)
+            .filter(is_active=True)
+            .exclude(models.Exists(already_invoiced))
+            .order_by('id')
+            .values_list('id', 'current_class_id', 'section_id', 'enrollment_number')
+        )
+
+        due_date = date(academic_year.start_date.year, 6, 15)  # Default to June, improve logic later
+        index = {}
+        if options.get('auto_apply_discounts', True):
+            index = discounts.load_index(school, academic_year, on_date=due_date)
+
+        pending = []
+        skipped = 0
+        discounted = 0
+        for student_pk, class_pk, section_pk, enrollment_number in students:
+            shared = fee_matrix.lookup(matrix, class_pk, section_pk)
+            if shared is None:
+                skipped += 1  # No fees defined for this student type
+                continue
+            template = shared
+            if index:
+                template = discounts.apply(shared, index.for_student(student_pk))
+                discounted += template is not shared
+            pending.append((student_pk, enrollment_number, template))
+
         generated_count = 0
         errors = []
-
-        for student in students:
+        for offset in range(0, len(pending), chunk_size):
+            chunk = pending[offset:offset + chunk_size]
             try:
-                # Check if invoice already exists for this year
-                if Invoice.objects.filter(student=student, academic_year=academic_year).exists():
-                    continue
-
-                with transaction.atomic():
-                    # Fetch Structures for Class + Section
-                    structures = FeeStructure.objects.filter(
-                        school=school,
-                        academic_year=academic_year,
-                        class_assigned=student.current_class,
-                        section=student.section
-                    )
-                    
-                    # Also fetch Class-wide structures (where section is NULL)
-                    class_structures = FeeStructure.objects.filter(
-                        school=school,
-                        academic_year=academic_year,
-                        class_assigned=student.current_class,
-                        section__isnull=True
-                    )
-                    
-                    # Combine (careful not to duplicate categories if overrides exist)
-                    # Priority: Section Specific > Class General
-                    final_structures = {}
-                    
-                    # Load generic first
-                    for s in class_structures:
-                        final_structures[s.category_id] = s
-                        
-                    # Overwrite with specific
-                    for s in structures:
-                        final_structures[s.category_id] = s
-                    
-                    if not final_structures:
-                        continue # No fees defined for this student type
-
-                    # Calculate Totals & GST
-                    gross_total = Decimal('0.00')
-                    breakup_data = []
-
-                    for struct in final_structures.values():
-                        rate = struct.category.gst_rate
-                        inclusive = struct.category.is_tax_inclusive
-                        amount = struct.amount # This is the structure amount
-
-                        if inclusive:
-                            # Formula: Base = Amount / (1 + Rate/100)
-                            base = amount / (1 + (rate / Decimal('100.00')))
-                            tax = amount - base
-                            total_head = amount
-                        else:
-                            # Formula: Tax = Amount * (Rate/100)
-                            base = amount
-                            tax = base * (rate / Decimal('100.00'))
-                            total_head = base + tax
-                        
-                        # Round to 2 decimal places for storage
-                        base = base.quantize(Decimal('0.01'))
-                        tax = tax.quantize(Decimal('0.01'))
-                        total_head = total_head.quantize(Decimal('0.01'))
-
-                        gross_total += total_head
-                        
-                        breakup_data.append({
-                            'head': struct.category,
-                            'amount': total_head,
-                            'base_amount': base,
-                            'tax_amount': tax
-                        })
-
-                    # Total Round Off Logic (Round to nearest Integer)
-                    from decimal import ROUND_HALF_UP
-                    final_total = gross_total.quantize(Decimal('1.'), rounding=ROUND_HALF_UP)
-                    round_off_amount = final_total - gross_total
-
-                    invoice = Invoice.objects.create(
-                        school=school,
-                        student=student,
-                        academic_year=academic_year,
-                        total_amount=final_total,
-                        round_off_amount=round_off_amount,
-                        due_date=date(academic_year.start_date.year, 6, 15) # Default to June, improve logic later
-                    )
-                    
-                    # Create Breakups (The Snapshot)
-                    breakups = []
-                    for data in breakup_data:
-                        breakups.append(StudentFeeBreakup(
-                            invoice=invoice,
-                            head=data['head'],
-                            amount=data['amount'],
-                            base_amount=data['base_amount'],
-                            tax_amount=data['tax_amount'],
-                            paid_amount=0
-                        ))
-                    StudentFeeBreakup.objects.bulk_create(breakups)
-                    
-                    generated_count += 1
-                    
+                generated_count += _create_invoices(school, academic_year, due_date, chunk)
             except Exception as e:
-                errors.append(f"Student {student.enrollment_number}: {str(e)}")
-        
+                first, last = chunk[0][1], chunk[-1][1]
+                errors.append(f"Students {first}..{last} ({len(chunk)}): {str(e)}")
+            if progress:
+                progress(offset + len(chunk), len(pending), 'Generating invoices')
+
+        elapsed = time.monotonic() - started
+        rate = round(generated_count / elapsed, 1) if elapsed > 0 else float(generated_count)
+        logger.info(
+            "Annual fees for school %s, year %s: %d invoices in %.2fs (%s students/s)",
+            school.pk, academic_year.pk, generated_count, elapsed, rate,
+        )
         return {
             'success': True,
             'generated': generated_count,
-            'errors': errors
+            'skipped': skipped,
+            'discounted': discounted,
+            'errors': errors,
+            'elapsed_seconds': round(elapsed, 3),
+            'students_per_second': rate,
         }
 
     @staticmethod
@@ -278,3 +290,21 @@ class FeeService:
     @staticmethod
     def handle_class_promotion(student, new_class, new_year):
         return {'success': True, 'message': 'Not implemented yet'}
+
+
+class PayrollService:
+    # Roles that get a monthly salary
+    PAYROLL_ROLES = payroll.PAYROLL_ROLES
+
+    @staticmethod
+    def generate_month(school, target_month, generated_by=None, progress=None):
+        """
+        Generate Payroll for a specific month.
+
+        Set-based (finance.payroll): staff and structures, existing
+        salaries and the month's attendance are read with one query each,
+        loss of pay is prorated from StaffAttendance, and the Salary rows
+        are written with bulk_create().
+        `progress(done, total, message)` is called after every chunk (jobs).
+        """
+        return payroll.generate(school, target_month, generated_by=generated_by, progress=progress)
@@ -0,0 +1,44 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import documents, fee_matrix, ledger
+
+
+def update_ledger_on_save(sender, instance, created, raw=False, **kwargs):
+    # Fixture loads (raw) are not posted; run rebuild_ledger afterwards
+    if raw:
+        return
+    ledger.record_save(instance, created)
+
+
+def update_ledger_on_delete(sender, instance, **kwargs):
+    ledger.record_delete(instance)
+
+
+def invalidate_fee_matrix(sender, instance, **kwargs):
+    # Now for this transaction, and again once committed so no other request
+    # caches the old structures in between
+    fee_matrix.invalidate(instance.school_id)
+    transaction.on_commit(lambda: fee_matrix.invalidate(instance.school_id))
+
+
+def invalidate_document(sender, instance, created=False, **kwargs):
+    # Payments and edits: the cached PDF of the row is dropped once committed
+    # (a new version would not be served anyway; this frees the disk)
+    if created:
+        return
+    kind, pk = sender._meta.model_name, instance.pk  # documents.INVOICE / RECEIPT
+    transaction.on_commit(lambda: documents.invalidate(kind, pk))
+
+
+def connect():
+    from .models import FeeCategory, FeeStructure, Invoice, Receipt
+
+    post_save.connect(update_ledger_on_save, sender=Invoice, dispatch_uid='ledger_save_invoice')
+    post_delete.connect(update_ledger_on_delete, sender=Invoice, dispatch_uid='ledger_delete_invoice')
+    for model in (FeeStructure, FeeCategory):
+        post_save.connect(invalidate_fee_matrix, sender=model, dispatch_uid=f'fee_matrix_save_{model.__name__}')
+        post_delete.connect(invalidate_fee_matrix, sender=model, dispatch_uid=f'fee_matrix_delete_{model.__name__}')
+    for model in (Invoice, Receipt):
+        post_save.connect(invalidate_document, sender=model, dispatch_uid=f'pdf_save_{model.__name__}')
+        post_delete.connect(invalidate_document, sender=model, dispatch_uid=f'pdf_delete_{model.__name__}')
@@ -2,8 +2,10 @@
 Tests for the Finance App (Invoices, Payments, Salary).
 """
 import pytest
+from datetime import date
 from decimal import Decimal
 from django.utils import timezone
+from hypothesis import given, strategies as st
 from rest_framework import status
 
 
@@ -165,3 +167,1168 @@ class TestSalaryModel:
         
         assert salary.net_salary == Decimal("30000.00")
         assert salary.is_paid == False
+
+
+@pytest.mark.django_db
+class TestBulkFeeGeneration:
+    """Tests for the set-based FeeService.generate_annual_fees."""
+
+    def _school(self, students=6):
+        from datetime import date
+        from schools.models import School, AcademicYear, Class, Section
+        from students.models import Student
+        from finance.models import FeeCategory, FeeStructure
+
+        school = School.objects.create(name="Fee School")
+        year = AcademicYear.objects.create(
+            school=school, name="2024-25", start_date=date(2024, 4, 1), end_date=date(2025, 3, 31), is_active=True
+        )
+        klass = Class.objects.create(school=school, name="Class 5", order=5)
+        section_a = Section.objects.create(school=school, parent_class=klass, name="A")
+        section_b = Section.objects.create(school=school, parent_class=klass, name="B")
+
+        tuition = FeeCategory.objects.create(school=school, name="Tuition")
+        lab = FeeCategory.objects.create(school=school, name="Lab", gst_rate=Decimal("18.00"))
+        books = FeeCategory.objects.create(
+            school=school, name="Books", gst_rate=Decimal("5.00"), is_tax_inclusive=True
+        )
+        common = dict(school=school, academic_year=year, class_assigned=klass)
+        FeeStructure.objects.create(category=tuition, amount=Decimal("10000.00"), **common)
+        FeeStructure.objects.create(category=lab, amount=Decimal("1000.50"), **common)
+        FeeStructure.objects.create(category=books, amount=Decimal("2100.00"), **common)
+        # Section B pays a different tuition
+        FeeStructure.objects.create(category=tuition, amount=Decimal("12000.00"), section=section_b, **common)
+
+        for number in range(students):
+            Student.objects.create(
+                school=school, first_name="Fee", last_name=str(number), enrollment_number=f"F{number:03d}",
+                date_of_birth="2014-01-01", gender="M", academic_year=year,
+                current_class=klass, section=section_a if number % 2 else section_b
+            )
+        return school, year
+
+    def test_totals_and_breakups(self):
+        from finance.models import Invoice, StudentFeeBreakup
+        from finance.services import FeeService
+
+        school, year = self._school()
+        result = FeeService.generate_annual_fees(year, school)
+
+        assert result["generated"] == 6
+        assert result["errors"] == []
+        assert result["students_per_second"] > 0
+
+        # Section A: 10000 + 1000.50 * 1.18 (1180.59) + 2100 (books, tax inside) = 13280.59 -> 13281
+        # Section B: 12000 + 1180.59 + 2100 = 15280.59 -> 15281
+        totals = sorted(Invoice.objects.filter(school=school).values_list("total_amount", flat=True))
+        assert totals == [Decimal("13281.00")] * 3 + [Decimal("15281.00")] * 3
+        invoice = Invoice.objects.filter(school=school).first()
+        assert invoice.status == "PENDING"
+        assert invoice.round_off_amount == Decimal("0.41")
+        assert invoice.invoice_id.startswith("INV-")
+
+        books = StudentFeeBreakup.objects.get(invoice=invoice, head__name="Books")
+        assert books.base_amount == Decimal("2000.00")
+        assert books.tax_amount == Decimal("100.00")
+        assert StudentFeeBreakup.objects.filter(invoice__school=school).count() == 18
+
+    def test_skips_invoiced_students_and_is_idempotent(self):
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        school, year = self._school(students=4)
+        FeeService.generate_annual_fees(year, school, {"chunk_size": 3})
+        result = FeeService.generate_annual_fees(year, school)
+
+        assert result["generated"] == 0
+        assert Invoice.objects.filter(school=school).count() == 4
+
+    def test_discounts_applied_from_index(self, django_assert_max_num_queries):
+        from datetime import date
+        from finance.models import FeeCategory, FeeDiscount, Invoice, StudentFeeBreakup
+        from finance.services import FeeService
+        from students.models import Student
+
+        school, year = self._school(students=4)
+        students = {s.enrollment_number: s for s in Student.objects.filter(school=school)}
+        common = dict(school=school, academic_year=year, valid_from=date(2024, 4, 1), valid_until=date(2025, 3, 31))
+        FeeDiscount.objects.create(
+            student=students["F000"], category=FeeCategory.objects.get(school=school, name="Tuition"),
+            discount_type="PERCENTAGE", discount_value=Decimal("50"), reason="Merit", **common
+        )
+        FeeDiscount.objects.create(
+            student=students["F001"], discount_type="FIXED", discount_value=Decimal("1000"), reason="Sibling", **common
+        )
+        FeeDiscount.objects.create(  # Expired before the due date
+            student=students["F002"], discount_type="FIXED", discount_value=Decimal("500"), reason="Old",
+            **{**common, "valid_until": date(2024, 5, 31)}
+        )
+
+        # Same queries as without discounts: the index is loaded either way
+        with django_assert_max_num_queries(26):
+            result = FeeService.generate_annual_fees(year, school)
+        assert (result["generated"], result["discounted"]) == (4, 2)
+
+        totals = dict(Invoice.objects.filter(school=school).values_list("student__enrollment_number", "total_amount"))
+        # Section B: 12000 tuition halved; section A: 1000 off 13280.59, pro rata over the heads
+        assert totals == {
+            "F000": Decimal("9281.00"), "F001": Decimal("12281.00"),
+            "F002": Decimal("15281.00"), "F003": Decimal("13281.00"),
+        }
+        tuition = StudentFeeBreakup.objects.get(invoice__student=students["F000"], head__name="Tuition")
+        assert (tuition.amount, tuition.discount_amount) == (Decimal("6000.00"), Decimal("6000.00"))
+        assert tuition.discount_details[0]["reason"] == "Merit"
+        sibling = StudentFeeBreakup.objects.filter(invoice__student=students["F001"])
+        assert sum(row.discount_amount for row in sibling) == Decimal("1000.00")
+        books = sibling.get(head__name="Books")
+        assert books.base_amount + books.tax_amount == books.amount
+        assert not StudentFeeBreakup.objects.filter(invoice__student=students["F002"], discount_amount__gt=0).exists()
+
+    def test_fee_matrix_is_cached_until_structures_change(self, django_assert_num_queries):
+        from finance import fee_matrix
+        from finance.models import FeeStructure
+        from schools.models import Section
+
+        school, year = self._school(students=0)
+        section_a, section_b = Section.objects.filter(school=school).order_by("name")
+        klass = section_a.parent_class
+
+        assert fee_matrix.resolve(school, year, klass.pk, section_b.pk)["total_amount"] == Decimal("15281.00")
+        # Sections without overrides get the class fees; all from the cache now
+        with django_assert_num_queries(0):
+            template = fee_matrix.resolve(school, year, klass, section_a)
+            assert fee_matrix.resolve(school, year, klass.pk)["total_amount"] == Decimal("13281.00")
+        assert template["total_amount"] == Decimal("13281.00")
+        assert {row["head_name"]: row["tax_amount"] for row in template["breakups"]} == {
+            "Tuition": Decimal("0.00"), "Lab": Decimal("180.09"), "Books": Decimal("100.00")
+        }
+
+        FeeStructure.objects.filter(section=section_b).get().delete()
+        assert fee_matrix.resolve(school, year, klass.pk, section_b.pk)["total_amount"] == Decimal("13281.00")
+
+    def test_resolve_endpoint(self, authenticated_client):
+        from schools.models import Section
+
+        school, year = self._school(students=0)
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        section_b = Section.objects.get(school=school, name="B")
+
+        response = authenticated_client.get(
+            f"/api/finance/structure/resolve/?class_id={section_b.parent_class_id}&section_id={section_b.pk}"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["academic_year"] == year.pk
+        assert response.data["total_amount"] == Decimal("15281.00")
+        tuition = next(row for row in response.data["heads"] if row["head_name"] == "Tuition")
+        assert tuition["structure_amount"] == Decimal("12000.00")
+
+    def test_other_schools_years_are_not_found(self, authenticated_client):
+        from core import jobs
+        from core.models import Job
+        from finance.models import Invoice
+
+        school, year = self._school(students=2)
+        response = authenticated_client.post(
+            "/api/finance/settlement/generate/", {"academic_year_id": year.pk}, format="json"
+        )
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+        # A job naming another school's year fails instead of invoicing its students
+        job = jobs.enqueue(
+            "finance.generate_annual_fees", {"academic_year_id": year.pk}, school=authenticated_client.school
+        )
+        assert jobs.work() == 1
+        job.refresh_from_db()
+        assert job.status == Job.STATUS_FAILED
+        assert not Invoice.objects.filter(school=school).exists()
+
+    def test_query_count_does_not_grow_with_students(self, django_assert_max_num_queries):
+        from finance.services import FeeService
+
+        school, year = self._school(students=40)
+        # Matrix + anti-join + discounts + ID lease + 2 inserts + counters + ledger + rollups, plus savepoints
+        with django_assert_max_num_queries(26):
+            result = FeeService.generate_annual_fees(year, school)
+        assert result["generated"] == 40
+
+
+def _invoice_with_heads(name="Pay School", heads=(("Tuition", "6000.00"), ("Lab", "1000.00"), ("Sports", "500.00")),
+                        school=None):
+    from datetime import date
+    from schools.models import School, AcademicYear
+    from students.models import Student
+    from finance.models import FeeCategory, Invoice, StudentFeeBreakup
+
+    school = school or School.objects.create(name=name)
+    year = AcademicYear.objects.create(
+        school=school, name="2024-25", start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+    )
+    student = Student.objects.create(
+        school=school, first_name="Pay", last_name="Kid", enrollment_number="P001",
+        date_of_birth=date(2014, 1, 1), gender="M", academic_year=year
+    )
+    total = sum(Decimal(amount) for _, amount in heads)
+    invoice = Invoice.objects.create(
+        school=school, student=student, academic_year=year, total_amount=total, due_date=date(2024, 6, 15)
+    )
+    for head, amount in heads:
+        StudentFeeBreakup.objects.create(
+            invoice=invoice, head=FeeCategory.objects.create(school=school, name=head),
+            amount=Decimal(amount), base_amount=Decimal(amount)
+        )
+    return invoice
+
+
+def _assert_reconciles(invoice):
+    from django.db.models import Sum
+    from finance.models import PaymentAllocation, Receipt, StudentFeeBreakup
+
+    invoice.refresh_from_db()
+    receipts = Receipt.objects.filter(invoice=invoice).aggregate(total=Sum("amount"))["total"]
+    breakups = StudentFeeBreakup.objects.filter(invoice=invoice).aggregate(total=Sum("paid_amount"))["total"]
+    allocated = PaymentAllocation.objects.filter(receipt__invoice=invoice).aggregate(total=Sum("amount"))["total"]
+    assert invoice.paid_amount == receipts == breakups == allocated
+    return invoice
+
+
+@pytest.mark.django_db
+class TestPaymentPosting:
+    """Tests for FeeService.process_payment."""
+
+    def test_equal_split_spills_over(self):
+        from finance.models import StudentFeeBreakup
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        FeeService.process_payment(invoice, Decimal("2400.00"), "CASH", None)
+
+        # 800 each, Sports only takes 500 and its 300 is shared by the other two
+        paid = dict(StudentFeeBreakup.objects.filter(invoice=invoice).values_list("head__name", "paid_amount"))
+        assert paid == {"Tuition": Decimal("950.00"), "Lab": Decimal("950.00"), "Sports": Decimal("500.00")}
+        assert invoice.paid_amount == Decimal("2400.00")
+        assert invoice.status == "PARTIAL"
+        assert _assert_reconciles(invoice).status == "PARTIAL"
+
+    def test_custom_allocation_is_validated(self):
+        from finance.models import Receipt
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        lab = invoice.breakups.get(head__name="Lab")
+        with pytest.raises(ValueError):
+            FeeService.process_payment(invoice, Decimal("100.00"), "CASH", None, custom_allocations={lab.head_id: "90"})
+        with pytest.raises(ValueError):
+            FeeService.process_payment(invoice, Decimal("1500.00"), "CASH", None, custom_allocations={lab.head_id: "1500"})
+        assert not Receipt.objects.filter(invoice=invoice).exists()
+
+        FeeService.process_payment(invoice, Decimal("1000.00"), "UPI", None, custom_allocations=[{"head_id": lab.head_id, "amount": 1000}])
+        lab.refresh_from_db()
+        assert lab.paid_amount == Decimal("1000.00")
+        _assert_reconciles(invoice)
+
+    def test_payment_beyond_open_heads_is_kept(self):
+        from django.db.models import Sum
+        from finance.models import Receipt, StudentLedger
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        FeeService.process_payment(invoice, Decimal("7500.00"), "CASH", None)
+        FeeService.process_payment(invoice, Decimal("300.00"), "CASH", None)  # Every head already paid
+
+        invoice.refresh_from_db()
+        assert invoice.paid_amount == Receipt.objects.filter(invoice=invoice).aggregate(total=Sum("amount"))["total"]
+        assert invoice.paid_amount == Decimal("7800.00")
+        assert StudentLedger.objects.get(student=invoice.student).paid == Decimal("7800.00")
+
+    def test_stale_invoice_does_not_lose_payments(self):
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        first, second = Invoice.objects.get(pk=invoice.pk), Invoice.objects.get(pk=invoice.pk)
+        FeeService.process_payment(first, Decimal("5000.00"), "CASH", None)
+        FeeService.process_payment(second, Decimal("2500.00"), "CASH", None)  # Still shows paid_amount 0
+
+        assert _assert_reconciles(invoice).paid_amount == Decimal("7500.00")
+        assert invoice.status == "PAID"
+
+    def test_writes_are_batched(self, django_assert_max_num_queries):
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads(heads=[(f"Head {n}", "100.00") for n in range(12)])
+        FeeService.process_payment(invoice, Decimal("60.00"), "CASH", None)  # Leases the receipt ID block
+        # Strategy + savepoint + 3 locks + receipt + bulk update + bulk insert + invoice
+        # + counters + ledger + collection rollup, however many heads
+        with django_assert_max_num_queries(12):
+            FeeService.process_payment(invoice, Decimal("600.00"), "CASH", None)
+        _assert_reconciles(invoice)
+
+    def test_school_strategy_and_installments(self):
+        from datetime import date
+        from finance.models import FeeInstallment, StudentFeeBreakup
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        invoice.school.fee_allocation_strategy = "TUITION_FIRST"
+        invoice.school.save()
+        first = FeeInstallment.objects.create(
+            school=invoice.school, invoice=invoice, installment_number=1,
+            amount=Decimal("4000.00"), due_date=date(2024, 6, 15)
+        )
+        second = FeeInstallment.objects.create(
+            school=invoice.school, invoice=invoice, installment_number=2,
+            amount=Decimal("3500.00"), due_date=date(2024, 10, 15)
+        )
+        FeeService.process_payment(invoice, Decimal("6500.00"), "CASH", None)
+
+        paid = dict(StudentFeeBreakup.objects.filter(invoice=invoice).values_list("head__name", "paid_amount"))
+        assert paid == {"Tuition": Decimal("6000.00"), "Lab": Decimal("500.00"), "Sports": Decimal("0.00")}
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (first.paid_amount, first.status) == (Decimal("4000.00"), "PAID")
+        assert first.paid_date is not None
+        assert (second.paid_amount, second.status) == (Decimal("2500.00"), "PENDING")
+        _assert_reconciles(invoice)
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentPayments:
+    """Parallel payments against one invoice must all be posted."""
+
+    def test_parallel_payments_reconcile(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from django.db import connection
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        if connection.vendor != "postgresql":
+            pytest.skip("Needs row locks and concurrent connections (PostgreSQL)")
+
+        invoice = _invoice_with_heads(name="Busy School")
+        payments = [Decimal("75.00")] * 40
+
+        def pay(amount):
+            try:
+                # Every cashier starts from their own (soon stale) copy
+                FeeService.process_payment(Invoice.objects.get(pk=invoice.pk), amount, "CASH", None)
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(pay, payments))
+
+        assert _assert_reconciles(invoice).paid_amount == sum(payments)
+        assert invoice.receipts.count() == len(payments)
+
+
+@pytest.mark.django_db
+class TestStudentLedger:
+    """Tests for the per-student fee ledger (finance.ledger)."""
+
+    def _ledger(self, invoice):
+        from finance.models import StudentLedger
+        return StudentLedger.objects.get(student=invoice.student, academic_year=invoice.academic_year)
+
+    def test_follows_invoices_payments_and_waivers(self):
+        from finance import ledger
+        from finance.services import FeeService
+
+        invoice = _invoice_with_heads()
+        entry = self._ledger(invoice)
+        assert (entry.invoiced, entry.paid, entry.balance) == (Decimal("7500.00"), Decimal("0.00"), Decimal("7500.00"))
+
+        FeeService.process_payment(invoice, Decimal("5000.00"), "CASH", None)
+        FeeService.process_payment(invoice, Decimal("500.00"), "WAIVER", None)
+        entry = self._ledger(invoice)
+        assert (entry.paid, entry.waived, entry.balance) == (
+            Decimal("5000.00"), Decimal("500.00"), Decimal("2000.00")
+        )
+        assert ledger.rebuild(invoice.school_id) == {}
+
+    def test_settle_view_posts_one_waiver(self, authenticated_client):
+        from finance.models import Receipt
+
+        invoice = _invoice_with_heads(school=authenticated_client.school)
+
+        response = authenticated_client.post(
+            f"/api/finance/invoices/{invoice.pk}/settle/", {"settlement_note": "Hardship", "waive_amount": 1500},
+            format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert Receipt.objects.filter(invoice=invoice, mode="WAIVER").count() == 1
+        assert self._ledger(invoice).waived == Decimal("1500.00")
+
+    def test_rebuild_corrects_drift(self):
+        from django.core.management import call_command
+        from finance import ledger
+        from finance.models import StudentLedger
+
+        invoice = _invoice_with_heads()
+        StudentLedger.objects.filter(student=invoice.student).update(balance=Decimal("1.00"))
+
+        call_command("rebuild_ledger", "--dry-run")
+        assert self._ledger(invoice).balance == Decimal("1.00")
+
+        drift = ledger.rebuild(invoice.school_id)
+        assert drift == {(invoice.student_id, invoice.academic_year_id): (Decimal("1.00"), Decimal("7500.00"))}
+        assert self._ledger(invoice).balance == Decimal("7500.00")
+
+    def test_bulk_generation_posts_ledger(self):
+        from finance.models import StudentLedger
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=4)
+        FeeService.generate_annual_fees(year, school)
+        balances = sorted(StudentLedger.objects.filter(school=school).values_list("balance", flat=True))
+        assert balances == [Decimal("13281.00")] * 2 + [Decimal("15281.00")] * 2
+
+    def test_pending_screen_reads_ledger(self, authenticated_client):
+        _invoice_with_heads(school=authenticated_client.school)
+
+        response = authenticated_client.get("/api/finance/students-pending/?min_pending=100")
+        assert response.status_code == status.HTTP_200_OK
+        assert [row["pending_amount"] for row in response.data["students"]] == [7500.0]
+        assert response.data["summary"]["total_pending"] == 7500.0
+
+    def test_pending_screen_sums_each_students_years(self, authenticated_client):
+        from datetime import date
+        from schools.models import AcademicYear
+        from finance.models import Invoice
+
+        invoice = _invoice_with_heads(school=authenticated_client.school)
+        next_year = AcademicYear.objects.create(
+            school=invoice.school, name="2025-26", start_date=date(2025, 4, 1), end_date=date(2026, 3, 31)
+        )
+        Invoice.objects.create(
+            school=invoice.school, student=invoice.student, academic_year=next_year,
+            total_amount=Decimal("4000.00"), due_date=date(2025, 6, 15),
+        )
+
+        # 7500 + 4000 for one student: one row, and it clears min_pending on the sum
+        response = authenticated_client.get("/api/finance/students-pending/?min_pending=10000")
+        assert [(row["id"], row["pending_amount"]) for row in response.data["students"]] == [
+            (invoice.student_id, 11500.0)
+        ]
+        assert response.data["summary"] == {"students_with_pending": 1, "total_pending": 11500.0}
+
+
+
+@pytest.mark.django_db
+class TestOverdueSweep:
+    """Tests for the overdue sweeper (finance.overdue)."""
+
+    def _installments(self, invoice):
+        from datetime import date
+        from finance.models import FeeInstallment
+
+        return [
+            FeeInstallment.objects.create(
+                school=invoice.school, invoice=invoice, installment_number=number,
+                amount=Decimal("3750.00"), due_date=due_date,
+            )
+            for number, due_date in ((1, date(2024, 6, 15)), (2, date(2024, 12, 15)))
+        ]
+
+    def test_marks_past_due_and_stays_until_paid(self):
+        from datetime import date
+        from finance import overdue
+        from finance.models import Invoice
+        from finance.services import FeeService
+        from reports import counters
+
+        invoice = _invoice_with_heads()
+        first, second = self._installments(invoice)
+        paid = _invoice_with_heads(name="Paid School")
+        FeeService.process_payment(paid, Decimal("7500.00"), "CASH", None)
+        pending_before = counters.snapshot(invoice.school_id)["pending_amount"]
+
+        totals = overdue.sweep(today=date(2024, 9, 1))
+        assert (totals["invoices"], totals["installments"]) == (1, 1)
+        assert totals["by_school"] == {invoice.school_id: {"invoices": 1, "installments": 1}}
+        invoice.refresh_from_db()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        assert (invoice.status, first.status, second.status) == ("OVERDUE", "OVERDUE", "PENDING")
+        assert Invoice.objects.get(pk=paid.pk).status == "PAID"
+        # Still unpaid, so still pending on the dashboard
+        assert counters.snapshot(invoice.school_id)["pending_amount"] == pending_before
+
+        # A part payment keeps it overdue, clearing the balance ends it
+        FeeService.process_payment(invoice, Decimal("5000.00"), "CASH", None)
+        invoice.refresh_from_db()
+        assert invoice.status == "OVERDUE"
+        assert overdue.sweep(today=date(2024, 9, 1))["invoices"] == 0
+        FeeService.process_payment(invoice, Decimal("2500.00"), "CASH", None)
+        invoice.refresh_from_db()
+        assert invoice.status == "PAID"
+        assert counters.reconcile(invoice.school_id) == {}
+
+    def test_command_dry_run_and_query_count(self, django_assert_max_num_queries):
+        from datetime import date
+        from django.core.management import call_command
+        from core.models import Job
+        from finance import overdue
+        from finance.models import FeeInstallment, Invoice
+
+        invoice = _invoice_with_heads()
+        self._installments(invoice)
+
+        call_command("mark_overdue", "--dry-run")
+        invoice.refresh_from_db()
+        assert invoice.status == "PENDING"
+
+        # A real run is recorded as a job, with its counts
+        call_command("mark_overdue")
+        job = Job.objects.get(name="finance.mark_overdue")
+        assert job.status == Job.STATUS_SUCCEEDED
+        assert job.result["invoices"] == 1
+        assert job.result["by_school"] == {str(invoice.school_id): {"invoices": 1, "installments": 2}}
+        Invoice.objects.filter(pk=invoice.pk).update(status="PENDING")
+        FeeInstallment.objects.filter(invoice=invoice).update(status="PENDING")
+
+        # Two UPDATEs (plus savepoint) per school, however many rows
+        with django_assert_max_num_queries(4):
+            counts = overdue.sweep_school(invoice.school_id, today=date(2025, 1, 1))
+        assert counts == {"invoices": 1, "installments": 2}
+
+
+
+
+@pytest.mark.django_db
+class TestPendingReceivables:
+    """Tests for the receivables endpoint (finance.receivables)."""
+
+    def _client(self, authenticated_client, students=6):
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=students)
+        FeeService.generate_annual_fees(year, school)
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        invoice = Invoice.objects.filter(school=school).order_by("id").first()
+        FeeService.process_payment(invoice, Decimal("5000.00"), "CASH", None)
+        return school
+
+    def test_streams_all_invoices_with_one_summary_query(self, authenticated_client, django_assert_max_num_queries):
+        import json
+
+        self._client(authenticated_client, students=6)
+        # Auth (3) + summary aggregate + one chunked read of the invoices
+        with django_assert_max_num_queries(5):
+            response = authenticated_client.get("/api/finance/receivables/")
+            data = json.loads(b"".join(response.streaming_content))
+        assert response.status_code == status.HTTP_200_OK
+
+        assert data["summary"]["total_invoices"] == 6
+        assert data["summary"]["total_pending"] == 3 * 13281.0 + 3 * 15281.0 - 5000.0
+        assert data["summary"]["by_status"] == {"PENDING": 5, "PARTIAL": 1, "OVERDUE": 0}
+        assert data["summary"]["overdue_invoices"] == 6  # Due 2024-06-15, not swept yet
+        assert len(data["invoices"]) == 6
+        assert {row["is_overdue"] for row in data["invoices"]} == {True}
+        assert "breakups" not in data["invoices"][0]
+
+    def test_cursor_pages(self, authenticated_client):
+        self._client(authenticated_client, students=5)
+
+        first = authenticated_client.get("/api/finance/receivables/?pagination=cursor&page_size=3").data
+        assert len(first["results"]) == 3
+        assert first["summary"]["total_invoices"] == 5
+        second = authenticated_client.get(first["next"]).data
+        assert len(second["results"]) == 2
+        assert "summary" not in second
+        ids = [row["id"] for row in first["results"] + second["results"]]
+        assert ids == sorted(ids)
+
+    def test_group_by_buckets(self, authenticated_client):
+        self._client(authenticated_client, students=4)
+
+        data = authenticated_client.get("/api/finance/receivables/?group_by=section").data
+        assert [(row["section_name"], row["invoices"], row["total_pending"]) for row in data["buckets"]] == [
+            ("A", 2, 2 * 13281.0), ("B", 2, 2 * 15281.0 - 5000.0)
+        ]
+
+        heads = authenticated_client.get("/api/finance/receivables/?group_by=head").data["buckets"]
+        assert {row["head_name"]: row["invoices"] for row in heads} == {"Tuition": 4, "Lab": 4, "Books": 4}
+        assert sum(row["total_paid"] for row in heads) == 5000.0
+
+        response = authenticated_client.get("/api/finance/receivables/?group_by=student")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestFeeCounter:
+    """Tests for the one-request fee counter (finance.counter)."""
+
+    def _client(self, authenticated_client):
+        from finance.services import FeeService
+        from students.models import Student
+
+        school, year = TestBulkFeeGeneration()._school(students=3)
+        FeeService.generate_annual_fees(year, school)
+        Student.objects.filter(school=school, enrollment_number="F000").update(
+            gr_number="GR-1001", emergency_mobile="+91 98765 43210"
+        )
+        # A sibling shares the mobile
+        Student.objects.filter(school=school, enrollment_number="F001").update(emergency_mobile="9876543210")
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        return Student.objects.get(school=school, enrollment_number="F000")
+
+    def test_lookup_suggests_allocation(self, authenticated_client, django_assert_max_num_queries):
+        student = self._client(authenticated_client)
+
+        # Auth (3) + student + open breakups
+        with django_assert_max_num_queries(5):
+            data = authenticated_client.get("/api/finance/counter/?q=gr-1001&amount=5000").data
+        assert data["student"]["id"] == student.id
+        assert data["total_pending"] == Decimal("15280.59")  # Section B, heads before round-off
+        assert [row["amount"] for row in data["suggested"]] == [Decimal("5000")]
+        breakups = data["invoices"][0]["breakups"]
+        assert [row["head_name"] for row in breakups] == ["Tuition", "Lab", "Books"]
+        assert sum(row["suggested"] for row in breakups) == Decimal("5000")
+
+        by_roll = authenticated_client.get("/api/finance/counter/?q=F000").data
+        assert by_roll["student"]["id"] == student.id
+        assert sum(row["amount"] for row in by_roll["suggested"]) == Decimal("15280.59")
+
+    def test_shared_mobile_lists_matches(self, authenticated_client):
+        self._client(authenticated_client)
+
+        data = authenticated_client.get("/api/finance/counter/?q=098765-43210").data
+        assert sorted(row["enrollment_number"] for row in data["matches"]) == ["F000", "F001"]
+        assert "invoices" not in data
+
+        response = authenticated_client.post(
+            "/api/finance/counter/", {"q": "9876543210", "amount": "100"}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert len(response.data["matches"]) == 2
+        assert authenticated_client.get("/api/finance/counter/?q=nobody").status_code == status.HTTP_404_NOT_FOUND
+
+    def test_collect_posts_in_a_bounded_number_of_queries(self, authenticated_client, django_assert_max_num_queries):
+        from finance.models import Invoice, Receipt
+
+        student = self._client(authenticated_client)
+        suggested = authenticated_client.get(f"/api/finance/counter/?student_id={student.id}&amount=5000").data
+
+        # Auth (3), student, open breakups, process_payment() for the one invoice
+        # (locks, receipt, split, ledger/counters/rollups; the school's first receipt
+        # also seeds its RCP sequence and the day's collection row), balances re-read
+        with django_assert_max_num_queries(30):
+            response = authenticated_client.post("/api/finance/counter/", {
+                "student_id": student.id, "amount": "5000", "mode": "UPI", "transaction_id": "UPI-77",
+            }, format="json")
+        assert response.status_code == status.HTTP_201_CREATED
+
+        receipt = Receipt.objects.get(invoice__student=student)
+        assert response.data["receipts"] == [{
+            "receipt_no": receipt.receipt_no,
+            "invoice_id": receipt.invoice_id,
+            "amount": Decimal("5000"),
+            "pdf_url": f"/api/finance/receipt/{receipt.receipt_no}/",
+        }]
+        assert receipt.mode == "UPI" and receipt.transaction_id == "UPI-77"
+        # What was suggested is what was posted
+        posted = {a.fee_breakup_id: a.amount for a in receipt.allocations.all()}
+        assert posted == {row["id"]: row["suggested"] for row in suggested["invoices"][0]["breakups"] if row["suggested"]}
+        assert response.data["total_pending"] == Decimal("10280.59")
+        assert response.data["invoices"][0]["status"] == "PARTIAL"
+        _assert_reconciles(Invoice.objects.get(pk=receipt.invoice_id))
+
+    def test_rejects_overpayment(self, authenticated_client):
+        from finance.models import Receipt
+
+        student = self._client(authenticated_client)
+        response = authenticated_client.post(
+            "/api/finance/counter/", {"student_id": student.id, "amount": "20000"}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert "exceeds" in response.data["error"]
+        assert not Receipt.objects.filter(invoice__student=student).exists()
+
+
+@pytest.mark.django_db
+class TestDocumentCache:
+    """Tests for cached invoice/receipt PDFs (finance.documents, core.pdf_cache)."""
+
+    @pytest.fixture(autouse=True)
+    def _media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        return tmp_path
+
+    def _client(self, authenticated_client):
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=1)
+        FeeService.generate_annual_fees(year, school)
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        return Invoice.objects.get(school=school)
+
+    def _count_renders(self, monkeypatch, name):
+        from finance import documents
+
+        calls = []
+        render = getattr(documents, name)
+        monkeypatch.setattr(documents, name, lambda context: calls.append(1) or render(context))
+        return calls
+
+    def test_receipt_is_rendered_once_and_revalidated_by_etag(self, authenticated_client, monkeypatch, _media):
+        from finance.services import FeeService
+
+        invoice = self._client(authenticated_client)
+        receipt = FeeService.process_payment(invoice, Decimal("2000.00"), "CASH", None)
+        renders = self._count_renders(monkeypatch, "render_receipt")
+        url = f"/api/finance/receipt/{receipt.receipt_no}/"
+
+        first = authenticated_client.get(url)
+        body = b"".join(first.streaming_content)
+        assert first.status_code == status.HTTP_200_OK
+        assert first["Content-Type"] == "application/pdf"
+        assert body.startswith(b"%PDF")
+        etag = first["ETag"]
+
+        again = authenticated_client.get(url)
+        assert b"".join(again.streaming_content) == body
+        assert again["ETag"] == etag
+        assert renders == [1]
+        assert len(list(_media.glob(f"pdf_cache/receipt/{receipt.pk}/*.pdf"))) == 1
+
+        not_modified = authenticated_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert renders == [1]
+
+    def test_payment_gives_the_invoice_a_new_version(
+        self, authenticated_client, monkeypatch, _media, django_capture_on_commit_callbacks
+    ):
+        from finance.services import FeeService
+
+        invoice = self._client(authenticated_client)
+        renders = self._count_renders(monkeypatch, "render_invoice")
+        url = f"/api/finance/invoice/{invoice.id}/pdf/"
+
+        first = authenticated_client.get(url)
+        assert first.status_code == status.HTTP_200_OK
+        b"".join(first.streaming_content)
+        assert len(list(_media.glob(f"pdf_cache/invoice/{invoice.pk}/*.pdf"))) == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            FeeService.process_payment(invoice, Decimal("2000.00"), "CASH", None)
+        # The saved invoice's files are dropped
+        assert not list(_media.glob(f"pdf_cache/invoice/{invoice.pk}/*.pdf"))
+
+        second = authenticated_client.get(url, HTTP_IF_NONE_MATCH=first["ETag"])
+        assert second.status_code == status.HTTP_200_OK
+        b"".join(second.streaming_content)
+        assert second["ETag"] != first["ETag"]
+        assert renders == [1, 1]
+
+    def test_repeat_downloads_serve_the_cached_file(self, authenticated_client, monkeypatch):
+        invoice = self._client(authenticated_client)
+        renders = self._count_renders(monkeypatch, "render_invoice")
+        url = f"/api/finance/invoice/{invoice.id}/pdf/"
+
+        bodies = [b"".join(authenticated_client.get(url).streaming_content) for _ in range(4)]
+        assert renders == [1]  # Rendered on the first download only
+        assert all(body == bodies[0] and body.startswith(b"%PDF") for body in bodies)
+
+
+@pytest.mark.django_db
+class TestDocumentExport:
+    """Tests for batch receipt/invoice export (finance.exports)."""
+
+    @pytest.fixture(autouse=True)
+    def _media(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.PDF_EXPORT_WORKERS = 2
+        return tmp_path
+
+    def _client(self, authenticated_client, students=3):
+        from finance.models import Invoice
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=students)
+        FeeService.generate_annual_fees(year, school)
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        receipts = [
+            FeeService.process_payment(invoice, Decimal("1000.00"), "CASH", None)
+            for invoice in Invoice.objects.filter(school=school).order_by("id")
+        ]
+        return school, receipts
+
+    def test_receipts_of_a_day_as_zip(self, authenticated_client):
+        import io
+        import zipfile
+
+        school, receipts = self._client(authenticated_client)
+        today = timezone.localdate().isoformat()
+        response = authenticated_client.get(f"/api/finance/exports/?type=receipts&date={today}")
+        assert response.status_code == status.HTTP_200_OK
+        assert response["Content-Type"] == "application/zip"
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        assert archive.namelist() == [f"Receipt_{receipt.receipt_no}.pdf" for receipt in receipts]
+        assert all(archive.read(name).startswith(b"%PDF") for name in archive.namelist())
+
+        empty = authenticated_client.get("/api/finance/exports/?type=receipts&date=2020-01-01")
+        assert empty.status_code == status.HTTP_404_NOT_FOUND
+        assert authenticated_client.get("/api/finance/exports/?type=salaries").status_code == 400
+
+    def test_invoices_of_a_class_as_one_pdf(self, authenticated_client):
+        import io
+        from pypdf import PdfReader
+        from finance.models import Invoice
+
+        school, _ = self._client(authenticated_client, students=4)
+        class_id = Invoice.objects.filter(school=school).values_list("student__current_class_id", flat=True)[0]
+        response = authenticated_client.get(f"/api/finance/exports/?type=invoices&class_id={class_id}&output=pdf")
+        assert response.status_code == status.HTTP_200_OK
+
+        merged = PdfReader(io.BytesIO(b"".join(response.streaming_content)))
+        assert len(merged.pages) == 4
+        text = "\n".join(page.extract_text() for page in merged.pages)
+        for invoice_id in Invoice.objects.filter(school=school).values_list("invoice_id", flat=True):
+            assert invoice_id in text
+
+    def test_streamed_outputs_are_bounded(self, monkeypatch, tmp_path):
+        import io
+        from pypdf import PdfReader, PdfWriter
+        from finance import exports
+
+        # Hand-made documents: the merge must keep every page and its content
+        files = []
+        for number in range(5):
+            writer = PdfWriter()
+            writer.add_blank_page(width=200 + number, height=300)
+            path = tmp_path / f"doc{number}.pdf"
+            writer.write(path)
+            files.append((path.name, path))
+
+        monkeypatch.setattr(exports, "STREAM_CHUNK", 64)
+        chunks = list(exports.pdf_stream(files))
+        merged = PdfReader(io.BytesIO(b"".join(chunks)))
+        assert [int(page.mediabox.width) for page in merged.pages] == [200, 201, 202, 203, 204]
+        # Nothing close to the whole output is ever held at once
+        assert max(len(chunk) for chunk in exports.zip_stream(files)) < sum(path.stat().st_size for _, path in files)
+
+    def test_large_batches_run_as_a_job(self, authenticated_client, django_user_model, monkeypatch):
+        import io
+        import zipfile
+        from django.contrib.auth.models import Permission
+        from core import jobs
+        from finance import exports
+
+        monkeypatch.setattr(exports, "INLINE_LIMIT", 2)
+        self._client(authenticated_client)
+        response = authenticated_client.get("/api/finance/exports/?type=receipts")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data["documents"] == 3
+
+        assert jobs.work() == 1
+        job = authenticated_client.get(response.data["status_url"]).data
+        assert job["status"] == "SUCCEEDED"
+        assert job["result"]["documents"] == 3
+
+        download = authenticated_client.get(job["result"]["download_url"])
+        assert download.status_code == status.HTTP_200_OK
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(download.streaming_content)))
+        assert len(archive.namelist()) == 3
+
+        # Only the user who started the export (or admin/finance roles) may download it
+        teacher = django_user_model.objects.create_user(
+            username="export-teacher", password=None, school=authenticated_client.user.school, role="TEACHER"
+        )
+        teacher.user_permissions.add(Permission.objects.get(codename="view_invoice"))
+        authenticated_client.force_authenticate(user=teacher)
+        assert authenticated_client.get(job["result"]["download_url"]).status_code == status.HTTP_404_NOT_FOUND
+
+    def test_export_needs_view_permission_on_the_type(self, authenticated_client, django_user_model):
+        from django.contrib.auth.models import Permission
+
+        school, _ = self._client(authenticated_client)
+        teacher = django_user_model.objects.create_user(
+            username="export-nonfinance", password=None, school=school, role="TEACHER"
+        )
+        authenticated_client.force_authenticate(user=teacher)
+        assert authenticated_client.get("/api/finance/exports/?type=receipts").status_code == 403
+        assert authenticated_client.get("/api/finance/exports/?type=invoices").status_code == 403
+
+        # Granting one model opens only that type
+        teacher.user_permissions.add(Permission.objects.get(codename="view_receipt"))
+        teacher = django_user_model.objects.get(pk=teacher.pk)
+        authenticated_client.force_authenticate(user=teacher)
+        assert authenticated_client.get("/api/finance/exports/?type=receipts").status_code == 200
+        assert authenticated_client.get("/api/finance/exports/?type=invoices").status_code == 403
+
+    def test_job_file_is_stored_in_chunks(self, monkeypatch):
+        from core import jobs
+        from finance import exports
+        from core.models import JobFileChunk
+
+        monkeypatch.setattr(jobs, "FILE_CHUNK_SIZE", 4)
+        job = jobs.enqueue("finance.export_documents", {})
+        assert jobs.store_file(job.pk, [b"%PDF", b"-1.4", b"\n"]) == 9
+        assert JobFileChunk.objects.filter(job=job).count() == 3
+        assert b"".join(jobs.read_file(job)) == b"%PDF-1.4\n"
+
+        # A retry replaces the file; expired exports are pruned
+        assert jobs.store_file(job.pk, [b"%PDF"]) == 4
+        assert b"".join(jobs.read_file(job)) == b"%PDF"
+        job.finished_at = timezone.now() - exports.EXPORT_RETENTION * 2
+        job.save(update_fields=["finished_at"])
+        exports._prune()
+        assert not jobs.has_file(job)
+
+
+@pytest.mark.django_db
+class TestPayrollEngine:
+    """Tests for the set-based payroll run (finance.payroll)."""
+
+    # June 2025: 30 days - 5 Sundays - 1 paid holiday = 24 working days
+    MONTH = date(2025, 6, 1)
+
+    def _school(self, django_user_model, staff=2, prefix="payroll"):
+        from schools.models import School
+        from finance.models import Holiday, StaffSalaryStructure
+
+        school = School.objects.create(name="Payroll School")
+        Holiday.objects.create(school=school, name="Founders Day", date=date(2025, 6, 10), is_paid=True)
+        members = []
+        for number in range(staff):
+            member = django_user_model.objects.create_user(
+                username=f"{prefix}{number}", password=None, role="TEACHER", school=school,
+                first_name="Staff", last_name=str(number),
+            )
+            StaffSalaryStructure.objects.create(
+                staff=member, basic_salary=Decimal("24000.00"), allowances={"HRA": 4800}, deductions={"PF": 1800},
+            )
+            members.append(member)
+        return school, members
+
+    def _attend(self, member, statuses):
+        from staff.models import StaffAttendance
+
+        working = [day for day in range(1, 31) if date(2025, 6, day).weekday() != 6 and day != 10]
+        for day, status_ in zip(working, statuses):
+            StaffAttendance.objects.create(school=member.school, staff=member, date=date(2025, 6, day), status=status_)
+
+    def test_loss_of_pay_is_prorated_from_attendance(self, django_user_model):
+        from finance.models import Salary
+        from finance.services import PayrollService
+
+        school, (absent_some, untracked) = self._school(django_user_model, staff=2)
+        self._attend(absent_some, ["PRESENT"] * 20 + ["HALF_DAY"] * 2 + ["LEAVE"] + ["ABSENT"])
+        django_user_model.objects.create_user(  # No salary structure
+            username="nostructure", password="pass12345", role="TEACHER", school=school
+        )
+
+        result = PayrollService.generate_month(school, self.MONTH)
+        assert result["generated"] == 2
+        assert result["skipped"] == 1
+        assert result["working_days"] == 24
+        assert result["loss_of_pay_staff"] == 1
+
+        # 20 + 2 x 0.5 + 1 leave = 22 of 24 days paid
+        salary = Salary.objects.get(staff=absent_some, month=self.MONTH)
+        assert salary.present_days == Decimal("22.0")
+        assert salary.loss_of_pay_days == Decimal("2.0")
+        assert salary.total_working_days == 24
+        assert salary.basic_salary == Decimal("22000.00")
+        assert salary.earnings == {"HRA": 4400.0}
+        assert salary.deductions == {"PF": 1800.0}
+        assert salary.net_salary == Decimal("24600.00")
+        assert salary.salary_id.startswith("PAY-")
+
+        # No attendance marked: the full month, as before attendance was integrated
+        full = Salary.objects.get(staff=untracked, month=self.MONTH)
+        assert full.loss_of_pay_days == 0
+        assert full.net_salary == Decimal("27000.00")
+
+        again = PayrollService.generate_month(school, self.MONTH)
+        assert again["generated"] == 0
+        assert again["skipped"] == 3
+
+    def test_whole_school_runs_in_constant_queries(self, django_user_model):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from finance import payroll
+
+        queries = []
+        for size in (3, 20):
+            school, members = self._school(django_user_model, staff=size, prefix=f"run{size}-")
+            for member in members[::4]:
+                self._attend(member, ["PRESENT"] * 23 + ["ABSENT"])
+            with CaptureQueriesContext(connection) as ctx:
+                result = payroll.generate(school, self.MONTH)
+            assert result["generated"] == size
+            queries.append(len(ctx.captured_queries))
+        assert queries[0] == queries[1]
+
+
+_QUARTERLY = [
+    {"percent": 40, "due_date": "2024-04-10"},
+    {"percent": 30, "due_date": "2024-08-10"},
+    {"percent": 30, "due_date": "2024-12-10"},
+]
+
+
+@pytest.mark.django_db
+class TestInstallmentPlans:
+    """Tests for bulk installment plans (finance.installments)."""
+
+    def test_preview_then_generate(self):
+        from finance import installments
+        from finance.models import FeeInstallment, Invoice
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=4)
+        FeeService.generate_annual_fees(year, school)
+        part_paid = Invoice.objects.filter(school=school, total_amount=Decimal("13281.00")).first()
+        FeeService.process_payment(part_paid, Decimal("6000.00"), "CASH", None)
+        plan = installments.parse_plan(_QUARTERLY)
+
+        preview = installments.preview(school, year, plan)
+        assert not FeeInstallment.objects.exists()
+        assert (preview["invoices"], preview["installments"]) == (4, 12)
+        [klass] = preview["by_class"]
+        assert klass["class_name"] == "Class 5"
+        assert klass["total_amount"] == Decimal("57124.00")
+        # 40/30/30 of 13281 and 15281, in whole paise
+        assert [row["amount"] for row in klass["installments"]] == [
+            Decimal("22849.60"), Decimal("17137.20"), Decimal("17137.20")
+        ]
+
+        result = installments.generate(school, year, plan, chunk_size=3)
+        assert {key: result[key] for key in ("invoices", "installments")} == {"invoices": 4, "installments": 12}
+        assert result["by_class"] == preview["by_class"]
+        for invoice in Invoice.objects.filter(school=school):
+            rows = list(invoice.installments.order_by("installment_number"))
+            assert sum(row.amount for row in rows) == invoice.total_amount
+            assert sum(row.paid_amount for row in rows) == invoice.paid_amount
+        # What was already paid went to the earliest installment
+        rows = list(part_paid.installments.order_by("installment_number"))
+        assert [(row.paid_amount, row.status) for row in rows] == [
+            (Decimal("5312.40"), "PAID"), (Decimal("687.60"), "PENDING"), (Decimal("0.00"), "PENDING")
+        ]
+        assert FeeInstallment.objects.values("installment_id").distinct().count() == 12
+
+        # Invoices that already have installments are left alone
+        assert installments.generate(school, year, plan)["installments"] == 0
+
+    def test_plan_validation(self):
+        from finance import installments
+
+        with pytest.raises(ValueError):
+            installments.parse_plan([{"percent": 60, "due_date": "2024-04-10"}])
+        with pytest.raises(ValueError):
+            installments.parse_plan(list(reversed(_QUARTERLY)))
+        with pytest.raises(ValueError):
+            installments.parse_plan([{"percent": 100}])
+
+    def test_endpoint_preview_and_job(self, authenticated_client):
+        from core import jobs
+        from finance.models import FeeInstallment
+        from finance.services import FeeService
+
+        school, year = TestBulkFeeGeneration()._school(students=2)
+        FeeService.generate_annual_fees(year, school)
+        authenticated_client.user.school = school
+        authenticated_client.user.save()
+        body = {"academic_year_id": year.pk, "plan": _QUARTERLY}
+
+        response = authenticated_client.post(
+            "/api/finance/settlement/installments/", {**body, "dry_run": True}, format="json"
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["installments"] == 6
+        assert not FeeInstallment.objects.exists()
+
+        response = authenticated_client.post(
+            "/api/finance/settlement/installments/", {**body, "plan": _QUARTERLY[:2]}, format="json"
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+        response = authenticated_client.post("/api/finance/settlement/installments/", body, format="json")
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert jobs.work() == 1
+        job = authenticated_client.get(response.data["status_url"]).data
+        assert job["status"] == "SUCCEEDED"
+        assert job["result"]["installments"] == 6
+        assert FeeInstallment.objects.filter(school=school).count() == 6
+
+
+# Property-based tests: allocations are pure functions of (lines, amount)
+
+_paise = st.integers(min_value=0, max_value=10_000_000).map(lambda p: Decimal(p) / 100)
+_lines = st.lists(
+    st.tuples(_paise, st.sampled_from(["Tuition", "Lab", "Transport", "Sports"]), st.dates()),
+    max_size=12,
+).map(lambda rows: [_line(key, *row) for key, row in enumerate(rows)])
+
+
+def _line(key, balance, name, due_date):
+    from finance.allocation import Line
+    return Line(key, balance, name, due_date)
+
+
+class TestAllocationStrategies:
+    """Properties every allocation strategy must keep."""
+
+    @given(lines=_lines, amount=_paise, strategy=st.sampled_from(
+        ["EQUAL", "TUITION_FIRST", "OLDEST_DUE_FIRST", "TAX_PROPORTIONAL"]
+    ))
+    def test_allocations_sum_exactly(self, lines, amount, strategy):
+        from finance.allocation import allocate
+
+        split = allocate(lines, amount, strategy)
+        balances = {line.key: line.balance for line in lines}
+        assert sum(split.values()) == min(amount, sum(balances.values()))
+        for key, paid in split.items():
+            assert 0 < paid <= balances[key]
+            assert paid == paid.quantize(Decimal("0.01"))
+
+    @given(lines=_lines, amount=_paise)
+    def test_water_fill_is_level(self, lines, amount):
+        from finance.allocation import allocate
+
+        split = allocate(lines, amount, "EQUAL")
+        # Lines not paid off all got the same share, give or take the residue paisa,
+        # and no line that was paid off is bigger than that share (plus its residue paisa)
+        shares = [split.get(line.key, 0) for line in lines if 0 <= split.get(line.key, 0) < line.balance]
+        if shares:
+            assert max(shares) - min(shares) <= Decimal("0.01")
+            assert all(
+                line.balance <= max(shares) + Decimal("0.01") for line in lines if split.get(line.key) == line.balance
+            )
+
+    def test_examples(self):
+        from finance.allocation import Line, allocate
+
+        lines = [Line(1, Decimal("6000.00"), "Tuition"), Line(2, Decimal("1000.00"), "Lab"),
+                 Line(3, Decimal("500.00"), "Sports")]
+        assert allocate(lines, Decimal("100.00")) == {
+            1: Decimal("33.34"), 2: Decimal("33.33"), 3: Decimal("33.33")
+        }
+        assert allocate(lines, Decimal("750.00"), "TAX_PROPORTIONAL") == {
+            1: Decimal("600.00"), 2: Decimal("100.00"), 3: Decimal("50.00")
+        }
+        with pytest.raises(ValueError):
+            allocate(lines, Decimal("10.005"))
+
+    @given(total=_paise, percents=st.lists(st.integers(min_value=1, max_value=60), min_size=1, max_size=6))
+    def test_installment_split_is_exact(self, total, percents):
+        from datetime import date, timedelta
+        from finance.installments import split
+
+        percents[-1] += 100 - sum(percents)
+        if percents[-1] <= 0:
+            return
+        plan = [(Decimal(p), date(2024, 4, 1) + timedelta(days=index)) for index, p in enumerate(percents)]
+        amounts = split(total, plan)
+        assert sum(amounts) == total
+        for amount, (percent, _) in zip(amounts, plan):
+            assert abs(amount - total * percent / 100) < Decimal("0.01")
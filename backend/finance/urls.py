@@ -23,11 +23,12 @@ from .views import (
     # Receipt ViewSet
     ReceiptViewSet, InvoiceViewSet, # Added InvoiceViewSet
     # Views
-    BulkFeeGenerationView, YearSettlementView, SettlementSummaryView,
+    BulkFeeGenerationView, BulkInstallmentPlanView, YearSettlementView, SettlementSummaryView,
     StudentPromotionView, CertificateFeeCheckView,
     PendingReceivablesView, PaymentHistoryView,
     # Student Fee Views
-    StudentFeeView, SettleInvoiceView, StudentFeeSummaryView
+    StudentFeeView, SettleInvoiceView, StudentFeeSummaryView, FeeCounterView,
+    DocumentExportView, DocumentExportDownloadView
 )
 
 router = DefaultRouter()
@@ -44,6 +45,7 @@ router.register(r'payroll/list', PayrollViewSet, basename='salary')
 urlpatterns += [
     # Bulk operations
     path('settlement/generate/', BulkFeeGenerationView.as_view(), name='bulk-fee-generation'),
+    path('settlement/installments/', BulkInstallmentPlanView.as_view(), name='bulk-installment-plan'),
     path('settlement/<int:year_id>/settle/', YearSettlementView.as_view(), name='year-settlement'),
     path('settlement/<int:year_id>/summary/', SettlementSummaryView.as_view(), name='settlement-summary'),
     
@@ -60,6 +62,11 @@ urlpatterns += [
     # Student-specific fee management
     path('students/<int:student_id>/fees/', StudentFeeView.as_view(), name='student-fee-view'),
     path('students-pending/', StudentFeeSummaryView.as_view(), name='students-with-pending'),
+    path('counter/', FeeCounterView.as_view(), name='fee-counter'),
+    
+    # Batch PDF export (receipts of a day, invoices of a class)
+    path('exports/', DocumentExportView.as_view(), name='document-export'),
+    path('exports/<int:job_id>/download/', DocumentExportDownloadView.as_view(), name='document-export-download'),
     
     # Invoice settlement (waive/write-off)
     path('invoices/<int:invoice_id>/settle/', SettleInvoiceView.as_view(), name='settle-invoice'),
@@ -2,9 +2,6 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from .utils import calculate_monthly_salary
-from django.template.loader import render_to_string
-from django.http import HttpResponse
-from xhtml2pdf import pisa
 from .models import Invoice
 import datetime
 
@@ -31,48 +28,28 @@ class DownloadInvoiceView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, invoice_id):
+        from .documents import RenderError, serve_invoice
+
         try:
-            invoice = Invoice.objects.get(id=invoice_id, school=request.user.school)
+            invoice = Invoice.objects.select_related(
+                'school', 'academic_year', 'student__current_class', 'student__section'
+            ).get(id=invoice_id, school=request.user.school)
         except Invoice.DoesNotExist:
             return Response({'error': 'Invoice not found'}, status=404)
 
-        context = {
-            'school_name': invoice.school.name,
-            'student_name': f"{invoice.student.first_name} {invoice.student.last_name}",
-            'enrollment_number': invoice.student.enrollment_number,
-            'class_name': str(invoice.fee_structure.class_assigned) if invoice.fee_structure else "N/A",
-            'section': str(invoice.student.section) if invoice.student.section else "N/A",
-            'father_name': invoice.student.father_name,
-            'mother_name': invoice.student.mother_name,
-            'mobile': invoice.student.emergency_mobile,
-            'address': invoice.student.address,
-            'dob': invoice.student.date_of_birth.strftime('%Y-%m-%d') if invoice.student.date_of_birth else "",
-            'invoice_id': invoice.invoice_id,
-            'date': invoice.created_at.strftime('%Y-%m-%d'),
-            'due_date': invoice.due_date,
-            'status': invoice.status,
-            'title': invoice.title,
-            'amount': invoice.total_amount
-        }
-
-        html_string = render_to_string('invoice.html', context)
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="invoice_{invoice.invoice_id}.pdf"'
-
-        pisa_status = pisa.CreatePDF(
-            html_string, dest=response)
-
-        if pisa_status.err:
+        # Rendered once per version of the invoice (core.pdf_cache)
+        try:
+            return serve_invoice(request, invoice)
+        except RenderError:
             return Response({'error': 'PDF generation failed'}, status=500)
-            
-        return response
 
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from .models import FeeCategory, FeeStructure
 from .serializers import FeeCategorySerializer, FeeStructureSerializer
-from core.permissions import StandardPermission
-from core.middleware import get_current_school_id
+from core.permissions import StandardPermission, has_model_permission
 from core.pagination import StandardResultsPagination
+from core import jobs
 
 class FeeCategoryViewSet(viewsets.ModelViewSet):
     queryset = FeeCategory.objects.all()
@@ -82,9 +59,7 @@ class FeeCategoryViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = FeeCategory.objects.select_related('school').all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         return queryset
 
     def perform_create(self, serializer):
@@ -100,14 +75,12 @@ class FeeStructureViewSet(viewsets.ModelViewSet):
         queryset = FeeStructure.objects.select_related(
             'school', 'academic_year', 'class_assigned', 'category'
         ).all()
-        school_id = get_current_school_id()
         class_id = self.request.query_params.get('class_assigned')
         section_id = self.request.query_params.get('section')
         academic_year_id = self.request.query_params.get('academic_year')
         category_id = self.request.query_params.get('category')
         
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         
         if class_id:
             queryset = queryset.filter(class_assigned_id=class_id)
@@ -127,6 +100,40 @@ class FeeStructureViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(school=self.request.user.school)
 
+    @action(detail=False, methods=['get'])
+    def resolve(self, request):
+        """
+        Effective fees of a class/section (section overrides applied), with
+        GST split and round-off, from the cached matrix (finance.fee_matrix)
+        
+        Query params: class_id (required), section_id, academic_year (default: active year)
+        """
+        from . import fee_matrix
+        
+        class_id = request.query_params.get('class_id')
+        if not class_id:
+            return Response({'success': False, 'error': 'class_id is required'}, status=400)
+        
+        years = AcademicYear.objects.filter(school=request.user.school)
+        year_id = request.query_params.get('academic_year')
+        academic_year = years.filter(id=year_id).first() if year_id else years.filter(is_active=True).first()
+        if academic_year is None:
+            return Response({'success': False, 'error': 'Academic year not found'}, status=404)
+        
+        try:
+            template = fee_matrix.resolve(
+                request.user.school, academic_year, int(class_id), int(request.query_params.get('section_id') or 0) or None
+            )
+        except ValueError:
+            return Response({'success': False, 'error': 'class_id and section_id must be numbers'}, status=400)
+        return Response({
+            'success': True,
+            'academic_year': academic_year.id,
+            'total_amount': template['total_amount'] if template else 0,
+            'round_off_amount': template['round_off_amount'] if template else 0,
+            'heads': template['breakups'] if template else [],
+        })
+
 
 # ViewSet Cleanups
 # FeeViewSet is handled in students.views to avoid duplication
@@ -171,16 +178,17 @@ class BulkFeeGenerationView(APIView):
                     'error': 'academic_year_id is required'
                 }, status=400)
             
-            academic_year = AcademicYear.objects.get(id=academic_year_id)
+            academic_year = AcademicYear.objects.get(id=academic_year_id, school=request.user.school)
             
-            # Generate fees
-            result = FeeService.generate_annual_fees(
-                academic_year,
-                request.user.school,
-                options
+            # Runs in the background (core.jobs); poll /api/jobs/<id>/
+            job = jobs.enqueue(
+                'finance.generate_annual_fees',
+                {'academic_year_id': academic_year.id, 'options': options},
+                school=request.user.school,
+                user=request.user,
             )
             
-            return Response(result)
+            return Response(jobs.accepted(job), status=202)
             
         except AcademicYear.DoesNotExist:
             return Response({
@@ -194,6 +202,67 @@ class BulkFeeGenerationView(APIView):
             }, status=500)
 
 
+class BulkInstallmentPlanView(APIView):
+    """Split a class's (or the whole year's) invoices into installments"""
+    permission_classes = [IsAuthenticated, StandardPermission]
+    
+    def post(self, request):
+        """
+        Apply an installment plan to every open invoice without installments
+        
+        Request body:
+        {
+            "academic_year_id": 1,
+            "class_id": 3,            (optional)
+            "section_id": 7,          (optional)
+            "plan": [
+                {"percent": 40, "due_date": "2025-04-10"},
+                {"percent": 30, "due_date": "2025-08-10"},
+                {"percent": 30, "due_date": "2025-12-10"}
+            ],
+            "dry_run": true           (per-class preview, nothing written)
+        }
+        """
+        from . import installments
+        
+        academic_year_id = request.data.get('academic_year_id')
+        if not academic_year_id:
+            return Response({
+                'success': False,
+                'error': 'academic_year_id is required'
+            }, status=400)
+        
+        try:
+            academic_year = AcademicYear.objects.get(id=academic_year_id, school=request.user.school)
+        except AcademicYear.DoesNotExist:
+            return Response({
+                'success': False,
+                'error': 'Academic year not found'
+            }, status=404)
+        
+        try:
+            plan = installments.parse_plan(request.data.get('plan'))
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
+        
+        scope = {
+            'class_id': request.data.get('class_id') or None,
+            'section_id': request.data.get('section_id') or None,
+        }
+        if request.data.get('dry_run'):
+            result = installments.preview(request.user.school, academic_year, plan, **scope)
+            return Response({'success': True, **result})
+        
+        # Runs in the background (core.jobs); poll /api/jobs/<id>/
+        job = jobs.enqueue(
+            'finance.generate_installments',
+            {'academic_year_id': academic_year.id, 'plan': request.data.get('plan'), **scope},
+            school=request.user.school,
+            user=request.user,
+        )
+        return Response(jobs.accepted(job), status=202)
+
+
 class YearSettlementView(APIView):
     """Mark academic year as settled"""
     permission_classes = [IsAuthenticated, StandardPermission]
@@ -345,9 +414,7 @@ class FeeInstallmentViewSet(ModelViewSet):
         queryset = FeeInstallment.objects.select_related(
             'school', 'invoice', 'invoice__student'
         ).all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         
         # Filter by invoice if provided
         invoice_id = self.request.query_params.get('invoice')
@@ -376,9 +443,7 @@ class FeeDiscountViewSet(ModelViewSet):
         queryset = FeeDiscount.objects.select_related(
             'school', 'student', 'academic_year', 'category', 'created_by'
         ).all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         
         # Filter by student
         student_id = self.request.query_params.get('student')
@@ -413,9 +478,7 @@ class CertificateFeeViewSet(ModelViewSet):
     
     def get_queryset(self):
         queryset = CertificateFee.objects.select_related('school').all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         
         # Filter by active status
         is_active = self.request.query_params.get('is_active')
@@ -428,7 +491,8 @@ class CertificateFeeViewSet(ModelViewSet):
         serializer.save(school=self.request.user.school)
 
 
-from .models import Receipt
+from decimal import Decimal
+from .models import Receipt, StudentLedger
 from .serializers import ReceiptSerializer, ReceiptCreateSerializer, InvoiceSerializer
 
 class InvoiceViewSet(ModelViewSet):
@@ -441,6 +505,7 @@ class InvoiceViewSet(ModelViewSet):
     serializer_class = InvoiceSerializer
     permission_classes = [StandardPermission]
     pagination_class = StandardResultsPagination
+    keyset_ordering = ('-created_at', '-id')  # ?pagination=cursor (core.pagination)
 
     def get_queryset(self):
         queryset = Invoice.objects.select_related(
@@ -448,9 +513,7 @@ class InvoiceViewSet(ModelViewSet):
             'fee_structure', 'academic_year'
         ).all()
         
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
             
         # Filter by student
         student_id = self.request.query_params.get('student')
@@ -488,6 +551,7 @@ class ReceiptViewSet(ModelViewSet):
     queryset = Receipt.objects.all()
     permission_classes = [StandardPermission]
     pagination_class = StandardResultsPagination
+    keyset_ordering = ('-created_at', '-id')  # ?pagination=cursor (core.pagination)
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -497,11 +561,9 @@ class ReceiptViewSet(ModelViewSet):
     def get_queryset(self):
         queryset = Receipt.objects.select_related(
             'school', 'invoice', 'invoice__student', 
-            'created_by', 'collected_by'
+            'created_by'
         ).all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         
         # Filter by invoice
         invoice_id = self.request.query_params.get('invoice')
@@ -537,6 +599,8 @@ class ReceiptViewSet(ModelViewSet):
 class PendingReceivablesView(APIView):
     """Get all pending receivables (unpaid invoices)"""
     permission_classes = [IsAuthenticated, StandardPermission]
+    pagination_class = StandardResultsPagination
+    keyset_ordering = ('due_date', 'id')  # ?pagination=cursor (core.pagination)
     
     def get(self, request):
         """
@@ -544,57 +608,67 @@ class PendingReceivablesView(APIView):
         
         Query params:
         - class_id: Filter by class
+        - section_id: Filter by section
         - student_id: Filter by specific student
         - status: PENDING, PARTIAL, OVERDUE (default: all pending)
+        - group_by: class, section or head -> aggregated buckets instead of invoices
+        - pagination=cursor (then cursor=...): pages of invoices instead of one streamed list
+        
+        Without group_by or pagination the whole list is streamed as
+        {"summary": {...}, "invoices": [...]} (finance.receivables).
         """
-        from .serializers import InvoiceSerializer
+        from django.http import StreamingHttpResponse
+        from . import receivables
         
-        queryset = Invoice.objects.filter(
-            school=request.user.school
-        ).select_related(
-            'student', 'student__current_class', 'academic_year'
-        ).prefetch_related('receipts')
+        queryset = Invoice.objects.filter(school=request.user.school)
         
         # Filter by status (default to pending types)
         status = request.query_params.get('status')
         if status:
             queryset = queryset.filter(status=status)
         else:
-            queryset = queryset.filter(status__in=['PENDING', 'PARTIAL', 'OVERDUE'])
+            queryset = queryset.filter(status__in=receivables.OPEN_STATUSES)
         
-        # Filter by class
+        # Filter by class / section
         class_id = request.query_params.get('class_id')
         if class_id:
             queryset = queryset.filter(student__current_class_id=class_id)
+        section_id = request.query_params.get('section_id')
+        if section_id:
+            queryset = queryset.filter(student__section_id=section_id)
         
         # Filter by student
         student_id = request.query_params.get('student_id')
         if student_id:
             queryset = queryset.filter(student_id=student_id)
         
-        # Order by due date
-        queryset = queryset.order_by('due_date')
+        group_by = request.query_params.get('group_by')
+        if group_by:
+            if group_by not in receivables.GROUPS:
+                return Response({
+                    'success': False,
+                    'error': f"group_by must be one of: {', '.join(receivables.GROUPS)}"
+                }, status=400)
+            return Response({
+                'group_by': group_by,
+                'buckets': receivables.buckets(queryset, group_by),
+                'summary': receivables.summary(queryset),
+            })
         
-        # Calculate totals
-        from django.db.models import Sum
-        totals = queryset.aggregate(
-            total_amount=Sum('total_amount'),
-            total_paid=Sum('paid_amount'),
+        # Order by due date
+        queryset = queryset.order_by(*self.keyset_ordering)
+        
+        paginator = self.pagination_class()
+        if paginator.uses_keyset(request, self):
+            page = paginator.paginate_queryset(receivables.lean(queryset), request, view=self)
+            response = paginator.get_paginated_response([receivables.row(invoice) for invoice in page])
+            if paginator.cursor_query_param not in request.query_params:
+                response.data['summary'] = receivables.summary(queryset)  # First page only
+            return response
+        
+        return StreamingHttpResponse(
+            receivables.stream(queryset, receivables.summary(queryset)), content_type='application/json'
         )
-        
-        total_pending = (totals['total_amount'] or 0) - (totals['total_paid'] or 0)
-        
-        serializer = InvoiceSerializer(queryset, many=True)
-        
-        return Response({
-            'invoices': serializer.data,
-            'summary': {
-                'total_invoices': queryset.count(),
-                'total_amount': float(totals['total_amount'] or 0),
-                'total_paid': float(totals['total_paid'] or 0),
-                'total_pending': float(total_pending),
-            }
-        })
 
 
 class PaymentHistoryView(APIView):
@@ -613,7 +687,7 @@ class PaymentHistoryView(APIView):
         queryset = Receipt.objects.filter(
             school=request.user.school
         ).select_related(
-            'invoice', 'invoice__student', 'created_by', 'collected_by'
+            'invoice', 'invoice__student', 'created_by'
         ).order_by('-created_at')
         
         # Date filters
@@ -636,15 +710,19 @@ class PaymentHistoryView(APIView):
         
         serializer = ReceiptSerializer(queryset[:100], many=True)  # Limit to 100
         
-        # Summary
-        from django.db.models import Sum
-        totals = queryset.aggregate(total=Sum('amount'))
+        # Summary: per-day collection rollups, unless narrowed to one student
+        if student_id:
+            from django.db.models import Count, Sum
+            totals = queryset.aggregate(amount=Sum('amount'), receipts=Count('id'))
+        else:
+            from reports import rollups
+            totals = rollups.collection_totals(request.user.school_id, date_from, date_to, mode)
         
         return Response({
             'receipts': serializer.data,
             'summary': {
-                'total_receipts': queryset.count(),
-                'total_collected': float(totals['total'] or 0),
+                'total_receipts': totals['receipts'],
+                'total_collected': float(totals['amount'] or 0),
             }
         })
 
@@ -681,23 +759,18 @@ class StudentFeeView(APIView):
         receipts = Receipt.objects.filter(
             invoice__student=student
         ).select_related(
-            'invoice', 'created_by', 'collected_by'
+            'invoice', 'created_by'
         ).order_by('-created_at')
         
-        # Calculate totals
+        # Totals: stored per academic year in the student's ledger
         pending_invoices = invoices.filter(status__in=['PENDING', 'PARTIAL', 'OVERDUE'])
-        totals = invoices.aggregate(
-            total_amount=Sum('total_amount'),
-            total_paid=Sum('paid_amount'),
+        totals = StudentLedger.objects.filter(student=student).aggregate(
+            total_amount=Sum('invoiced'),
+            total_paid=Sum('paid'),
+            total_waived=Sum('waived'),
+            total_pending=Sum('balance'),
         )
         
-        pending_totals = pending_invoices.aggregate(
-            pending_amount=Sum('total_amount'),
-            pending_paid=Sum('paid_amount'),
-        )
-        
-        total_pending = (pending_totals['pending_amount'] or 0) - (pending_totals['pending_paid'] or 0)
-        
         invoice_serializer = InvoiceSerializer(invoices, many=True)
         receipt_serializer = ReceiptSerializer(receipts, many=True)
         
@@ -715,12 +788,242 @@ class StudentFeeView(APIView):
                 'total_invoices': invoices.count(),
                 'pending_invoices': pending_invoices.count(),
                 'total_amount': float(totals['total_amount'] or 0),
-                'total_paid': float(totals['total_paid'] or 0),
-                'total_pending': float(total_pending),
+                # Waivers settle invoices too, as they always have here
+                'total_paid': float((totals['total_paid'] or 0) + (totals['total_waived'] or 0)),
+                'total_waived': float(totals['total_waived'] or 0),
+                'total_pending': float(totals['total_pending'] or 0),
             }
         })
 
 
+class FeeCounterView(APIView):
+    """
+    Fee counter: find a student, see what is open and collect, in one request each
+    (finance.counter)
+    """
+    permission_classes = [IsAuthenticated, StandardPermission]
+    queryset = Receipt.objects.all()  # Collecting needs add_receipt
+
+    @staticmethod
+    def _student(student):
+        return {
+            'id': student.id,
+            'name': student.get_full_name(),
+            'gr_number': student.gr_number,
+            'enrollment_number': student.enrollment_number,
+            'class_name': student.current_class.name if student.current_class else None,
+            'section_name': student.section.name if student.section else None,
+        }
+
+    @staticmethod
+    def _invoices(invoices, plan=()):
+        suggested = {pk: paid for entry in plan for pk, paid in entry['heads'].items()}
+        return [{
+            'id': invoice.id,
+            'invoice_id': invoice.invoice_id,
+            'academic_year': invoice.academic_year_id,
+            'due_date': invoice.due_date,
+            'status': invoice.status,
+            'total_amount': invoice.total_amount,
+            'paid_amount': invoice.paid_amount,
+            'balance_due': invoice.balance_due,
+            'breakups': [{
+                'id': breakup.id,
+                'head_id': breakup.head_id,
+                'head_name': breakup.head.name,
+                'amount': breakup.amount,
+                'paid_amount': breakup.paid_amount,
+                'balance': breakup.amount - breakup.paid_amount,
+                'suggested': suggested.get(breakup.id, Decimal('0.00')),
+            } for breakup in invoice.open_breakups],
+        } for invoice in invoices]
+
+    @staticmethod
+    def _matches(request, params):
+        """Students matching student_id or q (GR number, roll number or mobile)"""
+        from . import counter
+
+        student_id = params.get('student_id')
+        if student_id:
+            return list(
+                Student.objects.for_school(request.user.school)
+                .select_related('current_class', 'section').filter(id=student_id)
+            )
+        return counter.find_students(request.user.school, params.get('q'))
+
+    def get(self, request):
+        """
+        Find a student and show what they owe
+
+        Query params:
+        - q: GR number, roll number or mobile (or student_id)
+        - amount: amount to suggest an allocation for (default: everything open)
+
+        When several students match, only the candidates are returned
+        under "matches"; ask again with student_id.
+        """
+        from . import counter
+
+        matches = self._matches(request, request.query_params)
+        if not matches:
+            return Response({'success': False, 'error': 'Student not found'}, status=404)
+        if len(matches) > 1:
+            return Response({'success': True, 'matches': [self._student(student) for student in matches]})
+
+        student = matches[0]
+        invoices = counter.open_invoices(student)
+        pending = sum((counter.collectable(invoice) for invoice in invoices), Decimal('0.00'))
+        amount = request.query_params.get('amount') or pending
+        plan = []
+        if pending:
+            try:
+                plan = counter.suggest(invoices, Decimal(str(amount)), request.user.school.fee_allocation_strategy)
+            except (ArithmeticError, ValueError) as e:
+                return Response({'success': False, 'error': str(e)}, status=400)
+
+        return Response({
+            'success': True,
+            'student': self._student(student),
+            'invoices': self._invoices(invoices, plan),
+            'total_pending': pending,
+            'suggested': [{'invoice_id': entry['invoice'].id, 'amount': entry['amount']} for entry in plan],
+        })
+
+    def post(self, request):
+        """
+        Collect a payment
+
+        Request body:
+        {
+            "student_id": 12,          (or "q")
+            "amount": 5000,
+            "mode": "CASH",
+            "transaction_id": "",      (optional)
+            "invoice_id": 40           (optional: only this invoice)
+        }
+
+        Posted oldest due invoice first, one receipt per invoice; answers
+        with the receipts (and their PDF links) and the balances left.
+        """
+        from django.urls import reverse
+        from . import counter
+
+        matches = self._matches(request, request.data)
+        if len(matches) != 1:
+            return Response({
+                'success': False,
+                'error': 'More than one student matches; pass student_id' if matches else 'Student not found',
+                'matches': [self._student(student) for student in matches],
+            }, status=400 if matches else 404)
+        student = matches[0]
+
+        mode = request.data.get('mode') or 'CASH'
+        if mode not in dict(Receipt._meta.get_field('mode').choices):
+            return Response({'success': False, 'error': f'Unknown payment mode {mode}'}, status=400)
+        try:
+            amount = Decimal(str(request.data.get('amount')))
+            receipts, invoices = counter.collect(
+                request.user.school, student, amount, mode, request.user,
+                transaction_id=request.data.get('transaction_id') or '',
+                invoice=request.data.get('invoice_id') or None,
+            )
+        except (ArithmeticError, ValueError) as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
+
+        return Response({
+            'success': True,
+            'student': self._student(student),
+            'receipts': [{
+                'receipt_no': receipt.receipt_no,
+                'invoice_id': receipt.invoice_id,
+                'amount': receipt.amount,
+                'pdf_url': reverse('receipt-pdf', args=[receipt.receipt_no]),
+            } for receipt in receipts],
+            'invoices': self._invoices(invoices),
+            'total_pending': sum((counter.collectable(invoice) for invoice in invoices), Decimal('0.00')),
+        }, status=201)
+
+
+class DocumentExportView(APIView):
+    """Many receipts or invoices as one ZIP or merged PDF (finance.exports)"""
+    permission_classes = [IsAuthenticated, StandardPermission]
+    # The model depends on `type`, so it is checked per request, not by StandardPermission
+    models = {'receipts': Receipt, 'invoices': Invoice}
+
+    def get(self, request):
+        """
+        Export receipts or invoices
+
+        Query params:
+        - type: receipts or invoices
+        - output: zip (default) or pdf (one merged PDF); not `format`, which DRF takes
+        - receipts: date, or date_from/date_to; mode; class_id
+        - invoices: academic_year, class_id, section_id, status
+        - async=true: export in the background even when small
+
+        Up to exports.INLINE_LIMIT documents are streamed right away; larger
+        batches answer 202 with a job (core.jobs) whose result has the
+        download URL.
+        """
+        from django.http import StreamingHttpResponse
+        from . import exports
+
+        kind = request.query_params.get('type', '')
+        output = request.query_params.get('output', 'zip')
+        if output not in exports.FORMATS:
+            return Response({'success': False, 'error': f"output must be one of: {', '.join(exports.FORMATS)}"}, status=400)
+        if kind in self.models and not has_model_permission(request.user, self.models[kind]):
+            return Response({'success': False, 'error': f'You do not have permission to export {kind}'}, status=403)
+        params = {
+            key: value for key, value in request.query_params.items()
+            if key not in ('type', 'output', 'async')
+        }
+        try:
+            queryset = exports.select(request.user.school, kind, params)
+        except ValueError as e:
+            return Response({'success': False, 'error': str(e)}, status=400)
+
+        count = queryset.count()
+        if not count:
+            return Response({'success': False, 'error': f'No {kind} to export'}, status=404)
+        if count > exports.INLINE_LIMIT or request.query_params.get('async') in ('1', 'true'):
+            job = jobs.enqueue(
+                'finance.export_documents',
+                {'kind': kind, 'params': params, 'output': output},
+                school=request.user.school,
+                user=request.user,
+            )
+            return Response({**jobs.accepted(job), 'documents': count}, status=202)
+
+        response = StreamingHttpResponse(
+            exports.stream(exports.KINDS[kind], queryset, output), content_type=exports.CONTENT_TYPES[output]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{output}"'
+        return response
+
+
+class DocumentExportDownloadView(APIView):
+    """The file of a finished export job, for whoever started it (or admin/finance roles)"""
+    permission_classes = [IsAuthenticated, StandardPermission]
+    queryset = Invoice.objects.all()  # Downloading needs view_invoice
+
+    def get(self, request, job_id):
+        from django.http import StreamingHttpResponse
+        from core.models import Job
+        from . import exports
+
+        job = jobs.visible_to(request.user).filter(
+            pk=job_id, name=exports.JOB, status=Job.STATUS_SUCCEEDED,
+        ).first()
+        if job is None or not jobs.has_file(job):
+            return Response({'error': 'Export not found'}, status=404)
+        output = job.result['format']
+        response = StreamingHttpResponse(jobs.read_file(job), content_type=exports.CONTENT_TYPES[output])
+        response['Content-Disposition'] = f'attachment; filename="{job.payload["kind"]}.{output}"'
+        response['Content-Length'] = job.result['size']
+        return response
+
+
 class SettleInvoiceView(APIView):
     """
     Settle/Waive pending amount on an invoice
@@ -791,21 +1094,8 @@ class SettleInvoiceView(APIView):
         else:
             waive_amount = float(balance)
             
-        # Create "Waiver" Receipt
-        from .models import Receipt
-        Receipt.objects.create(
-            school=request.user.school,
-            invoice=invoice,
-            amount=waive_amount,
-            mode='WAIVER', # Special mode
-            created_by=request.user,
-            remarks=f"Settlement: {settlement_note}"
-        )
-        
-        # Update Invoice Paid Amount logic is triggered by Receipt? 
-        # No, my Service usually handles it.
-        # Let's use FeeService.process_payment with mode='WAIVER'.
-        
+        # Post the "Waiver" Receipt: process_payment creates it, settles the
+        # fee heads and moves the amount to the student's ledger as waived.
         from .services import FeeService
         from decimal import Decimal
         
@@ -838,65 +1128,65 @@ class StudentFeeSummaryView(APIView):
         - class_id: Filter by class
         - min_pending: Minimum pending amount to show
         """
-        from django.db.models import Sum, F, OuterRef, Subquery
+        from django.db.models import Count, Sum
         from students.models import Student
         
-        # Base query for students with pending invoices
-        students_with_pending = Student.objects.filter(
+        # Ledger rows (one per student and academic year) summed per student,
+        # highest balance first
+        ledgers = StudentLedger.objects.filter(
             school=request.user.school,
-            is_active=True
-        ).annotate(
-            total_invoiced=Sum('invoice__total_amount'),
-            total_paid=Sum('invoice__paid_amount'),
-        ).annotate(
-            pending_amount=F('total_invoiced') - F('total_paid')
-        ).filter(
-            pending_amount__gt=0
-        ).order_by('-pending_amount')
+            student__is_active=True,
+        )
         
         # Filter by class
         class_id = request.query_params.get('class_id')
         if class_id:
-            students_with_pending = students_with_pending.filter(current_class_id=class_id)
+            ledgers = ledgers.filter(student__current_class_id=class_id)
 
         # Filter by section
         section_id = request.query_params.get('section_id')
         if section_id:
-            students_with_pending = students_with_pending.filter(section_id=section_id)
+            ledgers = ledgers.filter(student__section_id=section_id)
+        
+        students_with_pending = ledgers.values('student_id').annotate(
+            total_invoiced=Sum('invoiced'),
+            total_paid=Sum('paid'),
+            total_waived=Sum('waived'),
+            pending_amount=Sum('balance'),
+        ).filter(pending_amount__gt=0).order_by('-pending_amount', 'student_id')
         
-        # Filter by minimum pending
+        # Filter by minimum pending (of the student, across academic years)
         min_pending = request.query_params.get('min_pending')
         if min_pending:
-            students_with_pending = students_with_pending.filter(pending_amount__gte=float(min_pending))
+            students_with_pending = students_with_pending.filter(pending_amount__gte=min_pending)
+        
+        # Overall summary, before the list is cut to 100
+        totals = students_with_pending.aggregate(
+            students=Count('student_id'),
+            total=Sum('pending_amount'),
+        )
         
         # Limit to 100
-        students_with_pending = students_with_pending[:100]
+        rows = list(students_with_pending[:100])
+        students = Student.objects.select_related('current_class').in_bulk([row['student_id'] for row in rows])
         
         result = []
-        for student in students_with_pending:
+        for row in rows:
+            student = students[row['student_id']]
             result.append({
                 'id': student.id,
                 'name': student.get_full_name(),
                 'enrollment_number': student.enrollment_number,
                 'class_name': str(student.current_class) if student.current_class else None,
-                'total_invoiced': float(student.total_invoiced or 0),
-                'total_paid': float(student.total_paid or 0),
-                'pending_amount': float(student.pending_amount or 0),
+                'total_invoiced': float(row['total_invoiced']),
+                'total_paid': float(row['total_paid'] + row['total_waived']),
+                'pending_amount': float(row['pending_amount']),
             })
         
-        # Overall summary
-        totals = Invoice.objects.filter(
-            school=request.user.school,
-            status__in=['PENDING', 'PARTIAL', 'OVERDUE']
-        ).aggregate(
-            total=Sum('total_amount'),
-            paid=Sum('paid_amount'),
-        )
-        
         return Response({
             'students': result,
             'summary': {
-                'students_with_pending': len(result),
-                'total_pending': float((totals['total'] or 0) - (totals['paid'] or 0)),
+                'students_with_pending': totals['students'],
+                'total_pending': float(totals['total'] or 0),
             }
         })
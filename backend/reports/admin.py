@@ -1,3 +1,56 @@
 from django.contrib import admin
+from .models import DailyCollection, DailyCounters, MonthlyInvoicing, SchoolCounters
 
-# Register your models here.
+
+@admin.register(SchoolCounters)
+class SchoolCountersAdmin(admin.ModelAdmin):
+    """Read-only: rows are maintained by reports.counters / reconcile_counters."""
+    list_display = ('school', 'active_students', 'staff', 'pending_invoices', 'pending_amount',
+                    'pending_leaves', 'enquiries_pending', 'updated_at', 'reconciled_at')
+    list_select_related = ('school',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyCounters)
+class DailyCountersAdmin(admin.ModelAdmin):
+    list_display = ('school', 'date', 'students_present', 'students_absent', 'staff_marked', 'staff_present')
+    list_filter = ('date',)
+    list_select_related = ('school',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyCollection)
+class DailyCollectionAdmin(admin.ModelAdmin):
+    """Read-only: rows are maintained by reports.rollups / rebuild_rollups."""
+    list_display = ('school', 'date', 'mode', 'collector', 'amount', 'receipts')
+    list_filter = ('mode', 'date')
+    list_select_related = ('school', 'collector')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MonthlyInvoicing)
+class MonthlyInvoicingAdmin(admin.ModelAdmin):
+    list_display = ('school', 'academic_year', 'month', 'category', 'amount', 'invoices')
+    list_filter = ('month',)
+    list_select_related = ('school', 'academic_year', 'category')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
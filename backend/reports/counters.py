@@ -0,0 +1,347 @@
+"""
+Per-school dashboard counters.
+
+Every tracked model describes what one of its rows contributes to the
+counters (an active student adds 1 to active_students, a PENDING invoice
+adds 1 to pending_invoices and its balance to pending_amount, ...). On
+save, the contribution of the old values (known from core.tracking) is
+subtracted and that of the new values added with a single
+
+    UPDATE reports_schoolcounters SET x = x + %s ... WHERE school_id = %s
+
+inside the caller's transaction, so counters commit or roll back together
+with the row that moved them.
+
+Rows are created lazily, from a full recount, the first time they are read
+(snapshot) or by reconcile(); updates against a missing row are dropped
+since the recount will include them. Writes that bypass signals must
+report themselves: record_created() after bulk_create(), refresh() after
+queryset.update(). The reconcile_counters command corrects any drift.
+
+Usage:
+    counters.snapshot(school_pk)               # dict, single-row reads
+    counters.record_created(invoices)          # after Invoice.objects.bulk_create(invoices)
+    counters.refresh(school_pk)                # after a bulk queryset.update()
+"""
+from collections import defaultdict
+from decimal import Decimal
+from types import SimpleNamespace
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from core import tracking
+
+SCHOOL_COUNTERS = (
+    'active_students', 'staff', 'staff_members', 'pending_invoices', 'pending_amount', 'pending_leaves',
+    'enquiries_total', 'enquiries_pending', 'enquiries_in_progress', 'enquiries_approved',
+    'enquiries_rejected', 'enquiries_converted',
+)
+DAILY_COUNTERS = ('students_present', 'students_absent', 'staff_marked', 'staff_present')
+
+# Same roles the dashboard always counted as staff
+STAFF_ROLES = ('TEACHER', 'SCHOOL_ADMIN', 'PRINCIPAL')
+# Everyone who gets a staff profile (the staff dashboard's headcount)
+STAFF_MEMBER_ROLES = STAFF_ROLES + ('OFFICE_STAFF', 'ACCOUNTANT', 'CLEANING_STAFF', 'NON_TEACHING', 'DRIVER')
+
+ENQUIRY_COUNTERS = {
+    'PENDING': 'enquiries_pending',
+    'IN_PROGRESS': 'enquiries_in_progress',
+    'APPROVED': 'enquiries_approved',
+    'REJECTED': 'enquiries_rejected',
+    'CONVERTED': 'enquiries_converted',
+}
+
+
+# --- Contributions: row -> {(school_pk, date or None): {counter: amount}} ---
+
+def _student(row):
+    if row.is_active:
+        yield (row.school_id, None), {'active_students': 1}
+
+
+def _staff_user(row):
+    if row.role in STAFF_MEMBER_ROLES:
+        yield (row.school_id, None), {'staff': int(row.role in STAFF_ROLES), 'staff_members': 1}
+
+
+def _invoice(row):
+    # Unpaid invoices the overdue sweep moved on are still pending
+    if row.status == 'PENDING' or (row.status == 'OVERDUE' and not row.paid_amount):
+        balance = Decimal(str(row.total_amount or 0)) - Decimal(str(row.paid_amount or 0))
+        yield (row.school_id, None), {'pending_invoices': 1, 'pending_amount': balance}
+
+
+def _enquiry(row):
+    values = {'enquiries_total': 1}
+    if row.status in ENQUIRY_COUNTERS:
+        values[ENQUIRY_COUNTERS[row.status]] = 1
+    yield (row.school_id, None), values
+
+
+def _leave(row):
+    if row.status == 'PENDING':
+        yield (row.school_id, None), {'pending_leaves': 1}
+
+
+def _attendance(row):
+    if row.status == 'P':
+        yield (row.school_id, row.date), {'students_present': 1}
+    elif row.status == 'A':
+        yield (row.school_id, row.date), {'students_absent': 1}
+
+
+def _staff_attendance(row):
+    values = {'staff_marked': 1}
+    if row.status == 'PRESENT':
+        values['staff_present'] = 1
+    yield (row.school_id, row.date), values
+
+
+_specs = None
+
+
+def get_specs():
+    """{model: (attnames the contribution reads, contribution function)}"""
+    global _specs
+    if _specs is not None:
+        return _specs
+
+    from admissions.models import Enquiry
+    from core.models import CoreUser
+    from finance.models import Invoice, Leave
+    from staff.models import StaffAttendance
+    from students.models import Attendance, Student
+
+    _specs = {
+        Student: (('school_id', 'is_active'), _student),
+        CoreUser: (('school_id', 'role'), _staff_user),
+        Invoice: (('school_id', 'status', 'total_amount', 'paid_amount'), _invoice),
+        Enquiry: (('school_id', 'status'), _enquiry),
+        Leave: (('school_id', 'status'), _leave),
+        Attendance: (('school_id', 'date', 'status'), _attendance),
+        StaffAttendance: (('school_id', 'date', 'status'), _staff_attendance),
+    }
+    return _specs
+
+
+def _contribute(deltas, contribution, row, sign=1):
+    for key, values in contribution(row):
+        if key[0] is None:
+            continue  # Users without a school
+        for name, amount in values.items():
+            deltas[key][name] += sign * amount
+
+
+def _old_row(instance, attnames, changes):
+    values = {attname: getattr(instance, attname) for attname in attnames}
+    for name, (old, new) in changes.items():
+        attname = instance._meta.get_field(name).attname
+        if attname in values:
+            values[attname] = old
+    return SimpleNamespace(**values)
+
+
+def _row(instance, attnames):
+    return SimpleNamespace(**{attname: getattr(instance, attname) for attname in attnames})
+
+
+# --- Writes ---
+
+def apply(deltas):
+    """Add `deltas` ({(school_pk, date): {counter: amount}}) to the counter rows."""
+    from .models import DailyCounters, SchoolCounters
+
+    # Fixed order, so two transactions never lock the same rows the other way round
+    for (school_pk, day), values in sorted(deltas.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        changes = {name: F(name) + amount for name, amount in values.items() if amount}
+        if not changes:
+            continue
+        changes['updated_at'] = timezone.now()
+        if day is None:
+            SchoolCounters.objects.filter(school_id=school_pk).update(**changes)
+        else:
+            DailyCounters.objects.filter(school_id=school_pk, date=day).update(**changes)
+
+
+def record_save(instance, created):
+    spec = get_specs().get(type(instance))
+    if spec is None:
+        return
+    attnames, contribution = spec
+    deltas = defaultdict(lambda: defaultdict(int))
+    if created:
+        _contribute(deltas, contribution, _row(instance, attnames))
+    else:
+        changes = tracking.saved_changes(instance)
+        if changes is None:
+            # Saved without a loaded snapshot: old values unknown, recount
+            refresh(instance.school_id, instance.date if 'date' in attnames else None)
+            return
+        if not any(instance._meta.get_field(name).attname in attnames for name in changes):
+            return
+        _contribute(deltas, contribution, _old_row(instance, attnames, changes), sign=-1)
+        _contribute(deltas, contribution, _row(instance, attnames))
+    apply(deltas)
+
+
+def record_delete(instance):
+    spec = get_specs().get(type(instance))
+    if spec is None:
+        return
+    attnames, contribution = spec
+    deltas = defaultdict(lambda: defaultdict(int))
+    _contribute(deltas, contribution, _row(instance, attnames), sign=-1)
+    apply(deltas)
+
+
+def record_created(objs):
+    """Count rows inserted with bulk_create() (no post_save signal is sent)."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    specs = get_specs()
+    for obj in objs:
+        spec = specs.get(type(obj))
+        if spec is not None:
+            _contribute(deltas, spec[1], _row(obj, spec[0]))
+    apply(deltas)
+
+
+def refresh(school_pk, day=None):
+    """Recount one row from scratch, e.g. after a bulk queryset.update()."""
+    if school_pk is None:
+        return
+    if day is None:
+        _store_school(school_pk, compute(school_pk))
+    else:
+        _store_daily(school_pk, day, compute_daily(school_pk, day))
+
+
+# --- Full recounts ---
+
+def compute(school_pk):
+    from admissions.models import Enquiry
+    from core.models import CoreUser
+    from finance.models import Invoice, Leave
+    from students.models import Student
+
+    pending = Invoice.objects.for_school(school_pk).filter(
+        Q(status='PENDING') | Q(status='OVERDUE', paid_amount=0)
+    ).aggregate(
+        count=Count('id'),
+        total=Sum(F('total_amount') - F('paid_amount')),
+    )
+    enquiries = Enquiry.objects.filter(school_id=school_pk).aggregate(
+        enquiries_total=Count('id'),
+        **{name: Count('id', filter=Q(status=status)) for status, name in ENQUIRY_COUNTERS.items()}
+    )
+    return {
+        'active_students': Student.objects.for_school(school_pk).filter(is_active=True).count(),
+        'staff': CoreUser.objects.filter(school_id=school_pk, role__in=STAFF_ROLES).count(),
+        'staff_members': CoreUser.objects.filter(school_id=school_pk, role__in=STAFF_MEMBER_ROLES).count(),
+        'pending_invoices': pending['count'],
+        'pending_amount': pending['total'] or Decimal('0'),
+        'pending_leaves': Leave.objects.filter(school_id=school_pk, status='PENDING').count(),
+        **enquiries,
+    }
+
+
+def compute_daily(school_pk, day):
+    from staff.models import StaffAttendance
+    from students.models import Attendance
+
+    students = Attendance.objects.for_school(school_pk).filter(date=day).aggregate(
+        students_present=Count('id', filter=Q(status='P')),
+        students_absent=Count('id', filter=Q(status='A')),
+    )
+    staff = StaffAttendance.objects.for_school(school_pk).filter(date=day).aggregate(
+        staff_marked=Count('id'),
+        staff_present=Count('id', filter=Q(status='PRESENT')),
+    )
+    return {**students, **staff}
+
+
+def _store_school(school_pk, values, reconciled=False):
+    from .models import SchoolCounters
+
+    if reconciled:
+        values = {**values, 'reconciled_at': timezone.now()}
+    return _upsert(SchoolCounters, {'school_id': school_pk}, values)
+
+
+def _store_daily(school_pk, day, values):
+    from .models import DailyCounters
+
+    return _upsert(DailyCounters, {'school_id': school_pk, 'date': day}, values)
+
+
+def _upsert(model, lookup, values):
+    if model.objects.filter(**lookup).update(updated_at=timezone.now(), **values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **values)
+    except IntegrityError:
+        # Created concurrently (or the school is gone)
+        model.objects.filter(**lookup).update(updated_at=timezone.now(), **values)
+
+
+# --- Reads ---
+
+def snapshot(school_pk, day=None):
+    """
+    All counters of a school as a dict: one row from SchoolCounters plus the
+    DailyCounters row of `day` (default: today). Missing rows are recounted
+    and stored on first read.
+    """
+    from .models import DailyCounters, SchoolCounters
+
+    day = day or timezone.localdate()
+    result = {name: 0 for name in SCHOOL_COUNTERS + DAILY_COUNTERS}
+    if school_pk is None:
+        return result
+
+    row = SchoolCounters.objects.filter(school_id=school_pk).values(*SCHOOL_COUNTERS).first()
+    if row is None:
+        row = compute(school_pk)
+        _store_school(school_pk, row)
+    result.update(row)
+
+    daily = DailyCounters.objects.filter(school_id=school_pk, date=day).values(*DAILY_COUNTERS).first()
+    if daily is None:
+        daily = compute_daily(school_pk, day)
+        _store_daily(school_pk, day, daily)
+    result.update(daily)
+    return result
+
+
+# --- Reconciliation ---
+
+def reconcile(school_pk, days=(), dry_run=False):
+    """
+    Recount a school's counters (and the DailyCounters of `days`) and fix
+    the stored rows. Returns the drift found as {counter: (stored, actual)}.
+    """
+    from .models import DailyCounters, SchoolCounters
+
+    drift = {}
+    actual = compute(school_pk)
+    stored = SchoolCounters.objects.filter(school_id=school_pk).values(*SCHOOL_COUNTERS).first()
+    if stored is not None:
+        drift.update({
+            name: (stored[name], value) for name, value in actual.items() if stored[name] != value
+        })
+    if not dry_run:
+        _store_school(school_pk, actual, reconciled=True)
+
+    for day in days:
+        actual = compute_daily(school_pk, day)
+        stored = DailyCounters.objects.filter(school_id=school_pk, date=day).values(*DAILY_COUNTERS).first()
+        if stored is not None:
+            drift.update({
+                f'{day}:{name}': (stored[name], value)
+                for name, value in actual.items() if stored[name] != value
+            })
+        if not dry_run:
+            _store_daily(school_pk, day, actual)
+    return drift
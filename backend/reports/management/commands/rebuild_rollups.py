@@ -0,0 +1,32 @@
+"""
+Management command to recompute the collection/invoicing rollups from receipts and invoices.
+Run with: python manage.py rebuild_rollups --school SCH-...
+"""
+from django.core.management.base import BaseCommand
+
+from reports import rollups
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Recomputes DailyCollection/MonthlyInvoicing rows from receipts, invoices and fee breakups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='School ID (e.g. SCH-...) to rebuild; all schools if omitted',
+        )
+
+    def handle(self, *args, **options):
+        schools = School.objects.order_by('id')
+        if options.get('school'):
+            schools = schools.filter(school_id=options['school'])
+
+        for school in schools.only('id', 'school_id'):
+            collection_rows, invoicing_rows = rollups.rebuild(school.pk)
+            self.stdout.write(
+                f'  {school.school_id}: {collection_rows} collection row(s), {invoicing_rows} invoicing row(s)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt.'))
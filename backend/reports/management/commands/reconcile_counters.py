@@ -0,0 +1,56 @@
+"""
+Management command to recount the dashboard counters and correct drift.
+Run with: python manage.py reconcile_counters --days 7
+"""
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reports import counters
+from schools.models import School
+
+
+class Command(BaseCommand):
+    help = 'Recomputes SchoolCounters/DailyCounters from the source tables and fixes any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--school',
+            type=str,
+            help='School ID (e.g. SCH-...) to reconcile; all schools if omitted',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Number of most recent days (including today) of daily attendance counters to reconcile',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drift without fixing it',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options.get('dry_run', False)
+        if dry_run:
+            self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
+
+        schools = School.objects.order_by('id')
+        if options.get('school'):
+            schools = schools.filter(school_id=options['school'])
+
+        today = timezone.localdate()
+        days = [today - datetime.timedelta(days=offset) for offset in range(max(options['days'], 0))]
+
+        drifted = 0
+        for school in schools.only('id', 'school_id'):
+            drift = counters.reconcile(school.pk, days=days, dry_run=dry_run)
+            if drift:
+                drifted += 1
+                self.stdout.write(self.style.WARNING(f'  {school.school_id}: {len(drift)} counter(s) off'))
+                for name, (stored, actual) in sorted(drift.items()):
+                    self.stdout.write(f'    {name}: {stored} -> {actual}')
+
+        self.stdout.write(self.style.SUCCESS(f'Counters reconciled ({drifted} school(s) had drift).'))
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('schools', '0010_school_geofence_radius'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SchoolCounters',
+            fields=[
+                ('school', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to='schools.school')),
+                ('active_students', models.IntegerField(default=0)),
+                ('staff', models.IntegerField(default=0)),
+                ('pending_invoices', models.IntegerField(default=0)),
+                ('pending_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('pending_leaves', models.IntegerField(default=0)),
+                ('enquiries_total', models.IntegerField(default=0)),
+                ('enquiries_pending', models.IntegerField(default=0)),
+                ('enquiries_in_progress', models.IntegerField(default=0)),
+                ('enquiries_approved', models.IntegerField(default=0)),
+                ('enquiries_rejected', models.IntegerField(default=0)),
+                ('enquiries_converted', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'School counters',
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCounters',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('students_present', models.IntegerField(default=0)),
+                ('students_absent', models.IntegerField(default=0)),
+                ('staff_marked', models.IntegerField(default=0)),
+                ('staff_present', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_counters', to='schools.school')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily counters',
+                'unique_together': {('school', 'date')},
+            },
+        ),
+    ]
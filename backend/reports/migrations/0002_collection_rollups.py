@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-17 08:06
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def _month(value):
+    return (timezone.localtime(value).date() if hasattr(value, 'hour') else value).replace(day=1)
+
+
+def backfill_rollups(apps, schema_editor):
+    Receipt = apps.get_model('finance', 'Receipt')
+    Invoice = apps.get_model('finance', 'Invoice')
+    StudentFeeBreakup = apps.get_model('finance', 'StudentFeeBreakup')
+    DailyCollection = apps.get_model('reports', 'DailyCollection')
+    MonthlyInvoicing = apps.get_model('reports', 'MonthlyInvoicing')
+
+    DailyCollection.objects.bulk_create([
+        DailyCollection(
+            school_id=row['school_id'], date=row['date'], mode=row['mode'], collector_id=row['created_by_id'],
+            amount=row['amount'], receipts=row['receipts'],
+        )
+        for row in Receipt.objects.values('school_id', 'date', 'mode', 'created_by_id').annotate(
+            amount=models.Sum('amount'), receipts=models.Count('id'),
+        ).order_by()
+    ], batch_size=500)
+
+    rows = {}
+    invoices = Invoice.objects.annotate(month=TruncMonth('created_at')).values(
+        'school_id', 'academic_year_id', 'month'
+    ).annotate(amount=models.Sum('total_amount'), invoices=models.Count('id')).order_by()
+    for row in invoices:
+        key = (row['school_id'], row['academic_year_id'], None, _month(row['month']))
+        entry = rows.setdefault(key, {'amount': 0, 'invoices': 0})
+        entry['amount'] += row['amount'] or 0
+        entry['invoices'] += row['invoices']
+    breakups = StudentFeeBreakup.objects.annotate(month=TruncMonth('invoice__created_at')).values(
+        'invoice__school_id', 'invoice__academic_year_id', 'head_id', 'month'
+    ).annotate(amount=models.Sum('amount')).order_by()
+    for row in breakups:
+        key = (row['invoice__school_id'], row['invoice__academic_year_id'], row['head_id'], _month(row['month']))
+        rows.setdefault(key, {'amount': 0, 'invoices': 0})['amount'] += row['amount'] or 0
+    MonthlyInvoicing.objects.bulk_create([
+        MonthlyInvoicing(
+            school_id=school_pk, academic_year_id=year_pk, category_id=category_pk, month=month, **values
+        )
+        for (school_pk, year_pk, category_pk, month), values in rows.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_student_ledger'),
+        ('reports', '0001_school_counters'),
+        ('schools', '0011_school_fee_allocation_strategy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollection',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('mode', models.CharField(max_length=50)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('receipts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collector', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_collections', to='schools.school')),
+            ],
+            options={
+                'unique_together': {('school', 'date', 'mode', 'collector')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyInvoicing',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('invoices', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('academic_year', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='schools.academicyear')),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='finance.feecategory')),
+                ('school', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_invoicing', to='schools.school')),
+            ],
+            options={
+                'verbose_name_plural': 'Monthly invoicing',
+                'unique_together': {('school', 'academic_year', 'category', 'month')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def merge_null_duplicates(apps, schema_editor):
+    """Fold rollup rows that only the NULL column told apart into one row each."""
+    merges = (
+        (apps.get_model('reports', 'DailyCollection'), ('school_id', 'date', 'mode'), 'collector', ('amount', 'receipts')),
+        (apps.get_model('reports', 'MonthlyInvoicing'), ('school_id', 'academic_year_id', 'month'), 'category',
+         ('amount', 'invoices')),
+    )
+    for model, fields, nullable, sums in merges:
+        rows = model.objects.filter(**{f'{nullable}__isnull': True})
+        duplicates = rows.values(*fields).annotate(rows=models.Count('id')).filter(rows__gt=1).order_by()
+        for group in duplicates:
+            group.pop('rows')
+            keep, *extra = rows.filter(**group).order_by('id')
+            for row in extra:
+                for name in sums:
+                    setattr(keep, name, getattr(keep, name) + getattr(row, name))
+            keep.save(update_fields=list(sums))
+            model.objects.filter(pk__in=[row.pk for row in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0014_breakup_discount_snapshot'),
+        ('reports', '0002_collection_rollups'),
+        ('schools', '0011_school_fee_allocation_strategy'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_null_duplicates, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='dailycollection',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyinvoicing',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycollection',
+            constraint=models.UniqueConstraint(fields=('school', 'date', 'mode', 'collector'), name='daily_collection_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailycollection',
+            constraint=models.UniqueConstraint(condition=models.Q(('collector__isnull', True)), fields=('school', 'date', 'mode'), name='daily_collection_no_collector_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyinvoicing',
+            constraint=models.UniqueConstraint(fields=('school', 'academic_year', 'category', 'month'), name='monthly_invoicing_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='monthlyinvoicing',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('school', 'academic_year', 'month'), name='monthly_invoicing_total_unique'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+# reports.counters.STAFF_MEMBER_ROLES at the time of this migration
+STAFF_MEMBER_ROLES = (
+    'TEACHER', 'SCHOOL_ADMIN', 'PRINCIPAL', 'OFFICE_STAFF', 'ACCOUNTANT', 'CLEANING_STAFF', 'NON_TEACHING', 'DRIVER',
+)
+
+
+def count_staff_members(apps, schema_editor):
+    """Fill the new counter on existing rows (rows created later are recounted anyway)."""
+    SchoolCounters = apps.get_model('reports', 'SchoolCounters')
+    CoreUser = apps.get_model(settings.AUTH_USER_MODEL)
+    totals = CoreUser.objects.filter(role__in=STAFF_MEMBER_ROLES, school__isnull=False).values('school_id').annotate(
+        total=models.Count('pk')
+    ).order_by()
+    for row in totals:
+        SchoolCounters.objects.filter(school_id=row['school_id']).update(staff_members=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0003_null_safe_rollup_constraints'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='schoolcounters',
+            name='staff_members',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_staff_members, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,134 @@
 from django.db import models
+from schools.models import School
 
-# Create your models here.
+
+class SchoolCounters(models.Model):
+    """
+    Running totals behind the dashboards, one row per school.
+
+    Kept up to date with F() expressions from save/delete hooks (see
+    reports.counters), so a dashboard is a single-row read however big the
+    school is. reconcile_counters recomputes them from scratch.
+    """
+    # Only ever written with queryset.update(); nothing worth diffing or auditing
+    track_changes = False
+
+    school = models.OneToOneField(School, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+
+    active_students = models.IntegerField(default=0)
+    staff = models.IntegerField(default=0)
+    staff_members = models.IntegerField(default=0)
+    pending_invoices = models.IntegerField(default=0)
+    pending_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    pending_leaves = models.IntegerField(default=0)
+
+    enquiries_total = models.IntegerField(default=0)
+    enquiries_pending = models.IntegerField(default=0)
+    enquiries_in_progress = models.IntegerField(default=0)
+    enquiries_approved = models.IntegerField(default=0)
+    enquiries_rejected = models.IntegerField(default=0)
+    enquiries_converted = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'School counters'
+
+    def __str__(self):
+        return f"Counters for {self.school_id}"
+
+
+class DailyCounters(models.Model):
+    """Per-day attendance totals of a school (present today and friends)."""
+    track_changes = False
+
+    id = models.AutoField(primary_key=True)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='daily_counters')
+    date = models.DateField()
+
+    students_present = models.IntegerField(default=0)
+    students_absent = models.IntegerField(default=0)
+    staff_marked = models.IntegerField(default=0)
+    staff_present = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('school', 'date')
+        verbose_name_plural = 'Daily counters'
+
+    def __str__(self):
+        return f"{self.school_id} @ {self.date}"
+
+
+class DailyCollection(models.Model):
+    """
+    Money received per (school, day, payment mode, collector).
+
+    Incremented by reports.rollups as receipts are written, so collection
+    trends, mode splits and collector totals are sums over a few rows per
+    day instead of over every receipt.
+    """
+    track_changes = False
+
+    id = models.AutoField(primary_key=True)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='daily_collections')
+    date = models.DateField()
+    mode = models.CharField(max_length=50)
+    collector = models.ForeignKey('core.CoreUser', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    receipts = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['school', 'date', 'mode', 'collector'], name='daily_collection_unique'),
+            # NULLs are distinct in unique indexes: receipts without a collector need their own
+            models.UniqueConstraint(
+                fields=['school', 'date', 'mode'], condition=models.Q(collector__isnull=True),
+                name='daily_collection_no_collector_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.school_id} @ {self.date} {self.mode}: {self.amount}"
+
+
+class MonthlyInvoicing(models.Model):
+    """
+    Amount invoiced per (school, academic year, fee category, month).
+
+    Rows with a category carry fee-head amounts (breakups); the row without
+    one carries whole invoice totals (round-off included) and counts.
+    """
+    track_changes = False
+
+    id = models.AutoField(primary_key=True)
+    school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='monthly_invoicing')
+    academic_year = models.ForeignKey('schools.AcademicYear', on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey('finance.FeeCategory', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    month = models.DateField(help_text="First day of the month")
+
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    invoices = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['school', 'academic_year', 'category', 'month'], name='monthly_invoicing_unique',
+            ),
+            # The invoice-total row (no category) must be unique as well
+            models.UniqueConstraint(
+                fields=['school', 'academic_year', 'month'], condition=models.Q(category__isnull=True),
+                name='monthly_invoicing_total_unique',
+            ),
+        ]
+        verbose_name_plural = 'Monthly invoicing'
+
+    def __str__(self):
+        return f"{self.school_id} {self.month:%Y-%m} {self.category_id or 'total'}: {self.amount}"
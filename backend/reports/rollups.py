@@ -0,0 +1,349 @@
+"""
+Collection and invoicing rollups.
+
+Two small tables summarise the finance history of a school:
+
+    DailyCollection    (school, date, mode, collector) -> amount, receipts
+    MonthlyInvoicing   (school, academic year, category, month) -> amount, invoices
+
+Receipts, invoices and fee breakups add their contribution when written
+(post_save/post_delete, like reports.counters) with an F() update of one
+row inside the caller's transaction; the row is created on first use.
+Analytics then sum a few rows per day or month, however long the history.
+
+Writes that bypass signals must report themselves: record_created() after
+bulk_create() of invoices/breakups/receipts. rebuild() recomputes a
+school's rollups from the source tables (rebuild_rollups command).
+
+Usage:
+    rollups.record_created(invoices)            # after Invoice.objects.bulk_create(invoices)
+    rollups.collections(school_pk, date_from, date_to, period='month')
+"""
+import copy
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncYear
+from django.utils import timezone
+
+# Receipts in this mode settle dues without money changing hands
+WAIVER_MODE = 'WAIVER'
+
+# Receipt fields its DailyCollection row and amount depend on
+RECEIPT_FIELDS = {'school', 'amount', 'mode', 'created_by'}
+
+PERIODS = {'day': TruncDay, 'month': TruncMonth, 'year': TruncYear}
+
+
+def _month(value):
+    value = timezone.localtime(value).date() if hasattr(value, 'hour') else value
+    return value.replace(day=1)
+
+
+# --- Contributions: row -> {(model, lookup items): {field: amount}} ---
+
+def _receipt(row):
+    key = ('collection', row.school_id, row.date, row.mode, row.created_by_id)
+    yield key, {'amount': Decimal(str(row.amount or 0)), 'receipts': 1}
+
+
+def _invoice(row):
+    key = ('invoicing', row.school_id, row.academic_year_id, None, _month(row.created_at))
+    yield key, {'amount': Decimal(str(row.total_amount or 0)), 'invoices': 1}
+
+
+def _breakup(row, invoice):
+    key = ('invoicing', invoice.school_id, invoice.academic_year_id, row.head_id, _month(invoice.created_at))
+    yield key, {'amount': Decimal(str(row.amount or 0))}
+
+
+def _contributions(instance):
+    from finance.models import Invoice, Receipt, StudentFeeBreakup
+
+    if isinstance(instance, Receipt):
+        return _receipt(instance)
+    if isinstance(instance, Invoice):
+        return _invoice(instance)
+    if isinstance(instance, StudentFeeBreakup):
+        return _breakup(instance, instance.invoice)
+    return ()
+
+
+def _contribute(deltas, instance, sign=1):
+    for key, values in _contributions(instance):
+        for name, amount in values.items():
+            deltas[key][name] += sign * amount
+
+
+# --- Writes ---
+
+def _target(key):
+    """(model, lookup) of the rollup row a contribution key points at."""
+    from .models import DailyCollection, MonthlyInvoicing
+
+    if key[0] == 'collection':
+        return DailyCollection, dict(zip(('school_id', 'date', 'mode', 'collector_id'), key[1:]))
+    return MonthlyInvoicing, dict(zip(('school_id', 'academic_year_id', 'category_id', 'month'), key[1:]))
+
+
+def _sort_key(item):
+    return tuple(str(part) for part in item[0])
+
+
+def apply(deltas):
+    """Add `deltas` ({key: {field: amount}}) to the rollup rows, creating missing ones."""
+    # Fixed order, so two transactions never lock the same rows the other way round
+    for key, values in sorted(deltas.items(), key=_sort_key):
+        if not any(values.values()):
+            continue
+        model, lookup = _target(key)
+        changes = {name: F(name) + amount for name, amount in values.items() if amount}
+        if model.objects.filter(**lookup).update(updated_at=timezone.now(), **changes):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(**lookup, **values)
+        except IntegrityError:
+            # Created concurrently
+            model.objects.filter(**lookup).update(updated_at=timezone.now(), **changes)
+
+
+def _moved_receipt(deltas, instance, changes):
+    """Move an edited receipt's contribution from its old key and amount to the new ones."""
+    previous = copy.copy(instance)
+    for name, (old, _) in changes.items():
+        if name in RECEIPT_FIELDS:
+            setattr(previous, instance._meta.get_field(name).attname, old)
+    _contribute(deltas, previous, sign=-1)
+    _contribute(deltas, instance)
+
+
+def record_save(instance, created):
+    from finance.models import Invoice, Receipt, StudentFeeBreakup
+    from core import tracking
+
+    deltas = defaultdict(lambda: defaultdict(int))
+    if created:
+        _contribute(deltas, instance)
+    elif isinstance(instance, Receipt):
+        changes = tracking.saved_changes(instance) or {}
+        if RECEIPT_FIELDS.intersection(changes):
+            _moved_receipt(deltas, instance, changes)
+    elif isinstance(instance, (Invoice, StudentFeeBreakup)):
+        # Invoices and breakups only move by their amounts
+        changes = tracking.saved_changes(instance) or {}
+        field = 'total_amount' if isinstance(instance, Invoice) else 'amount'
+        if field in changes:
+            old, new = changes[field]
+            for key, _ in _contributions(instance):
+                deltas[key]['amount'] += Decimal(str(new or 0)) - Decimal(str(old or 0))
+    apply(deltas)
+
+
+def record_delete(instance):
+    from finance.models import Invoice, StudentFeeBreakup
+
+    if isinstance(instance, StudentFeeBreakup):
+        try:
+            instance.invoice
+        except Invoice.DoesNotExist:
+            return  # Invoice already gone: nothing to attribute it to (rebuild_rollups recounts)
+    deltas = defaultdict(lambda: defaultdict(int))
+    _contribute(deltas, instance, sign=-1)
+    apply(deltas)
+
+
+def record_created(objs):
+    """Count invoices, breakups or receipts inserted with bulk_create()."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for obj in objs:
+        _contribute(deltas, obj)
+
+    # A generation run mostly opens new rows: insert those in one go per table
+    by_model = defaultdict(list)
+    for key in deltas:
+        by_model[_target(key)[0]].append(key)
+    existing = {}
+    for model, keys in by_model.items():
+        fields = list(_target(keys[0])[1])
+        rows = model.objects.filter(school_id__in={key[1] for key in keys}).filter(
+            **{f'{fields[1]}__in': {key[2] for key in keys}}
+        ).values_list(*fields)
+        existing[model] = {(model,) + tuple(row) for row in rows}
+
+    try:
+        with transaction.atomic():
+            for model, keys in by_model.items():
+                model.objects.bulk_create([
+                    model(**_target(key)[1], **deltas[key])
+                    for key in sorted(keys, key=str)
+                    if (model,) + tuple(key[1:]) not in existing[model]
+                ], batch_size=500)
+    except IntegrityError:
+        # Some were created concurrently: fall back to row by row
+        apply(deltas)
+        return
+    apply({
+        key: values for key, values in deltas.items()
+        if (_target(key)[0],) + tuple(key[1:]) in existing[_target(key)[0]]
+    })
+
+
+# --- Reads ---
+
+def _collection_rows(school_pk, date_from=None, date_to=None, mode=None):
+    from .models import DailyCollection
+
+    rows = DailyCollection.objects.filter(school_id=school_pk)
+    if date_from:
+        rows = rows.filter(date__gte=date_from)
+    if date_to:
+        rows = rows.filter(date__lte=date_to)
+    if mode:
+        rows = rows.filter(mode=mode)
+    return rows
+
+
+def collection_totals(school_pk, date_from=None, date_to=None, mode=None):
+    """
+    {'amount', 'receipts'} of all receipts in the range, plus the money
+    actually collected ('collected', 'collected_receipts') and 'waived'.
+    """
+    totals = _collection_rows(school_pk, date_from, date_to, mode).aggregate(
+        all_amount=Sum('amount'),
+        all_receipts=Sum('receipts'),
+        collected=Sum('amount', filter=~Q(mode=WAIVER_MODE)),
+        collected_receipts=Sum('receipts', filter=~Q(mode=WAIVER_MODE)),
+        waived=Sum('amount', filter=Q(mode=WAIVER_MODE)),
+    )
+    return {
+        'amount': totals['all_amount'] or Decimal('0'),
+        'receipts': totals['all_receipts'] or 0,
+        'collected': totals['collected'] or Decimal('0'),
+        'collected_receipts': totals['collected_receipts'] or 0,
+        'waived': totals['waived'] or Decimal('0'),
+    }
+
+
+def collections(school_pk, date_from=None, date_to=None, period='day', mode=None):
+    """
+    Collection trend plus mode and collector splits from DailyCollection.
+    Waivers are reported apart and left out of the collected totals.
+    """
+    rows = _collection_rows(school_pk, date_from, date_to, mode)
+    money = rows.exclude(mode=WAIVER_MODE)
+
+    totals = collection_totals(school_pk, date_from, date_to, mode)
+    trunc = PERIODS.get(period, TruncDay)
+    sums = {'total_amount': Sum('amount'), 'total_receipts': Sum('receipts')}
+    trend = money.annotate(period=trunc('date')).values('period').annotate(**sums).order_by('period')
+    by_mode = rows.values('mode').annotate(**sums).order_by('-total_amount')
+    by_collector = money.values(
+        'collector_id', 'collector__first_name', 'collector__last_name', 'collector__username'
+    ).annotate(**sums).order_by('-total_amount')
+
+    return {
+        'collected': totals['collected'],
+        'receipts': totals['collected_receipts'],
+        'waived': totals['waived'],
+        'trend': [
+            {'period': row['period'], 'amount': row['total_amount'], 'receipts': row['total_receipts']}
+            for row in trend
+        ],
+        'by_mode': [
+            {'mode': row['mode'], 'amount': row['total_amount'], 'receipts': row['total_receipts']}
+            for row in by_mode
+        ],
+        'by_collector': [
+            {
+                'collector_id': row['collector_id'],
+                'name': (
+                    f"{row['collector__first_name'] or ''} {row['collector__last_name'] or ''}".strip()
+                    or row['collector__username'] or 'Unknown'
+                ),
+                'amount': row['total_amount'],
+                'receipts': row['total_receipts'],
+            }
+            for row in by_collector
+        ],
+    }
+
+
+def invoicing(school_pk, academic_year=None, month_from=None, month_to=None):
+    """Invoiced totals by month and by fee category from MonthlyInvoicing."""
+    from .models import MonthlyInvoicing
+
+    rows = MonthlyInvoicing.objects.filter(school_id=school_pk)
+    if academic_year:
+        rows = rows.filter(academic_year_id=academic_year)
+    if month_from:
+        rows = rows.filter(month__gte=_month(month_from))
+    if month_to:
+        rows = rows.filter(month__lte=_month(month_to))
+
+    totals = rows.filter(category__isnull=True)
+    overall = totals.aggregate(total_amount=Sum('amount'), total_invoices=Sum('invoices'))
+    return {
+        'invoiced': overall['total_amount'] or Decimal('0'),
+        'invoices': overall['total_invoices'] or 0,
+        'by_month': [
+            {'month': row['month'], 'amount': row['total_amount'], 'invoices': row['total_invoices']}
+            for row in totals.values('month').annotate(
+                total_amount=Sum('amount'), total_invoices=Sum('invoices'),
+            ).order_by('month')
+        ],
+        'by_category': [
+            {'category_id': row['category_id'], 'category__name': row['category__name'], 'amount': row['total_amount']}
+            for row in rows.filter(category__isnull=False).values('category_id', 'category__name')
+            .annotate(total_amount=Sum('amount')).order_by('-total_amount')
+        ],
+    }
+
+
+# --- Rebuild ---
+
+def rebuild(school_pk):
+    """Recompute a school's rollups from receipts, invoices and breakups."""
+    from finance.models import Invoice, Receipt, StudentFeeBreakup
+    from .models import DailyCollection, MonthlyInvoicing
+
+    collections_rows = [
+        DailyCollection(
+            school_id=school_pk, date=row['date'], mode=row['mode'], collector_id=row['created_by_id'],
+            amount=row['amount'], receipts=row['receipts'],
+        )
+        for row in Receipt.objects.filter(school_id=school_pk).values('date', 'mode', 'created_by_id').annotate(
+            amount=Sum('amount'), receipts=Count('id'),
+        ).order_by()
+    ]
+
+    invoicing_rows = defaultdict(lambda: {'amount': Decimal('0'), 'invoices': 0})
+    invoices = Invoice.objects.filter(school_id=school_pk).annotate(month=TruncMonth('created_at'))
+    for row in invoices.values('academic_year_id', 'month').annotate(
+        amount=Sum('total_amount'), invoices=Count('id'),
+    ).order_by():
+        key = (row['academic_year_id'], None, _month(row['month']))
+        invoicing_rows[key]['amount'] += row['amount'] or 0
+        invoicing_rows[key]['invoices'] += row['invoices']
+    breakups = StudentFeeBreakup.objects.filter(invoice__school_id=school_pk).annotate(
+        month=TruncMonth('invoice__created_at')
+    )
+    for row in breakups.values('invoice__academic_year_id', 'head_id', 'month').annotate(
+        amount=Sum('amount'),
+    ).order_by():
+        key = (row['invoice__academic_year_id'], row['head_id'], _month(row['month']))
+        invoicing_rows[key]['amount'] += row['amount'] or 0
+
+    with transaction.atomic():
+        DailyCollection.objects.filter(school_id=school_pk).delete()
+        MonthlyInvoicing.objects.filter(school_id=school_pk).delete()
+        DailyCollection.objects.bulk_create(collections_rows, batch_size=500)
+        MonthlyInvoicing.objects.bulk_create([
+            MonthlyInvoicing(
+                school_id=school_pk, academic_year_id=year_pk, category_id=category_pk, month=month, **values
+            )
+            for (year_pk, category_pk, month), values in invoicing_rows.items()
+        ], batch_size=500)
+    return len(collections_rows), len(invoicing_rows)
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+
+from . import counters, rollups
+
+
+def update_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    # Fixture loads (raw) are not counted; run reconcile_counters afterwards
+    if raw:
+        return
+    counters.record_save(instance, created)
+
+
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.record_delete(instance)
+
+
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.record_save(instance, created)
+
+
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_delete(instance)
+
+
+def connect():
+    from finance.models import Invoice, Receipt, StudentFeeBreakup
+
+    for model in counters.get_specs():
+        post_save.connect(update_counters_on_save, sender=model, dispatch_uid=f'counters_save_{model._meta.label}')
+        post_delete.connect(update_counters_on_delete, sender=model, dispatch_uid=f'counters_delete_{model._meta.label}')
+    for model in (Invoice, Receipt, StudentFeeBreakup):
+        post_save.connect(update_rollups_on_save, sender=model, dispatch_uid=f'rollups_save_{model._meta.label}')
+        post_delete.connect(update_rollups_on_delete, sender=model, dispatch_uid=f'rollups_delete_{model._meta.label}')
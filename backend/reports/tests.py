@@ -1,3 +1,312 @@
-from django.test import TestCase
+"""
+Tests for the Reports App (dashboard counters and analytics).
+"""
+import pytest
+from datetime import date
+from decimal import Decimal
+from rest_framework import status
 
-# Create your tests here.
+
+@pytest.mark.django_db
+class TestSchoolCounters:
+    """Tests for the per-school counters kept by reports.counters."""
+
+    def _setup(self):
+        from schools.models import School, AcademicYear
+        from reports import counters
+
+        school = School.objects.create(name="Counter School")
+        year = AcademicYear.objects.create(
+            school=school, name="2024-25", start_date=date(2024, 4, 1), end_date=date(2025, 3, 31)
+        )
+        counters.snapshot(school.pk)  # Creates the rows
+        return school, year
+
+    def _student(self, school, year, roll="CNT001"):
+        from students.models import Student
+        return Student.objects.create(
+            school=school, first_name="Count", last_name="Kid", enrollment_number=roll,
+            date_of_birth=date(2012, 1, 1), gender="M", academic_year=year
+        )
+
+    def _invoice(self, school, year, student, amount="1000.00"):
+        from finance.models import Invoice
+        return Invoice.objects.create(
+            school=school, student=student, academic_year=year,
+            total_amount=Decimal(amount), due_date=date(2024, 6, 15)
+        )
+
+    def test_counters_follow_saves_and_deletes(self):
+        from reports import counters
+        from finance.models import Invoice
+        from students.models import Student
+
+        school, year = self._setup()
+        first = self._student(school, year)
+        second = self._student(school, year, roll="CNT002")
+        invoice = self._invoice(school, year, first)
+        self._invoice(school, year, second, amount="500.00")
+
+        stats = counters.snapshot(school.pk)
+        assert stats['active_students'] == 2
+        assert stats['pending_invoices'] == 2
+        assert stats['pending_amount'] == Decimal("1500.00")
+
+        invoice = Invoice.objects.get(pk=invoice.pk)
+        invoice.paid_amount = Decimal("400.00")  # PENDING -> PARTIAL
+        invoice.save()
+        student = Student.objects.get(pk=second.pk)
+        student.is_active = False
+        student.save()
+        first.delete()
+
+        stats = counters.snapshot(school.pk)
+        assert stats['active_students'] == 0
+        assert stats['pending_invoices'] == 1
+        assert stats['pending_amount'] == Decimal("500.00")
+        assert counters.reconcile(school.pk) == {}
+
+    def test_staff_members_count_every_staff_role(self, django_user_model):
+        from reports import counters
+
+        school, _ = self._setup()
+        counters.snapshot(school.pk)
+        teacher = django_user_model.objects.create_user(username="cnt-teacher", password=None, school=school, role="TEACHER")
+        driver = django_user_model.objects.create_user(username="cnt-driver", password=None, school=school, role="DRIVER")
+        django_user_model.objects.create_user(username="cnt-parent", password=None, school=school, role="PARENT")
+
+        stats = counters.snapshot(school.pk)
+        assert (stats['staff'], stats['staff_members']) == (1, 2)
+
+        teacher = django_user_model.objects.get(pk=teacher.pk)
+        teacher.role = "ACCOUNTANT"
+        teacher.save()
+        driver.delete()
+        stats = counters.snapshot(school.pk)
+        assert (stats['staff'], stats['staff_members']) == (0, 1)
+        assert counters.reconcile(school.pk) == {}
+
+    def test_snapshot_is_constant_cost(self, django_assert_num_queries):
+        from reports import counters
+
+        school, year = self._setup()
+        for roll in range(5):
+            self._student(school, year, roll=f"CNT{roll:03d}")
+
+        with django_assert_num_queries(2):  # SchoolCounters row + today's DailyCounters row
+            stats = counters.snapshot(school.pk)
+        assert stats['active_students'] == 5
+
+    def test_attendance_updates_daily_row(self):
+        from reports import counters
+        from students.models import Attendance
+
+        school, year = self._setup()
+        student = self._student(school, year)
+        today = date.today()
+        counters.snapshot(school.pk, today)
+
+        attendance = Attendance.objects.create(school=school, student=student, date=today, status='A')
+        attendance = Attendance.objects.get(pk=attendance.pk)
+        attendance.status = 'P'
+        attendance.save()
+
+        stats = counters.snapshot(school.pk, today)
+        assert stats['students_present'] == 1
+        assert stats['students_absent'] == 0
+
+    def test_bulk_create_is_recorded(self):
+        from reports import counters
+        from finance.models import Invoice
+        from core.ids import assign
+
+        school, year = self._setup()
+        student = self._student(school, year)
+        invoices = [
+            Invoice(school=school, student=student, academic_year=year,
+                    total_amount=Decimal("100.00"), due_date=date(2024, 6, 15))
+            for _ in range(3)
+        ]
+        Invoice.objects.bulk_create(assign(invoices, 'invoice_id', 'INV'))
+        counters.record_created(invoices)
+
+        assert counters.snapshot(school.pk)['pending_amount'] == Decimal("300.00")
+
+    def test_reconcile_corrects_drift(self):
+        from django.core.management import call_command
+        from reports import counters
+        from reports.models import SchoolCounters
+
+        school, year = self._setup()
+        self._student(school, year)
+        SchoolCounters.objects.filter(school=school).update(active_students=42)
+
+        call_command('reconcile_counters', '--dry-run', '--school', school.school_id)
+        assert SchoolCounters.objects.get(school=school).active_students == 42
+
+        drift = counters.reconcile(school.pk)
+        assert drift == {'active_students': (42, 1)}
+        row = SchoolCounters.objects.get(school=school)
+        assert row.active_students == 1
+        assert row.reconciled_at is not None
+
+    def test_analytics_reads_counters(self, authenticated_client):
+        from reports.models import SchoolCounters
+        from reports import counters
+
+        counters.snapshot(authenticated_client.school.pk)
+        SchoolCounters.objects.filter(school=authenticated_client.school).update(active_students=7)
+
+        response = authenticated_client.get("/api/reports/attendance/")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['students']['total'] == 7
+
+
+@pytest.mark.django_db
+class TestCollectionRollups:
+    """Tests for the collection/invoicing rollups kept by reports.rollups."""
+
+    def _rows(self, school):
+        from reports.models import DailyCollection, MonthlyInvoicing
+        return (
+            sorted(
+                DailyCollection.objects.filter(school=school).values_list("mode", "collector_id", "amount", "receipts"),
+                key=str,
+            ),
+            sorted(
+                MonthlyInvoicing.objects.filter(school=school).values_list("category_id", "amount", "invoices"),
+                key=str,
+            ),
+        )
+
+    def test_receipts_and_invoices_are_rolled_up(self, authenticated_client):
+        from finance.services import FeeService
+        from finance.tests import _invoice_with_heads
+        from reports import rollups
+
+        school = authenticated_client.school
+        user = authenticated_client.user
+        invoice = _invoice_with_heads(school=school)
+        FeeService.process_payment(invoice, Decimal("1000.00"), "CASH", user)
+        FeeService.process_payment(invoice, Decimal("500.00"), "UPI", user)
+        FeeService.process_payment(invoice, Decimal("250.00"), "CASH", None)
+        FeeService.process_payment(invoice, Decimal("100.00"), "WAIVER", user)
+
+        stats = rollups.collections(school.pk)
+        assert stats["collected"] == Decimal("1750.00")
+        assert stats["receipts"] == 3
+        assert stats["waived"] == Decimal("100.00")
+        assert {row["mode"]: row["amount"] for row in stats["by_mode"]} == {
+            "CASH": Decimal("1250.00"), "UPI": Decimal("500.00"), "WAIVER": Decimal("100.00")
+        }
+        assert [row["amount"] for row in stats["by_collector"]] == [Decimal("1500.00"), Decimal("250.00")]
+
+        invoicing = rollups.invoicing(school.pk)
+        assert invoicing["invoiced"] == Decimal("7500.00")
+        assert invoicing["invoices"] == 1
+
+        # Rebuilding from the source tables gives the same rows
+        before = self._rows(school)
+        rollups.rebuild(school.pk)
+        assert self._rows(school) == before
+
+    def test_edited_receipts_move_their_contribution(self, authenticated_client):
+        from finance.models import Receipt
+        from finance.services import FeeService
+        from finance.tests import _invoice_with_heads
+        from reports import rollups
+
+        school = authenticated_client.school
+        invoice = _invoice_with_heads(school=school)
+        receipt = FeeService.process_payment(invoice, Decimal("1000.00"), "CASH", authenticated_client.user)
+
+        response = authenticated_client.patch(
+            f"/api/finance/receipts/{receipt.pk}/", {"amount": "800.00", "mode": "UPI"}, format="json"
+        )
+        assert response.status_code == 200
+        receipt = Receipt.objects.get(pk=receipt.pk)
+        receipt.created_by = None
+        receipt.save()
+
+        stats = rollups.collections(school.pk)
+        assert stats["collected"] == Decimal("800.00")
+        assert stats["receipts"] == 1
+        assert {row["mode"]: row["amount"] for row in stats["by_mode"]} == {"CASH": 0, "UPI": Decimal("800.00")}
+        before = self._rows(school)
+        rollups.rebuild(school.pk)
+        assert [row for row in before[0] if row[3]] == self._rows(school)[0]
+
+    def test_rows_without_collector_or_category_are_unique(self):
+        from django.db import IntegrityError, transaction
+        from finance.tests import _invoice_with_heads
+        from reports.models import DailyCollection, MonthlyInvoicing
+
+        invoice = _invoice_with_heads()
+        school = invoice.school
+        DailyCollection.objects.create(school=school, date=date(2024, 6, 1), mode="CASH", collector=None)
+        with pytest.raises(IntegrityError), transaction.atomic():
+            DailyCollection.objects.create(school=school, date=date(2024, 6, 1), mode="CASH", collector=None)
+
+        total = MonthlyInvoicing.objects.get(school=school, category=None)
+        with pytest.raises(IntegrityError), transaction.atomic():
+            MonthlyInvoicing.objects.create(
+                school=school, academic_year_id=total.academic_year_id, category=None, month=total.month
+            )
+
+    def test_bulk_generation_rolls_up_by_category(self):
+        from finance.services import FeeService
+        from finance.tests import TestBulkFeeGeneration
+        from reports import rollups
+
+        school, year = TestBulkFeeGeneration()._school(students=4)
+        FeeService.generate_annual_fees(year, school)
+
+        invoicing = rollups.invoicing(school.pk, academic_year=year.pk)
+        assert invoicing["invoices"] == 4
+        assert invoicing["invoiced"] == Decimal("13281.00") * 2 + Decimal("15281.00") * 2
+        assert {row["category__name"]: row["amount"] for row in invoicing["by_category"]} == {
+            "Tuition": Decimal("44000.00"), "Lab": Decimal("4722.36"), "Books": Decimal("8400.00")
+        }
+
+    def test_analytics_cost_does_not_grow_with_history(self, authenticated_client, django_assert_max_num_queries):
+        from finance.services import FeeService
+        from finance.tests import _invoice_with_heads
+
+        invoice = _invoice_with_heads(school=authenticated_client.school)
+        for _ in range(15):
+            FeeService.process_payment(invoice, Decimal("100.00"), "CASH", authenticated_client.user)
+
+        # Auth (3) + invoicing (3) + overall and window totals + trend, modes, collectors:
+        # a fixed number of reads on the rollups, however many receipts
+        with django_assert_max_num_queries(11):
+            response = authenticated_client.get("/api/reports/finance/?period=day")
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["overview"]["total_collected"] == Decimal("1500.00")
+        assert response.data["overview"]["pending"] == Decimal("6000.00")
+        assert response.data["collections"]["trend"][0]["receipts"] == 15
+
+        response = authenticated_client.get("/api/finance/payment-history/?mode=CASH")
+        assert response.data["summary"] == {"total_receipts": 15, "total_collected": 1500.0}
+
+    def test_academic_year_scopes_collected_too(self, authenticated_client):
+        from schools.models import AcademicYear
+        from finance.models import Invoice
+        from finance.services import FeeService
+        from finance.tests import _invoice_with_heads
+
+        invoice = _invoice_with_heads(school=authenticated_client.school)
+        next_year = AcademicYear.objects.create(
+            school=invoice.school, name="2025-26", start_date=date(2025, 4, 1), end_date=date(2026, 3, 31)
+        )
+        later = Invoice.objects.create(
+            school=invoice.school, student=invoice.student, academic_year=next_year,
+            total_amount=Decimal("4000.00"), due_date=date(2025, 6, 15),
+        )
+        FeeService.process_payment(invoice, Decimal("1000.00"), "CASH", None)
+        FeeService.process_payment(later, Decimal("3000.00"), "CASH", None)
+
+        overview = authenticated_client.get(f"/api/reports/finance/?academic_year={next_year.pk}").data["overview"]
+        assert overview["total_invoiced"] == Decimal("4000.00")
+        assert overview["total_collected"] == Decimal("3000.00")
+        assert overview["pending"] == Decimal("1000.00")
+        assert overview["collection_rate"] == 75.0
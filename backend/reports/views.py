@@ -1,30 +1,30 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Count, Sum, Q
-from students.models import Student, Attendance
-from finance.models import Invoice, Receipt, Salary
-from staff.models import StaffAttendance
-from datetime import date
+from django.db.models import Count, Sum
+from students.models import Student
+from finance.models import StudentLedger
+from datetime import date, timedelta
+from decimal import Decimal
+from . import counters, rollups
 
 class AttendanceAnalyticsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        school_id = request.user.school.school_id
+        school_pk = request.user.school_id
         today = date.today()
         
-        # Student Attendance (Today)
-        total_students = Student.objects.filter(school__school_id=school_id, is_active=True).count()
-        present_today = Attendance.objects.filter(school__school_id=school_id, date=today, status='P').count()
-        absent_today = Attendance.objects.filter(school__school_id=school_id, date=today, status='A').count()
-        
-        # Staff Attendance (Today)
-        total_staff = StaffAttendance.objects.filter(school__school_id=school_id, date=today).count()
-        staff_present = StaffAttendance.objects.filter(school__school_id=school_id, date=today, status='PRESENT').count()
+        # Today's totals come from the counters rows (reports.counters)
+        stats = counters.snapshot(school_pk, today)
+        total_students = stats['active_students']
+        present_today = stats['students_present']
+        absent_today = stats['students_absent']
+        total_staff = stats['staff_marked']
+        staff_present = stats['staff_present']
         
         # Class-wise stats (Example)
-        class_stats = Student.objects.filter(school__school_id=school_id).values('current_class__name').annotate(
+        class_stats = Student.objects.for_school(school_pk).values('current_class__name').annotate(
             count=Count('id')
         )
 
@@ -44,24 +44,73 @@ class AttendanceAnalyticsView(APIView):
         })
 
 class FinanceAnalyticsView(APIView):
+    """
+    Collection and invoicing analytics, read from the rollup tables
+    (reports.rollups), so the cost does not grow with the school's history.
+
+    Query params:
+    - period: day, month (default) or year, for the collection trend
+    - date_from, date_to: trend/split range (default: last 30 days for day,
+      last 12 months for month, everything for year)
+    - academic_year: limit the overview and invoicing figures to one
+      academic year (collected and waived from that year's student ledgers)
+    """
     permission_classes = [IsAuthenticated]
-    
+
+    DEFAULT_WINDOW = {'day': 30, 'month': 365}
+
     def get(self, request):
-        school_id = request.user.school.school_id
-        
-        # Totals
-        total_invoiced = Invoice.objects.filter(school__school_id=school_id).aggregate(sum=Sum('total_amount'))['sum'] or 0
-        total_collected = Invoice.objects.filter(school__school_id=school_id).aggregate(sum=Sum('paid_amount'))['sum'] or 0
-        pending_dues = total_invoiced - total_collected
-        
-        # Categorized Fees
-        # Example aggregation logic
-        
+        school_pk = request.user.school_id
+        params = request.query_params
+        period = params.get('period', 'month')
+        if period not in rollups.PERIODS:
+            return Response({'error': 'period must be day, month or year'}, status=400)
+
+        date_to = params.get('date_to')
+        date_from = params.get('date_from')
+        if not date_from and period in self.DEFAULT_WINDOW:
+            date_from = date.today() - timedelta(days=self.DEFAULT_WINDOW[period])
+
+        # Totals (whole history, or one academic year)
+        academic_year = params.get('academic_year')
+        invoicing = rollups.invoicing(school_pk, academic_year=academic_year)
+        if academic_year:
+            # Receipts carry no academic year: the year's ledgers do
+            ledgers = StudentLedger.objects.filter(school_id=school_pk, academic_year_id=academic_year).aggregate(
+                collected=Sum('paid'), waived=Sum('waived'),
+            )
+            overall = {name: value or Decimal('0') for name, value in ledgers.items()}
+        else:
+            overall = rollups.collection_totals(school_pk)
+        total_invoiced = invoicing['invoiced']
+        total_collected = overall['collected']
+        total_waived = overall['waived']
+        pending_dues = total_invoiced - total_collected - total_waived
+
+        window = rollups.collections(school_pk, date_from, date_to, period=period)
+
         return Response({
             'overview': {
                 'total_invoiced': total_invoiced,
                 'total_collected': total_collected,
+                'total_waived': total_waived,
                 'pending': pending_dues,
                 'collection_rate': round((total_collected / total_invoiced * 100), 1) if total_invoiced else 0
-            }
+            },
+            'collections': {
+                'period': period,
+                'date_from': date_from,
+                'date_to': date_to,
+                'collected': window['collected'],
+                'receipts': window['receipts'],
+                'waived': window['waived'],
+                'trend': window['trend'],
+                'by_mode': window['by_mode'],
+                'by_collector': window['by_collector'],
+            },
+            'invoicing': {
+                'invoices': invoicing['invoices'],
+                'by_month': invoicing['by_month'],
+                'by_category': invoicing['by_category'],
+            },
         })
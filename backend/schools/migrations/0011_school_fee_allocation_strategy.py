@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0010_school_geofence_radius'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='fee_allocation_strategy',
+            field=models.CharField(choices=[('EQUAL', 'Equal split across heads'), ('TUITION_FIRST', 'Tuition first'), ('OLDEST_DUE_FIRST', 'Oldest due first'), ('TAX_PROPORTIONAL', 'Proportional to balance (tax pro rata)')], default='EQUAL', help_text='How a payment without a manual split is distributed over fee heads', max_length=20, verbose_name='Fee Allocation Strategy'),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from core.utils import generate_business_id
+from core.managers import TenantManager
 
 class School(models.Model):
     # Django PK (Immutable, internal)
@@ -33,6 +34,18 @@ class School(models.Model):
     # Payroll Configuration
     salary_calculation_day = models.PositiveIntegerField(_("Salary Calculation Day"), default=30, help_text="Day of month to generate salary (e.g. 30)")
 
+    # Fee Collection Configuration
+    fee_allocation_strategy = models.CharField(
+        _("Fee Allocation Strategy"), max_length=20, default='EQUAL',
+        choices=[
+            ('EQUAL', 'Equal split across heads'),
+            ('TUITION_FIRST', 'Tuition first'),
+            ('OLDEST_DUE_FIRST', 'Oldest due first'),
+            ('TAX_PROPORTIONAL', 'Proportional to balance (tax pro rata)'),
+        ],
+        help_text="How a payment without a manual split is distributed over fee heads"
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -49,6 +62,7 @@ class AcademicYear(models.Model):
     academic_year_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='academic_years')
+    objects = TenantManager()
     name = models.CharField(_("Year Name"), max_length=20, help_text="e.g. 2024-25")
     start_date = models.DateField(_("Start Date"))
     end_date = models.DateField(_("End Date"))
@@ -59,7 +73,7 @@ class AcademicYear(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.academic_year_id:
-            self.academic_year_id = generate_business_id('AY')
+            self.academic_year_id = generate_business_id('AY', school=self.school_id)
         if self.is_active:
             AcademicYear.objects.filter(school=self.school, is_active=True).exclude(id=self.id).update(is_active=False)
         super().save(*args, **kwargs)
@@ -73,6 +87,7 @@ class Class(models.Model):
     # Prompt says "Student class data must be saved year-wise". The Class model itself is metadata.
     
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='classes')
+    objects = TenantManager()
     name = models.CharField(_("Class Name"), max_length=50, help_text="e.g. Class 10")
     order = models.PositiveIntegerField(default=0, help_text="For sorting, e.g. 10")
 
@@ -86,6 +101,7 @@ class Class(models.Model):
 class Section(models.Model):
     id = models.AutoField(primary_key=True)
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='sections') # Direct strict isolation
+    objects = TenantManager()
     parent_class = models.ForeignKey(Class, on_delete=models.CASCADE, related_name='sections')
     name = models.CharField(_("Section Name"), max_length=50, help_text="e.g. A")
     
@@ -98,6 +114,7 @@ class Section(models.Model):
 class Achievement(models.Model):
     id = models.AutoField(primary_key=True)
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='achievements')
+    objects = TenantManager()
     title = models.CharField(_("Title"), max_length=200)
     description = models.TextField(_("Description"))
     image_url = models.URLField(_("Image URL"), max_length=500) # Changed from ImageField
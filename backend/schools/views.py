@@ -37,9 +37,7 @@ class AchievementViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = Achievement.objects.all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         return queryset
 
 class AcademicYearViewSet(viewsets.ModelViewSet):
@@ -50,9 +48,7 @@ class AcademicYearViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         queryset = AcademicYear.objects.select_related('school').all()
-        school_id = get_current_school_id()
-        if school_id:
-            queryset = queryset.filter(school__school_id=school_id)
+        queryset = queryset.for_current_school()
         return queryset
 
 class ClassViewSet(viewsets.ModelViewSet):
@@ -69,13 +65,12 @@ class ClassViewSet(viewsets.ModelViewSet):
             return queryset
             
         # Filter by user's school
-        if hasattr(user, 'school') and user.school:
-             return queryset.filter(school=user.school)
+        if getattr(user, 'school_id', None):
+             return queryset.filter(school_id=user.school_id)
              
         # Fallback to header if user has no school (unlikely for staff)
-        school_id = get_current_school_id()
-        if school_id:
-            return queryset.filter(school__school_id=school_id)
+        if get_current_school_id():
+            return queryset.for_current_school()
             
         return queryset.none()
 
@@ -91,13 +86,12 @@ class SectionViewSet(viewsets.ModelViewSet):
 
         if user.is_superuser:
              pass # Return all, but still might filter by class below
-        elif hasattr(user, 'school') and user.school:
-             queryset = queryset.filter(school=user.school)
+        elif getattr(user, 'school_id', None):
+             queryset = queryset.filter(school_id=user.school_id)
         else:
              # Fallback
-             school_id = get_current_school_id()
-             if school_id:
-                 queryset = queryset.filter(school__school_id=school_id)
+             if get_current_school_id():
+                 queryset = queryset.for_current_school()
              else:
                  return queryset.none()
         
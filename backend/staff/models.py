@@ -3,6 +3,7 @@ from django.utils.translation import gettext_lazy as _
 from core.models import CoreUser
 from schools.models import School
 from core.utils import generate_business_id
+from core.managers import TenantManager
 
 class TeacherProfile(models.Model):
     user = models.OneToOneField(CoreUser, on_delete=models.CASCADE, related_name='teacher_profile')
@@ -26,10 +27,14 @@ class StaffProfile(models.Model):
         return f"{self.designation}: {self.user.get_full_name()}"
 
 class StaffAttendance(models.Model):
+    # High-churn table (scan check-in/out): only track what the dashboard counters need
+    track_changes = ('school', 'date', 'status')
+
     id = models.AutoField(primary_key=True)
     attendance_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE) # Redundant but good for strict isolation query optimization
+    objects = TenantManager()
     staff = models.ForeignKey(CoreUser, on_delete=models.CASCADE, related_name='staff_attendance')
     date = models.DateField(_("Date"))
     
@@ -66,7 +71,7 @@ class StaffAttendance(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.attendance_id:
-            self.attendance_id = generate_business_id('ATT-STF')
+            self.attendance_id = generate_business_id('ATT-STF', school=self.school_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -106,21 +106,18 @@ class StaffDashboardView(APIView):
              pass
 
         if user.is_superuser or is_principal:
-            from students.models import Student
-            from admissions.models import Enquiry
-            from staff.models import StaffProfile, StaffAttendance
-            from finance.models import Leave
-            
-            # Use school filter for all
-            school = user.school
-            
+            from reports import counters
+
+            # One counters row per school, kept current on every write
+            school_stats = counters.snapshot(user.school_id, today)
+
             admin_stats = {
-                'student_count': Student.objects.filter(school=school, is_active=True).count(),
-                'staff_count': StaffProfile.objects.filter(user__school=school).count(),
-                'students_present_today': 0, # Placeholder until student attendance is fully integrated
-                'staff_present_today': StaffAttendance.objects.filter(school=school, date=today, status='PRESENT').count(),
-                'pending_enquiries': Enquiry.objects.filter(school=school, status='PENDING').count(),
-                'pending_leaves': Leave.objects.filter(school=school, status='PENDING').count()
+                'student_count': school_stats['active_students'],
+                'staff_count': school_stats['staff_members'],
+                'students_present_today': school_stats['students_present'],
+                'staff_present_today': school_stats['staff_present'],
+                'pending_enquiries': school_stats['enquiries_pending'],
+                'pending_leaves': school_stats['pending_leaves']
             }
 
         try:
@@ -705,6 +702,8 @@ class ToggleStaffActiveView(APIView):
                 return Response({'error': 'Permission denied'}, status=403)
             
             staff.is_active = not staff.is_active
+            # Saving drops the staff member's cached token bundle (core.signals),
+            # so a deactivated account is locked out on its next request
             staff.save()
             
             return Response({
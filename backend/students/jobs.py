@@ -0,0 +1,152 @@
+"""
+Background job handlers for students (see core.jobs).
+"""
+from django.db import models, transaction
+from django.utils import timezone
+
+from core import jobs
+from schools.models import Class, AcademicYear, Section
+from .models import Student, StudentHistory
+
+
+def _carry_forward(student, target_year, student_info):
+    """Invoice the student's pending balance of all other years in `target_year`."""
+    from finance.models import Invoice, StudentLedger
+    from decimal import Decimal
+
+    # Pending balance of all other years, from the student's ledger
+    total_pending = StudentLedger.objects.filter(
+        student=student,
+        balance__gt=0,
+    ).exclude(academic_year=target_year).aggregate(
+        total=models.Sum('balance')
+    )['total'] or Decimal('0.00')
+
+    if total_pending > 0:
+        # Create carry-forward invoice in new year
+        Invoice.objects.create(
+            school=student.school,
+            student=student,
+            academic_year=target_year,
+            title='Previous Year Balance Carry-Forward',
+            total_amount=total_pending,
+            due_date=target_year.start_date or timezone.now().date(),
+            fee_term='ONETIME',
+            status='PENDING',
+            settlement_note=f'Carried forward from {student_info.get("previous_year", "previous")} academic year'
+        )
+
+
+@jobs.register('students.promote')
+def promote_students(job, student_ids, target_year_id=None, target_class_id=None,
+                     target_section_id=None, is_alumni_promotion=False, students_data=None):
+    """
+    Promote or detain a list of students based on their performance
+    (payload as posted to PromoteStudentsView). All or nothing.
+    """
+    students_data = students_data or {}
+    school = job.school
+
+    with transaction.atomic():
+        students_to_promote = Student.objects.filter(
+            id__in=student_ids,
+            school=school
+        ).select_related('current_class', 'section', 'academic_year')
+
+        promoted_count = 0
+        detained_count = 0
+        alumni_count = 0
+
+        # Target objects (validated by the view when the job was queued)
+        target_year = None
+        target_class = None
+        target_section = None
+        if not is_alumni_promotion:
+            target_year = AcademicYear.objects.get(id=target_year_id, school=school)
+            target_class = Class.objects.get(id=target_class_id, school=school)
+            if target_section_id:
+                target_section = Section.objects.get(id=target_section_id, school=school)
+
+        for student in students_to_promote:
+            # Get individual student data if provided
+            student_info = students_data.get(str(student.id), {})
+            is_detained = student_info.get('is_detained', False)
+
+            # Determine promotion status
+            if is_alumni_promotion:
+                promotion_status = 'GRADUATED'
+            elif is_detained:
+                promotion_status = 'DETAINED'
+            else:
+                promotion_status = 'PROMOTED'
+
+            # Create History Record with all academic data
+            StudentHistory.objects.create(
+                school=student.school,
+                student=student,
+                academic_year=student.academic_year,
+                class_enrolled=student.current_class,
+                section_enrolled=student.section,
+
+                # Academic Performance
+                total_marks=student_info.get('total_marks'),
+                max_marks=student_info.get('max_marks'),
+                percentage=student_info.get('percentage'),
+                grade=student_info.get('grade', ''),
+                class_rank=student_info.get('class_rank'),
+                section_rank=student_info.get('section_rank'),
+
+                # Attendance (if provided)
+                total_working_days=student_info.get('total_working_days'),
+                days_present=student_info.get('days_present'),
+                attendance_percentage=student_info.get('attendance_percentage'),
+
+                # Promotion
+                promotion_status=promotion_status,
+                promoted_to_class=target_class if not is_detained and not is_alumni_promotion else None,
+
+                # Conduct
+                conduct=student_info.get('conduct', 'GOOD'),
+                result=promotion_status,
+                remarks=student_info.get('remarks', ''),
+                detention_reason=student_info.get('detention_reason', ''),
+
+                recorded_by=job.user
+            )
+
+            # Update Student
+            if is_alumni_promotion:
+                student.is_active = False
+                student.is_alumni = True
+                student.alumni_year = timezone.now().date()
+                student.current_class = None
+                student.section = None
+                alumni_count += 1
+            elif is_detained:
+                # Stay in same class for next year
+                student.academic_year = target_year
+                # Keep current class, update section if provided
+                if target_section_id:
+                    student.section = target_section
+                detained_count += 1
+            else:
+                # Normal promotion
+                student.academic_year = target_year
+                student.current_class = target_class
+                student.section = target_section
+                promoted_count += 1
+
+            student.save()
+
+            # Fee carry-forward: Create invoice for pending balance
+            if not is_alumni_promotion and target_year:
+                _carry_forward(student, target_year, student_info)
+
+    return {
+        'success': True,
+        'promoted': promoted_count,
+        'detained': detained_count,
+        'alumni': alumni_count,
+        'total': promoted_count + detained_count + alumni_count,
+        'message': f'Processed {promoted_count + detained_count + alumni_count} students'
+    }
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('schools', '0010_school_geofence_radius'),
+        ('students', '0006_student_gr_number_alter_student_enrollment_number'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['school', '-date', '-id'], name='attendance_school_keyset_idx'),
+        ),
+    ]
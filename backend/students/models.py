@@ -2,12 +2,14 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from schools.models import School, AcademicYear, Class, Section
 from core.utils import generate_business_id
+from core.managers import TenantManager
 
 class Student(models.Model):
     id = models.AutoField(primary_key=True)
     student_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE, related_name='students')
+    objects = TenantManager()
     
     # Academic Details (Current)
     academic_year = models.ForeignKey(AcademicYear, on_delete=models.SET_NULL, null=True, related_name='students')
@@ -116,7 +118,7 @@ class Student(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.student_id:
-            self.student_id = generate_business_id('STU')
+            self.student_id = generate_business_id('STU', school=self.school_id)
         super().save(*args, **kwargs)
     
     def get_full_name(self):
@@ -325,6 +327,7 @@ class Attendance(models.Model):
     attendance_id = models.CharField(max_length=50, unique=True, editable=False)
     
     school = models.ForeignKey(School, on_delete=models.CASCADE) # Direct isolation
+    objects = TenantManager()
     student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name='attendance')
     date = models.DateField(_("Date"))
     status = models.CharField(_("Status"), max_length=1, choices=[('P', 'Present'), ('A', 'Absent'), ('L', 'Late')])
@@ -334,6 +337,7 @@ class Attendance(models.Model):
         unique_together = ('student', 'date')
         indexes = [
             models.Index(fields=['school', 'date'], name='attendance_school_date_idx'),
+            models.Index(fields=['school', '-date', '-id'], name='attendance_school_keyset_idx'),
             models.Index(fields=['student', 'date'], name='attendance_student_date_idx'),
             models.Index(fields=['status'], name='attendance_status_idx'),
             models.Index(fields=['date'], name='attendance_date_idx'),
@@ -341,7 +345,7 @@ class Attendance(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.attendance_id:
-            self.attendance_id = generate_business_id('ATT')
+            self.attendance_id = generate_business_id('ATT', school=self.school_id)
         super().save(*args, **kwargs)
 
 class Fee(models.Model):
@@ -362,5 +366,5 @@ class Fee(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.invoice_id:
-            self.invoice_id = generate_business_id('INV')
+            self.invoice_id = generate_business_id('INV', school=self.school_id)
         super().save(*args, **kwargs)
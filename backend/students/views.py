@@ -2,13 +2,12 @@ from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
-from django.db import transaction
 
 from .models import Student, StudentHistory, Attendance, Fee
 from .serializers import StudentSerializer, FeeSerializer, AttendanceSerializer
 from schools.models import Class, AcademicYear, Section
 
+from core import jobs
 from core.permissions import StandardPermission
 from core.pagination import StandardResultsPagination, LargeResultsPagination
 
@@ -43,6 +42,7 @@ class AttendanceViewSet(viewsets.ModelViewSet):
     queryset = Attendance.objects.all()
     serializer_class = AttendanceSerializer
     pagination_class = LargeResultsPagination
+    keyset_ordering = ('-date', '-id')  # ?pagination=cursor (core.pagination)
     
     def get_queryset(self):
         return Attendance.objects.select_related(
@@ -82,154 +82,34 @@ class PromoteStudentsView(APIView):
         if not student_ids:
             return Response({'error': 'No students selected'}, status=400)
         
-        try:
-            with transaction.atomic():
-                students_to_promote = Student.objects.filter(
-                    id__in=student_ids, 
-                    school=request.user.school
-                ).select_related('current_class', 'section', 'academic_year')
-                
-                promoted_count = 0
-                detained_count = 0
-                alumni_count = 0
-                
-                # Pre-fetch target objects
-                target_year = None
-                target_class = None
-                target_section = None
-                
-                if not is_alumni_promotion:
-                    if not target_year_id or not target_class_id:
-                        return Response({'error': 'Target Year and Class required for promotion'}, status=400)
-                    
-                    try:
-                        target_year = AcademicYear.objects.get(id=target_year_id, school=request.user.school)
-                    except AcademicYear.DoesNotExist:
-                        return Response({'error': 'Target Academic Year not found'}, status=404)
-
-                    try:
-                        target_class = Class.objects.get(id=target_class_id, school=request.user.school)
-                    except Class.DoesNotExist:
-                        return Response({'error': 'Target Class not found'}, status=404)
-
-                    if target_section_id:
-                        try:
-                            target_section = Section.objects.get(id=target_section_id, school=request.user.school)
-                        except Section.DoesNotExist:
-                            return Response({'error': 'Target Section not found'}, status=404)
-                
-                for student in students_to_promote:
-                    # Get individual student data if provided
-                    student_info = students_data.get(str(student.id), {})
-                    is_detained = student_info.get('is_detained', False)
-                    
-                    # Determine promotion status
-                    if is_alumni_promotion:
-                        promotion_status = 'GRADUATED'
-                    elif is_detained:
-                        promotion_status = 'DETAINED'
-                    else:
-                        promotion_status = 'PROMOTED'
-                    
-                    # Create History Record with all academic data
-                    history = StudentHistory.objects.create(
-                        school=student.school,
-                        student=student,
-                        academic_year=student.academic_year,
-                        class_enrolled=student.current_class,
-                        section_enrolled=student.section,
-                        
-                        # Academic Performance
-                        total_marks=student_info.get('total_marks'),
-                        max_marks=student_info.get('max_marks'),
-                        percentage=student_info.get('percentage'),
-                        grade=student_info.get('grade', ''),
-                        class_rank=student_info.get('class_rank'),
-                        section_rank=student_info.get('section_rank'),
-                        
-                        # Attendance (if provided)
-                        total_working_days=student_info.get('total_working_days'),
-                        days_present=student_info.get('days_present'),
-                        attendance_percentage=student_info.get('attendance_percentage'),
-                        
-                        # Promotion
-                        promotion_status=promotion_status,
-                        promoted_to_class=target_class if not is_detained and not is_alumni_promotion else None,
-                        
-                        # Conduct
-                        conduct=student_info.get('conduct', 'GOOD'),
-                        result=promotion_status,
-                        remarks=student_info.get('remarks', ''),
-                        detention_reason=student_info.get('detention_reason', ''),
-                        
-                        recorded_by=request.user
-                    )
-                    
-                    # Update Student
-                    if is_alumni_promotion:
-                        student.is_active = False
-                        student.is_alumni = True
-                        student.alumni_year = timezone.now().date()
-                        student.current_class = None
-                        student.section = None
-                        alumni_count += 1
-                    elif is_detained:
-                        # Stay in same class for next year
-                        student.academic_year = target_year
-                        # Keep current class, update section if provided
-                        if target_section_id:
-                            student.section = target_section
-                        detained_count += 1
-                    else:
-                        # Normal promotion
-                        student.academic_year = target_year
-                        student.current_class = target_class
-                        student.section = target_section
-                        promoted_count += 1
-                    
-                    student.save()
-                    
-                    # Fee carry-forward: Create invoice for pending balance
-                    if not is_alumni_promotion and target_year:
-                        from finance.models import Invoice
-                        from decimal import Decimal
-                        
-                        # Get all unpaid invoices for this student in current year
-                        pending_invoices = Invoice.objects.filter(
-                            student=student,
-                            school=student.school,
-                            status__in=['PENDING', 'PARTIAL', 'OVERDUE']
-                        ).exclude(academic_year=target_year)
-                        
-                        total_pending = Decimal('0.00')
-                        for inv in pending_invoices:
-                            total_pending += inv.balance_due
-                        
-                        if total_pending > 0:
-                            # Create carry-forward invoice in new year
-                            Invoice.objects.create(
-                                school=student.school,
-                                student=student,
-                                academic_year=target_year,
-                                title=f'Previous Year Balance Carry-Forward',
-                                total_amount=total_pending,
-                                due_date=target_year.start_date or timezone.now().date(),
-                                fee_term='ONETIME',
-                                status='PENDING',
-                                settlement_note=f'Carried forward from {student_info.get("previous_year", "previous")} academic year'
-                            )
-
-                return Response({
-                    'success': True,
-                    'promoted': promoted_count,
-                    'detained': detained_count,
-                    'alumni': alumni_count,
-                    'total': promoted_count + detained_count + alumni_count,
-                    'message': f'Processed {promoted_count + detained_count + alumni_count} students'
-                })
-                
-        except Exception as e:
-            return Response({'error': str(e)}, status=400)
+        if not is_alumni_promotion:
+            if not target_year_id or not target_class_id:
+                return Response({'error': 'Target Year and Class required for promotion'}, status=400)
+
+            if not AcademicYear.objects.filter(id=target_year_id, school=request.user.school).exists():
+                return Response({'error': 'Target Academic Year not found'}, status=404)
+
+            if not Class.objects.filter(id=target_class_id, school=request.user.school).exists():
+                return Response({'error': 'Target Class not found'}, status=404)
+
+            if target_section_id and not Section.objects.filter(id=target_section_id, school=request.user.school).exists():
+                return Response({'error': 'Target Section not found'}, status=404)
+
+        # Runs in the background (core.jobs); poll /api/jobs/<id>/
+        job = jobs.enqueue(
+            'students.promote',
+            {
+                'student_ids': student_ids,
+                'target_year_id': target_year_id,
+                'target_class_id': target_class_id,
+                'target_section_id': target_section_id,
+                'is_alumni_promotion': is_alumni_promotion,
+                'students_data': students_data,
+            },
+            school=request.user.school,
+            user=request.user,
+        )
+        return Response(jobs.accepted(job), status=202)
 
 
 from .serializers import StudentHistorySerializer, StudentHistoryCreateSerializer
@@ -26,7 +26,7 @@ class Vehicle(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.vehicle_id:
-            self.vehicle_id = generate_business_id('VEH')
+            self.vehicle_id = generate_business_id('VEH', school=self.school_id)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -212,38 +212,43 @@ export async function deleteFeeStructure(id: number, schoolId?: string): Promise
 }
 
 // Staff Management
-// Helper to fetch structure amount (Supports Section Override)
-export async function getFeeStructureAmount(classId: number, categoryId: number, sectionId?: number, schoolId?: string): Promise<{ amount: string, gst_rate: string, is_tax_inclusive: boolean } | null> {
+// Effective fees of a class/section (section overrides, GST split and round-off
+// resolved on the server from the cached fee matrix)
+export interface ResolvedFeeHead {
+    head_id: number;
+    head_name: string;
+    structure_amount: string;
+    gst_rate: string;
+    is_tax_inclusive: boolean;
+    amount: string;
+    base_amount: string;
+    tax_amount: string;
+}
+
+export async function resolveFeeStructure(classId: number, sectionId?: number, academicYearId?: number, schoolId?: string): Promise<{ total_amount: string, round_off_amount: string, heads: ResolvedFeeHead[] } | null> {
     try {
-        let url = `/finance/structure/?class_assigned=${classId}&category=${categoryId}`;
-        if (sectionId) url += `&section=${sectionId}`;
-
-        const res = await fetchWithSchool(url, schoolId);
-
-        // Logic: 
-        // If multiple structures return (e.g. Class Generic + Section Specific), 
-        // Backend should probably filter or we filter here.
-        // Ideally backend logic: `filter(section=sectionId)` should return the specific ONE if exists, 
-        // else we might get the generic one? 
-        // Actually, if we pass sectionId to backend, default Django Filter might filter EXACT match.
-        // So we should try fetching specific first.
-
-        if (Array.isArray(res) && res.length > 0) {
-            // If multiple, ideally find exact match for section, else fallback
-            const match = res.find((r: FeeStructure) => r.section === sectionId) || res[0];
-            return {
-                amount: match.amount,
-                gst_rate: match.gst_rate,
-                is_tax_inclusive: match.is_tax_inclusive
-            };
-        }
-        return null;
+        let url = `/finance/structure/resolve/?class_id=${classId}`;
+        if (sectionId) url += `&section_id=${sectionId}`;
+        if (academicYearId) url += `&academic_year=${academicYearId}`;
+        return await fetchWithSchool(url, schoolId);
     } catch (e) {
-        console.error("Error fetching fee structure", e);
+        console.error("Error resolving fee structure", e);
         return null;
     }
 }
 
+// Helper to fetch structure amount (Supports Section Override)
+export async function getFeeStructureAmount(classId: number, categoryId: number, sectionId?: number, schoolId?: string): Promise<{ amount: string, gst_rate: string, is_tax_inclusive: boolean } | null> {
+    const resolved = await resolveFeeStructure(classId, sectionId, undefined, schoolId);
+    const match = resolved?.heads.find((head) => head.head_id === categoryId);
+    if (!match) return null;
+    return {
+        amount: match.structure_amount,
+        gst_rate: match.gst_rate,
+        is_tax_inclusive: match.is_tax_inclusive
+    };
+}
+
 
 // ===========================
 // FEE SETTLEMENT APIS (Phase 3)
@@ -322,6 +327,33 @@ export async function getSettlementSummary(yearId: number, schoolId?: string): P
     return fetchWithSchool(`/finance/settlement/${yearId}/summary/`, schoolId);
 }
 
+// Background Jobs
+export interface Job<T = any> {
+    id: number;
+    name: string;
+    status: 'QUEUED' | 'RUNNING' | 'SUCCEEDED' | 'FAILED';
+    progress: number;
+    message: string;
+    result: T | null;
+    error: string | null;
+}
+
+// Long operations return 202 with a job_id; poll until the job finishes and return its result
+export async function waitForJob<T = any>(
+    jobId: number,
+    onProgress?: (job: Job<T>) => void,
+    schoolId?: string,
+    intervalMs: number = 1500
+): Promise<T> {
+    while (true) {
+        const job: Job<T> = await fetchWithSchool(`/jobs/${jobId}/`, schoolId);
+        if (onProgress) onProgress(job);
+        if (job.status === 'SUCCEEDED') return job.result as T;
+        if (job.status === 'FAILED') throw new Error(job.error || 'Job failed');
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // Bulk Fee Generation
 export async function generateYearEndFees(
     academicYearId: number,
@@ -356,7 +388,8 @@ export async function generateYearEndFees(
     });
 
     if (!res.ok) throw new Error('Failed to generate fees');
-    return res.json();
+    const job = await res.json();
+    return waitForJob(job.job_id, undefined, schoolId);
 }
 
 // Settle Year
@@ -1255,7 +1288,8 @@ export async function generatePayroll(month: number, year: number, schoolId?: st
     });
 
     if (!res.ok) throw new Error(`Failed to generate payroll: ${res.statusText}`);
-    return res.json();
+    const job = await res.json();
+    return waitForJob(job.job_id, undefined, schoolId);
 }
 
 export async function getPayslipLink(salaryId: number, schoolId?: string): Promise<string> {